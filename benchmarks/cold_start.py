@@ -0,0 +1,130 @@
+# benchmarks/cold_start.py
+"""
+Desglose del arranque en frío: tiempo de importación por paquete y tiempo
+hasta el primer update (imports, init_db, construcción del Dispatcher y el
+primer `feed_update`).
+
+Se ejecutan dos arranques sobre la misma base temporal, cada uno en un
+proceso nuevo: "cold" (base vacía, se aplica esquema y siembra) y "warm"
+(la huella coincide y se omiten create_all y la siembra).
+
+Uso:
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --top 15 --output cold_start.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks import harness
+
+
+def import_breakdown(top: int) -> dict:
+    """
+    Ejecuta `python -X importtime -c 'import bot'` y agrega por paquete raíz.
+    Requiere haber llamado antes a `harness.prepare_environment()`.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"],
+        capture_output=True, text=True, env=dict(os.environ), check=True,
+    )
+
+    self_us: dict[str, int] = defaultdict(int)
+    total_us = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        own, _cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        package = name.split(".")[0]
+        self_us[package] += int(own)
+        total_us += int(own)
+
+    ranked = sorted(self_us.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "total_ms": round(total_us / 1000, 2),
+        "by_package_ms": {package: round(us / 1000, 2) for package, us in ranked},
+    }
+
+
+async def _child_phases() -> dict:
+    phases = {}
+    started = time.perf_counter()
+    import bot as bot_module
+    phases["import_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    schema_applied = await bot_module.init_db()
+    phases["init_db_ms"] = (time.perf_counter() - started) * 1000
+
+    from aiogram import Bot
+
+    started = time.perf_counter()
+    bot = Bot(token=harness.BENCH_TOKEN, session=harness.make_stub_session())
+    dp = bot_module.create_dispatcher()
+    phases["dispatcher_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    await dp.feed_update(bot, harness.make_message_update(1, harness.USER_ID_OFFSET, "/start"))
+    phases["first_update_ms"] = (time.perf_counter() - started) * 1000
+    await bot.session.close()
+
+    result = {name: round(value, 2) for name, value in phases.items()}
+    result["time_to_first_update_ms"] = round(sum(phases.values()), 2)
+    result["schema_applied"] = schema_applied
+    return result
+
+
+def run_child(db_path: str) -> dict:
+    harness.prepare_environment(db_path)
+    harness.quiet_logger()
+    return asyncio.run(_child_phases())
+
+
+def _spawn_child(db_path: str) -> dict:
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.cold_start", "--child", "--db-path", db_path],
+        capture_output=True, text=True, check=True,
+    )
+    sys.stderr.write(completed.stderr)
+    result = json.loads(completed.stdout)
+    # Incluye el arranque del intérprete, que no ve el propio proceso hijo
+    result["process_wall_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=12, help="Paquetes a mostrar en el desglose de imports")
+    parser.add_argument("--db-path", default=None)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_child(args.db_path)))
+        return
+
+    db_path = harness.prepare_environment(args.db_path)
+    report = {
+        "benchmark": "cold_start",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "imports": import_breakdown(args.top),
+        "cold": _spawn_child(db_path),
+        "warm": _spawn_child(db_path),
+    }
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# benchmarks/concurrent_registration.py
+"""
+Primeros contactos simultáneos del mismo usuario contra el upsert de registro
+(`database/upsert.py`), en el bot principal y en `newbot`.
+
+Cada intento usa su propia sesión (como updates concurrentes reales) y llama a
+`UserService.register_user` / `newbot UserService.get_or_create` para el mismo id.
+Se comprueba que no haya errores, que exista una sola fila, que exactamente un
+intento la haya creado y que el contador users_total sume 1. Reporta JSON y
+termina con código 1 si alguna comprobación falla.
+
+Uso:
+    python -m benchmarks.concurrent_registration
+    python -m benchmarks.concurrent_registration --attempts 200 --rounds 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import harness
+
+
+async def _gather_attempts(attempts: int, attempt) -> tuple[list, int, float]:
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(attempt(i) for i in range(attempts)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    errors = [o for o in outcomes if isinstance(o, BaseException)]
+    for error in errors[:3]:
+        print(f"{type(error).__name__}: {error}", file=sys.stderr)
+    return [o for o in outcomes if not isinstance(o, BaseException)], len(errors), elapsed
+
+
+async def check_main_bot(attempts: int, rounds: int) -> dict:
+    from sqlalchemy import func, select
+    from database.db import AsyncSessionLocal, init_db
+    from database.models.user import User
+    from services.stats_service import StatsService, USERS_TOTAL
+    from services.user_service import UserService
+
+    await init_db()
+    failures = []
+    total_errors = 0
+    elapsed_total = 0.0
+    for round_index in range(rounds):
+        user_id = harness.USER_ID_OFFSET + round_index
+
+        async def attempt(i: int):
+            async with AsyncSessionLocal() as session:
+                _, created = await UserService(session).register_user(
+                    user_id, username=f"user{round_index}_{i}", first_name="Concurrente", count_interaction=True,
+                )
+                return created
+
+        created_flags, errors, elapsed = await _gather_attempts(attempts, attempt)
+        total_errors += errors
+        elapsed_total += elapsed
+
+        async with AsyncSessionLocal() as session:
+            rows = await session.scalar(select(func.count()).select_from(User).filter(User.id == user_id))
+            interactions = await session.scalar(select(User.interactions_count).filter(User.id == user_id))
+        if errors or rows != 1 or sum(created_flags) != 1 or interactions != attempts:
+            failures.append({
+                "user_id": user_id, "errors": errors, "rows": rows,
+                "created": sum(created_flags), "interactions_count": interactions,
+            })
+
+    async with AsyncSessionLocal() as session:
+        counters = await StatsService(session).get_counters()
+    if counters[USERS_TOTAL] != rounds:
+        failures.append({"users_total": counters[USERS_TOTAL], "expected": rounds})
+
+    return {
+        "attempts_per_round": attempts,
+        "rounds": rounds,
+        "errors": total_errors,
+        "registrations_per_s": round(attempts * rounds / elapsed_total, 2) if elapsed_total else 0.0,
+        "failures": failures,
+    }
+
+
+async def check_newbot(attempts: int, rounds: int, db_path: str) -> dict:
+    # newbot lee DATABASE_URL al importarse: usa su propia base (su tabla users es distinta)
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ["ADMIN_IDS"] = str(harness.USER_ID_OFFSET)  # newbot espera IDs separados por espacios
+    from sqlalchemy import func, select
+    from newbot.database import AsyncSessionLocal, engine
+    from newbot.models import Base, User
+    from newbot.services.user_service import UserService
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    failures = []
+    total_errors = 0
+    elapsed_total = 0.0
+    for round_index in range(rounds):
+        telegram_id = harness.USER_ID_OFFSET + round_index
+
+        async def attempt(i: int):
+            async with AsyncSessionLocal() as session:
+                # La mitad sin username: no debe borrar el guardado
+                username = f"user{round_index}" if i % 2 == 0 else None
+                return (await UserService(session).get_or_create(telegram_id, username)).id
+
+        ids, errors, elapsed = await _gather_attempts(attempts, attempt)
+        total_errors += errors
+        elapsed_total += elapsed
+
+        async with AsyncSessionLocal() as session:
+            rows = await session.scalar(select(func.count()).select_from(User).filter(User.telegram_id == telegram_id))
+            username = await session.scalar(select(User.username).filter(User.telegram_id == telegram_id))
+        if errors or rows != 1 or len(set(ids)) != 1 or username != f"user{round_index}":
+            failures.append({"telegram_id": telegram_id, "errors": errors, "rows": rows, "username": username})
+
+    await engine.dispose()
+    return {
+        "attempts_per_round": attempts,
+        "rounds": rounds,
+        "errors": total_errors,
+        "registrations_per_s": round(attempts * rounds / elapsed_total, 2) if elapsed_total else 0.0,
+        "failures": failures,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_registration_")
+    harness.prepare_environment(os.path.join(workdir, "main.db"))
+    harness.quiet_logger()
+    main_bot = await check_main_bot(args.attempts, args.rounds)
+    newbot = await check_newbot(args.attempts, args.rounds, os.path.join(workdir, "newbot.db"))
+    return {"main_bot": main_bot, "newbot": newbot}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=50, help="Primeros contactos simultáneos por usuario")
+    parser.add_argument("--rounds", type=int, default=10, help="Usuarios distintos (una ronda por usuario)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if any(result["failures"] for result in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# benchmarks/dispatcher_throughput.py
+"""
+Benchmark de extremo a extremo del Dispatcher.
+
+Siembra una base SQLite temporal, alimenta updates sintéticos directamente a
+`Dispatcher.feed_update` con una sesión falsa de la Bot API y reporta
+throughput, latencias p50/p99 y pico de RSS en JSON.
+
+Uso:
+    python -m benchmarks.dispatcher_throughput --users 10000 100000 1000000
+    python -m benchmarks.dispatcher_throughput --users 10000 --scenarios status ranking --output bench.json
+
+Con varios tamaños cada uno se ejecuta en un subproceso propio, de modo que
+la configuración (leída al importar) y el pico de RSS son independientes.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Awaitable, Callable
+
+from benchmarks import harness
+
+SCENARIOS = ("help", "redeem_cancel", "status", "ranking", "ranking_semana", "ranking_mes", "catalogo", "myrewards", "react_post", "react_flood", "redeem_confirm", "permanence_job")
+
+
+def _update_factory(scenario: str, users: int, rng: random.Random) -> Callable[[int], object]:
+    def random_user() -> int:
+        return harness.USER_ID_OFFSET + rng.randrange(users)
+
+    if scenario == "help":
+        return lambda i: harness.make_message_update(i, random_user(), "/help")
+    if scenario == "redeem_cancel":
+        return lambda i: harness.make_callback_update(i, random_user(), "redeem_cancel")
+    if scenario == "status":
+        return lambda i: harness.make_message_update(i, random_user(), "/status")
+    if scenario == "ranking":
+        return lambda i: harness.make_message_update(i, random_user(), "/ranking")
+    if scenario == "ranking_semana":
+        return lambda i: harness.make_message_update(i, random_user(), "/ranking semana")
+    if scenario == "ranking_mes":
+        return lambda i: harness.make_message_update(i, random_user(), "/ranking mes")
+    if scenario == "catalogo":
+        return lambda i: harness.make_message_update(i, random_user(), "/catalogo")
+    if scenario == "myrewards":
+        return lambda i: harness.make_message_update(i, random_user(), "/myrewards")
+    if scenario == "react_post":
+        return lambda i: harness.make_callback_update(i, random_user(), f"react_post:{rng.randrange(100)}:5")
+    if scenario == "react_flood":
+        # Un solo usuario pulsando botones sin parar: casi todo lo descarta el límite por usuario
+        flooder = harness.USER_ID_OFFSET + 1 + rng.randrange(users - 1)
+        return lambda i: harness.make_callback_update(i, flooder, f"react_post:{rng.randrange(100)}:5")
+    if scenario == "redeem_confirm":
+        # La recompensa 1 tiene stock ilimitado: se mide el canje, no el agotamiento
+        return lambda i: harness.make_callback_update(i, random_user(), "redeem_confirm:1")
+    raise ValueError(f"Escenario desconocido: {scenario}")
+
+
+class _CheckoutCounter:
+    """Cuenta las conexiones que se toman del pool del engine (trabajo de DB por update)."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+
+async def _run_updates(feed: Callable[[object], Awaitable[object]], updates: list, concurrency: int,
+                       checkouts: _CheckoutCounter) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(updates)
+
+    async def worker() -> None:
+        nonlocal errors
+        for update in queue:
+            started = time.perf_counter()
+            try:
+                await feed(update)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    checkouts_before = checkouts.count
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    db_checkouts = checkouts.count - checkouts_before
+
+    latencies.sort()
+    return {
+        "updates": len(updates),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_ups": round(len(updates) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(harness.percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(harness.percentile(latencies, 99) * 1000, 3),
+        "db_checkouts_per_update": round(db_checkouts / len(updates), 3) if updates else 0.0,
+        "peak_rss_kb": harness.peak_rss_kb(),
+    }
+
+
+async def _run_permanence_job(bot, users: int) -> dict:
+    from database.db import get_db
+    from services.permanence_service import PermanenceService
+
+    errors = 0
+    awarded = 0
+    started = time.perf_counter()
+    try:
+        async with get_db() as session:
+            awarded = await PermanenceService(session, bot).award_weekly_permanence_points()
+    except Exception as e:
+        errors = 1
+        print(f"permanence_job: {type(e).__name__}: {e}", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    return {
+        "users_total": users,
+        "users_awarded": awarded,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "users_per_s": round(users / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_kb": harness.peak_rss_kb(),
+    }
+
+
+async def run_single(args: argparse.Namespace) -> dict:
+    db_path = harness.prepare_environment(args.db_path)
+    harness.quiet_logger()
+
+    seed_started = time.perf_counter()
+    dataset = harness.seed_database(db_path, args.users[0], args.purchases_per_user, args.seed)
+    seed_elapsed = time.perf_counter() - seed_started
+
+    from aiogram import Bot
+    from sqlalchemy import event
+    from bot import create_dispatcher
+    from database.db import engine
+    from middlewares.throttling_middleware import shed_counters
+
+    stub_session = harness.make_stub_session()
+    bot = Bot(token=harness.BENCH_TOKEN, session=stub_session)
+    dp = create_dispatcher()
+    checkouts = _CheckoutCounter()
+    event.listen(engine.sync_engine, "checkout", checkouts)
+
+    async def feed(update) -> object:
+        return await dp.feed_update(bot, update)
+
+    rng = random.Random(args.seed)
+    results = {}
+    for scenario in args.scenarios:
+        if scenario == "permanence_job":
+            results[scenario] = await _run_permanence_job(bot, dataset["users"])
+            continue
+        factory = _update_factory(scenario, dataset["users"], rng)
+        if args.warmup:
+            await _run_updates(feed, [factory(-i - 1) for i in range(args.warmup)], args.concurrency, checkouts)
+        updates = [factory(i) for i in range(1, args.updates + 1)]
+        results[scenario] = await _run_updates(feed, updates, args.concurrency, checkouts)
+
+    await bot.session.close()
+    return {
+        "dataset": dict(dataset, seed_s=round(seed_elapsed, 3)),
+        "concurrency": args.concurrency,
+        "bot_api_calls": stub_session.requests,
+        "shed_updates": dict(shed_counters),
+        "scenarios": results,
+    }
+
+
+def _run_in_subprocess(args: argparse.Namespace, users: int) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.dispatcher_throughput",
+        "--users", str(users),
+        "--updates", str(args.updates),
+        "--warmup", str(args.warmup),
+        "--concurrency", str(args.concurrency),
+        "--purchases-per-user", str(args.purchases_per_user),
+        "--seed", str(args.seed),
+        "--scenarios", *args.scenarios,
+    ]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    sys.stderr.write(completed.stderr)
+    return json.loads(completed.stdout)["runs"][0]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[10_000], help="Tamaños del dataset (ej. 10000 100000 1000000)")
+    parser.add_argument("--purchases-per-user", type=float, default=1.0)
+    parser.add_argument("--updates", type=int, default=2_000, help="Updates por escenario")
+    parser.add_argument("--warmup", type=int, default=50, help="Updates de calentamiento por escenario (no se miden)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Updates procesados en paralelo")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--db-path", default=None, help="Ruta de la base temporal (por defecto un directorio nuevo)")
+    parser.add_argument("--output", default=None, help="Archivo JSON de salida (por defecto stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if len(args.users) == 1:
+        runs = [asyncio.run(run_single(args))]
+    else:
+        runs = [_run_in_subprocess(args, users) for users in args.users]
+
+    report = {
+        "benchmark": "dispatcher_throughput",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": runs,
+    }
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
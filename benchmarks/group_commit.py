@@ -0,0 +1,196 @@
+# benchmarks/group_commit.py
+"""
+Escrituras concurrentes con el escritor único de commit agrupado
+(`database/writer.py`) frente a un commit por escritura.
+
+Cada operación imita un handler: registra la interacción del usuario
+(`UserService.register_user`), le suma puntos (`PointsService.add_points`) y,
+en una de cada `--purchase-every` operaciones, registra una compra
+(`PurchaseService.register_purchase`). Cada modo corre en un subproceso propio
+sobre una copia de la misma base sembrada. Reporta throughput, latencias
+p50/p99, errores, commits y comprueba que los puntos sumados a los usuarios
+coincidan con los otorgados y con los buckets diarios del ranking.
+
+Modos:
+    per_call      WRITE_GROUP_COMMIT=False: cada escritura con su propia transacción y commit
+    group_commit  WRITE_GROUP_COMMIT=True: las escrituras se agrupan en el escritor único
+
+Uso:
+    python -m benchmarks.group_commit
+    python -m benchmarks.group_commit --users 100000 --operations 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import harness
+
+MODES = ("per_call", "group_commit")
+
+
+class _CommitCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+
+async def run_mode(args: argparse.Namespace) -> dict:
+    harness.prepare_environment(args.db_path)
+    os.environ["WRITE_GROUP_COMMIT"] = "true" if args.run_mode == "group_commit" else "false"
+    harness.quiet_logger()
+
+    from datetime import date
+    from sqlalchemy import event, func, select
+    from sqlalchemy.engine import Engine
+    from database.db import AsyncSessionLocal, engine
+    from database.models.daily_points import DailyPoints
+    from database.models.user import User
+    from database.writer import close_write_actor
+    from services.points_service import PointsService
+    from services.purchase_service import PurchaseService
+    from services.user_service import UserService
+
+    async def totals() -> tuple[int, int]:
+        async with AsyncSessionLocal() as session:
+            points = await session.scalar(select(func.coalesce(func.sum(User.points), 0)))
+            daily = await session.scalar(
+                select(func.coalesce(func.sum(DailyPoints.points), 0)).filter(DailyPoints.day == date.today())
+            )
+        return points, daily
+
+    points_before, daily_before = await totals()
+    commits = _CommitCounter()
+    event.listen(Engine, "commit", commits)
+
+    rng = random.Random(args.seed)
+    awarded = 0
+
+    async def operation(index: int) -> None:
+        nonlocal awarded
+        user_id = harness.USER_ID_OFFSET + rng.randrange(args.users)
+        async with AsyncSessionLocal() as session:
+            user, _ = await UserService(session).register_user(user_id, username=f"user{user_id}", count_interaction=True)
+            await PointsService(session).add_points(user, 5, "benchmark")
+            awarded += 5
+            if args.purchase_every and index % args.purchase_every == 0:
+                _, points = await PurchaseService(session).register_purchase(user_id, 300.0, "benchmark")
+                awarded += points
+
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(range(args.operations))
+
+    async def worker() -> None:
+        nonlocal errors
+        for index in queue:
+            started = time.perf_counter()
+            try:
+                await operation(index)
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"{type(e).__name__}: {e}", file=sys.stderr)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    await close_write_actor()
+    event.remove(Engine, "commit", commits)
+
+    points_after, daily_after = await totals()
+    await engine.dispose()
+    latencies.sort()
+    return {
+        "mode": args.run_mode,
+        "operations": args.operations,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_ops": round(args.operations / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(harness.percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(harness.percentile(latencies, 99) * 1000, 3),
+        "commits": commits.count,
+        "points_awarded": awarded,
+        "consistent": points_after - points_before == awarded and daily_after - daily_before == awarded,
+        "peak_rss_kb": harness.peak_rss_kb(),
+    }
+
+
+def _run_in_subprocess(args: argparse.Namespace, mode: str, db_path: str) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.group_commit",
+        "--run-mode", mode,
+        "--db-path", db_path,
+        "--users", str(args.users),
+        "--operations", str(args.operations),
+        "--concurrency", str(args.concurrency),
+        "--purchase-every", str(args.purchase_every),
+        "--seed", str(args.seed),
+    ]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    sys.stderr.write(completed.stderr)
+    return json.loads(completed.stdout)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--operations", type=int, default=2_000, help="Operaciones (handlers simulados) por modo")
+    parser.add_argument("--concurrency", type=int, default=32, help="Operaciones en paralelo")
+    parser.add_argument("--purchase-every", type=int, default=10, help="Una compra cada N operaciones (0 = ninguna)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--run-mode", choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--db-path", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help="Archivo JSON de salida (por defecto stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.run_mode:
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_group_commit_")
+    seed_path = os.path.join(workdir, "seed.db")
+    harness.prepare_environment(seed_path)
+    dataset = harness.seed_database(seed_path, args.users, 1.0, args.seed)
+    runs = []
+    for mode in args.modes:
+        db_path = os.path.join(workdir, f"{mode}.db")
+        shutil.copyfile(seed_path, db_path)
+        runs.append(_run_in_subprocess(args, mode, db_path))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "group_commit",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dataset,
+        "concurrency": args.concurrency,
+        "runs": runs,
+    }
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+    if any(not run["consistent"] for run in runs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# benchmarks/harness.py
+"""
+Utilidades compartidas por los benchmarks: base de datos temporal sembrada
+con inserciones masivas, sesión falsa de la Bot API y fábricas de updates.
+
+Los módulos de la aplicación leen la configuración al importarse, por eso
+`prepare_environment()` debe llamarse antes de importar cualquiera de ellos.
+"""
+import os
+import random
+import resource
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, AsyncGenerator, Dict, Iterator, Optional
+
+BENCH_TOKEN = "42:BENCHMARK-TOKEN"
+USER_ID_OFFSET = 10_000_000  # Los IDs sembrados parecen IDs reales de Telegram
+INSERT_CHUNK = 50_000
+DAILY_POINTS_SEED_DAYS = 35  # Cubre la ventana mensual y lo que purga el job
+
+
+def prepare_environment(db_path: Optional[str] = None) -> str:
+    """
+    Configura las variables de entorno para apuntar a una base SQLite temporal.
+    Devuelve la ruta del archivo de base de datos.
+    """
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.db")
+    os.environ["BOT_TOKEN"] = BENCH_TOKEN
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ.setdefault("ADMIN_IDS", f"[{USER_ID_OFFSET}]")
+    return db_path
+
+
+def quiet_logger(level: str = "WARNING") -> None:
+    """Reduce el ruido de loguru para que el log no domine las mediciones."""
+    import sys
+    from utils.logger import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level=level, format="{time} {level} {message}")
+
+
+def _chunked(rows: Iterator[tuple], size: int = INSERT_CHUNK) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _level_for(points: int, levels: list[dict]) -> int:
+    level_id = 1
+    for level in levels:
+        if points >= level["points_required"]:
+            level_id = level["id"]
+    return level_id
+
+
+def seed_database(db_path: str, users: int, purchases_per_user: float = 1.0, seed: int = 1234) -> Dict[str, int]:
+    """
+    Crea el esquema y siembra `users` usuarios, sus compras y los datos de
+    referencia usando `executemany` en bloques (sin pasar por el ORM).
+    """
+    from sqlalchemy import create_engine
+    from database.base_model import Base
+    from database.db import load_models
+    from database.models.level import INITIAL_LEVELS
+    from database.models.badge import INITIAL_BADGES
+    from database.models.reward import INITIAL_REWARDS
+    from database.models.mission import INITIAL_MISSIONS
+
+    load_models()
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    levels = sorted(INITIAL_LEVELS, key=lambda level: level["points_required"])
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA journal_mode=MEMORY")
+    with conn:
+        conn.executemany(
+            "INSERT INTO levels (id, name, points_required, description) VALUES (:id, :name, :points_required, :description)",
+            INITIAL_LEVELS,
+        )
+        conn.executemany(
+            "INSERT INTO badges (id, name, description, image_url) VALUES (:id, :name, :description, :image_url)",
+            INITIAL_BADGES,
+        )
+        conn.executemany(
+            "INSERT INTO rewards (id, name, description, points_cost, stock, image_url) "
+            "VALUES (:id, :name, :description, :points_cost, :stock, :image_url)",
+            INITIAL_REWARDS,
+        )
+        conn.executemany(
+            "INSERT INTO missions (id, name, description, event_type, target, period, reward_points, active) "
+            "VALUES (:id, :name, :description, :event_type, :target, :period, :reward_points, :active)",
+            INITIAL_MISSIONS,
+        )
+
+    def user_rows() -> Iterator[tuple]:
+        for i in range(users):
+            points = int(rng.paretovariate(1.2) * 100) % 20_000
+            join_date = now - timedelta(days=rng.randint(0, 730), seconds=rng.randint(0, 86_400))
+            # ~1/7 de los usuarios vence hoy la semana y ~1/30 el mes
+            days_in = (now - join_date).days
+            if days_in < 180:
+                milestone_due = join_date + timedelta(days=180)
+            elif days_in < 365:
+                milestone_due = join_date + timedelta(days=365)
+            else:
+                milestone_due = datetime(9999, 12, 31)  # Hitos ya cobrados
+            yield (
+                USER_ID_OFFSET + i, f"user{i}", f"Usuario{i}", None, points, _level_for(points, levels),
+                now - timedelta(hours=rng.randint(0, 240)), rng.randint(0, 50), 0, now,
+                0, rng.randint(0, 12), join_date, 0, "[]",
+                now + timedelta(days=rng.uniform(-1, 6)), now + timedelta(days=rng.uniform(-1, 29)),
+                milestone_due, rng.randint(0, 10), 0,
+            )
+
+    user_sql = (
+        "INSERT INTO users (id, username, first_name, last_name, points, level_id, last_interaction_at, "
+        "interactions_count, daily_points_earned, last_daily_reset, is_admin, purchase_count, join_date, "
+        "total_redeemed_rewards_value, badges_json, next_permanence_due_at, next_monthly_due_at, "
+        "next_milestone_due_at, weekly_streak, purchase_points_total) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    for chunk in _chunked(user_rows()):
+        with conn:
+            conn.executemany(user_sql, chunk)
+
+    total_purchases = int(users * purchases_per_user)
+
+    def purchase_rows() -> Iterator[tuple]:
+        for _ in range(total_purchases):
+            amount = rng.choice((99.0, 150.0, 250.0, 350.0, 500.0))
+            yield (
+                USER_ID_OFFSET + rng.randrange(users), amount, int(amount * 0.7),
+                "Compra sembrada", now - timedelta(days=rng.randint(0, 730)),
+            )
+
+    purchase_sql = (
+        "INSERT INTO purchases (user_id, amount, points_awarded, description, purchase_date) VALUES (?, ?, ?, ?, ?)"
+    )
+    for chunk in _chunked(purchase_rows()):
+        with conn:
+            conn.executemany(purchase_sql, chunk)
+
+    # Buckets de puntos diarios (rankings por periodo): ~2% de usuarios activos por día
+    active_per_day = max(1, users // 50)
+
+    def daily_points_rows() -> Iterator[tuple]:
+        for days_ago in range(DAILY_POINTS_SEED_DAYS):
+            day = (now - timedelta(days=days_ago)).date()
+            for user_index in rng.sample(range(users), min(users, active_per_day)):
+                yield (USER_ID_OFFSET + user_index, day, rng.randint(1, 40))
+
+    for chunk in _chunked(daily_points_rows()):
+        with conn:
+            conn.executemany("INSERT INTO daily_points (user_id, day, points) VALUES (?, ?, ?)", chunk)
+    conn.close()
+
+    return {
+        "users": users,
+        "purchases": total_purchases,
+        "rewards": len(INITIAL_REWARDS),
+        "daily_points": DAILY_POINTS_SEED_DAYS * min(users, active_per_day),
+    }
+
+
+def make_stub_session():
+    """
+    Crea una sesión de la Bot API que no hace red: responde a cada método con
+    un resultado sintético y cuenta las llamadas.
+    """
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import EditMessageText, SendDocument, SendMessage
+    from aiogram.types import Chat, Message
+
+    class StubBotSession(BaseSession):
+        def __init__(self) -> None:
+            super().__init__()
+            self.requests: Dict[str, int] = {}
+            self._message_id = 0
+
+        async def make_request(self, bot, method, timeout=None) -> Any:
+            name = type(method).__name__
+            self.requests[name] = self.requests.get(name, 0) + 1
+            if isinstance(method, (SendMessage, EditMessageText, SendDocument)):
+                self._message_id += 1
+                chat_id = getattr(method, "chat_id", None) or 0
+                # Montado en el bot, como los que devuelve la sesión real (permite .edit_text())
+                return Message(
+                    message_id=self._message_id,
+                    date=datetime.now(),
+                    chat=Chat(id=int(chat_id), type="private"),
+                    text=getattr(method, "text", None),
+                ).as_(bot)
+            return True
+
+        async def close(self) -> None:
+            pass
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536,
+                                 raise_for_status=True) -> AsyncGenerator[bytes, None]:
+            yield b""
+
+    return StubBotSession()
+
+
+def make_message_update(update_id: int, user_id: int, text: str):
+    """Construye un Update con un mensaje de texto privado."""
+    from aiogram.types import Chat, Message, Update, User as TgUser
+
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=TgUser(id=user_id, is_bot=False, first_name=f"Usuario{user_id}", username=f"user{user_id}"),
+            text=text,
+        ),
+    )
+
+
+def make_callback_update(update_id: int, user_id: int, data: str):
+    """Construye un Update con un CallbackQuery sobre un mensaje del bot."""
+    from aiogram.types import CallbackQuery, Chat, Message, Update, User as TgUser
+
+    tg_user = TgUser(id=user_id, is_bot=False, first_name=f"Usuario{user_id}", username=f"user{user_id}")
+    return Update(
+        update_id=update_id,
+        callback_query=CallbackQuery(
+            id=str(update_id),
+            from_user=tg_user,
+            chat_instance="bench",
+            data=data,
+            message=Message(
+                message_id=update_id,
+                date=datetime.now(),
+                chat=Chat(id=user_id, type="private"),
+                text="benchmark",
+            ),
+        ),
+    )
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Percentil por el método del rango más cercano sobre una lista ordenada."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_kb() -> int:
+    """Pico de memoria residente del proceso (KB en Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def split_into_shards(db_path: str, shard_paths: list[str]) -> Dict[str, int]:
+    """
+    Reparte las filas por usuario de una base sembrada en los archivos de los
+    shards (según `database.shards.shard_for`) y las borra del archivo principal.
+    DB_SHARD_URLS debe apuntar ya a `shard_paths`. Devuelve los usuarios por shard.
+    """
+    from sqlalchemy import create_engine
+    from database.base_model import Base
+    from database.db import load_models
+    from database.shards import USER_SCOPED_TABLES, PARTITIONED_TABLES, shard_for
+
+    load_models()
+    shard_tables = [table for table in Base.metadata.sorted_tables if table.name in USER_SCOPED_TABLES | PARTITIONED_TABLES]
+    scoped = [table.name for table in shard_tables if table.name in USER_SCOPED_TABLES]
+    users_per_shard = {}
+    for index, shard_path in enumerate(shard_paths):
+        sync_engine = create_engine(f"sqlite:///{shard_path}")
+        Base.metadata.create_all(sync_engine, tables=shard_tables)
+        sync_engine.dispose()
+
+        conn = sqlite3.connect(shard_path)
+        conn.create_function("shard_of", 1, lambda user_id: int(shard_for(user_id).removeprefix("shard")), deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS seed", (db_path,))
+        with conn:
+            for name in scoped:
+                key = "id" if name == "users" else "user_id"
+                conn.execute(f"INSERT INTO main.{name} SELECT * FROM seed.{name} WHERE shard_of({key}) = ?", (index,))
+        users_per_shard[f"shard{index}"] = conn.execute("SELECT count(*) FROM main.users").fetchone()[0]
+        conn.close()
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for name in scoped:
+            conn.execute(f"DELETE FROM {name}")
+    conn.execute("VACUUM")
+    conn.close()
+    return users_per_shard
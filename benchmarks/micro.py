@@ -0,0 +1,249 @@
+# benchmarks/micro.py
+"""
+Micro-benchmarks de las funciones puras que corren en casi cada update:
+formateadores de utils/formatter.py, teclados de keyboards/inline.py,
+`PurchaseService._calculate_points`, `newbot GamificationService.calculate_level`
+y la lectura/escritura del JSON de insignias.
+
+Cada caso se mide con `timeit`: `autorange` elige cuántas llamadas hacen falta
+para ~0,2 s y la medición se repite `--repeat` veces, en rondas que pasan por
+todos los casos. Justo antes de cada medición se mide una carga fija de
+referencia (`_calibration`, sin código de la aplicación). Se reporta el tiempo
+por llamada (ns) mínimo y mediano, y `relative`: la mediana de los cocientes
+entre cada medición y su referencia. `compare` compara esos cocientes, así que
+una máquina que va más lenta o más rápida que cuando se guardó la línea base,
+o una racha de ruido durante la medición, no se confunde con una regresión.
+Las entradas imitan las reales (niveles, recompensas e insignias del catálogo
+inicial, usuarios con nombre y varias insignias).
+
+La línea base guardada (benchmarks/baselines/micro.json) solo es comparable
+con mediciones de la misma máquina y versión de Python: al cambiar de máquina,
+se regenera con `run --output`.
+
+Uso:
+    python -m benchmarks.micro run                                   # imprime el JSON
+    python -m benchmarks.micro run --output benchmarks/baselines/micro.json
+    python -m benchmarks.micro compare                               # mide y compara con la línea base
+    python -m benchmarks.micro compare --current nueva.json --threshold 0.05
+    python -m benchmarks.micro run --filter keyboard
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+from typing import Callable
+
+from benchmarks import harness
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+DEFAULT_THRESHOLD = 0.20  # Regresión: el tiempo relativo supera al de la línea base en más de un 20% (el ruido entre corridas llega a ~10%)
+DEFAULT_REPEAT = 10
+CALIBRATION = "_calibration"
+
+# Montos de compra que cubren todos los tramos de _calculate_points (incluidos los exactos)
+PURCHASE_AMOUNTS = [35.0, 99.9, 100.0, 149.0, 150.0, 249.5, 250.0, 300.0, 350.0, 420.0, 499.0, 500.0, 1200.0]
+# Puntos de usuarios por debajo, en y por encima de cada umbral de nivel
+LEVEL_POINTS = [0, 42, 99, 100, 250, 300, 599, 600, 999, 1000, 15_000]
+
+
+def _calibration() -> int:
+    # Carga fija de referencia: aritmética, llamadas y formateo de cadenas en Python puro
+    return len("".join(f"{i}:{i * 7 % 13};" for i in range(40)))
+
+
+def _run_coroutine(coroutine):
+    """Ejecuta una corrutina que no espera nada (p. ej. un método async sin E/S) sin bucle de eventos."""
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("La corrutina quedó a la espera de E/S")
+
+
+def build_cases() -> dict[str, Callable[[], object]]:
+    """Casos: nombre -> función sin argumentos que hace una llamada con entradas realistas."""
+    from database.db import load_models
+    from database.models.badge import INITIAL_BADGES
+    from database.models.level import INITIAL_LEVELS, Level
+    from database.models.reward import INITIAL_REWARDS, Reward
+    from database.models.user import User
+    from keyboards import inline
+    from newbot.services.gamification_service import GamificationService
+    from services.badge_service import BadgeService, badge_rules
+    from services.purchase_service import PurchaseService
+    from utils import formatter
+
+    load_models()
+    levels = [Level(**level) for level in INITIAL_LEVELS]
+    rewards = [Reward(**reward) for reward in INITIAL_REWARDS]
+    badges = [{key: badge[key] for key in ("id", "name", "description", "image_url")} for badge in INITIAL_BADGES[:3]]
+    badges_json = json.dumps(badges)
+    user = User(
+        id=harness.USER_ID_OFFSET + 7, username="maria_vip", first_name="María", points=2150,
+        level_id=3, badges_json=badges_json, purchase_count=4,
+    )
+    other = User(id=harness.USER_ID_OFFSET + 8, username=None, first_name="Jorge", points=1870, level_id=3)
+    cursor = "MjAyNS0wMy0xNFQxODo0MjowNy4xMjM0NTZ8MTIzNDU2"
+    purchase_service = PurchaseService(None)
+    badge_service = BadgeService(None)
+
+    def award_purchase_badge():
+        # Cruza el umbral de "Comprador Frecuente": decodifica y vuelve a codificar el JSON
+        user.badges_json = badges_json
+        return badge_rules.award(user, "purchase_count", 4, 5)
+
+    return {
+        "format_user_status": lambda: formatter.format_user_status(user, levels[2], levels[3], 850, badges),
+        "format_user_status_max_level": lambda: formatter.format_user_status(user, levels[4], None, 0, badges),
+        "format_ranking_entry_anonymous": lambda: formatter.format_ranking_entry_anonymous(4, other, levels[2], user.id),
+        "format_ranking_entry_self": lambda: formatter.format_ranking_entry_anonymous(1, user, levels[2], user.id, 320),
+        "format_progress_bar": lambda: formatter.format_progress_bar(650, 1500),
+        "format_reward_details": lambda: formatter.format_reward_details(rewards[1]),
+        "keyboard_reaction": lambda: inline.get_reaction_keyboard("post_1842"),
+        "keyboard_survey_options": lambda: inline.get_survey_options_keyboard(
+            "survey_77", ["Sí, me encanta", "Está bien", "Podría mejorar", "No me interesa"]
+        ),
+        "keyboard_narrative_decision": lambda: inline.get_narrative_decision_keyboard(
+            "decision_12", {"Abrir la puerta": "door", "Seguir el pasillo": "hall", "Volver atrás": "back"}
+        ),
+        "keyboard_rewards_catalog": lambda: inline.get_rewards_catalog_keyboard(rewards),
+        "keyboard_confirm_redeem": lambda: inline.get_confirm_redeem_keyboard(3),
+        "keyboard_purchase_history": lambda: inline.get_purchase_history_keyboard(2, cursor),
+        # Un caso = un recorrido de todos los montos / puntos de ejemplo
+        "purchase_calculate_points": lambda: [purchase_service._calculate_points(amount) for amount in PURCHASE_AMOUNTS],
+        "newbot_calculate_level": lambda: [GamificationService.calculate_level(points) for points in LEVEL_POINTS],
+        "badges_json_parse": lambda: _run_coroutine(badge_service.get_user_badges(user)),
+        "badges_json_award": award_purchase_badge,
+    }
+
+
+def measure(cases: dict[str, Callable[[], object]], repeat: int) -> dict[str, dict]:
+    """
+    Tiempo por llamada de cada caso en `repeat` rondas intercaladas, y su
+    cociente con la carga de referencia medida justo antes.
+    """
+    reference = timeit.Timer(_calibration)
+    reference_number = max(reference.autorange()[0] // 4, 1)  # ~50 ms por medición
+    timers = {name: timeit.Timer(function) for name, function in cases.items()}
+    numbers = {name: timer.autorange()[0] for name, timer in timers.items()}
+    per_call: dict[str, list[float]] = {name: [] for name in cases}
+    relative: dict[str, list[float]] = {name: [] for name in cases}
+    references: list[float] = []
+    for _ in range(repeat):
+        for name, timer in timers.items():
+            references.append(reference.timeit(reference_number) / reference_number * 1e9)
+            per_call[name].append(timer.timeit(numbers[name]) / numbers[name] * 1e9)
+            relative[name].append(per_call[name][-1] / references[-1])
+    results = {
+        name: {
+            "number": numbers[name],
+            "min_ns": round(min(values), 1),
+            "median_ns": round(statistics.median(values), 1),
+            "relative": round(statistics.median(relative[name]), 5),
+        }
+        for name, values in per_call.items()
+    }
+    results[CALIBRATION] = {"number": reference_number, "min_ns": round(min(references), 1)}
+    return results
+
+
+def run(args: argparse.Namespace) -> dict:
+    cases = {
+        name: function for name, function in build_cases().items()
+        if not args.filter or any(pattern in name for pattern in args.filter)
+    }
+    results = measure(cases, args.repeat)
+    calibration = results.pop(CALIBRATION)
+    for name, result in results.items():
+        print(f"{name}: {result['min_ns']:.1f} ns", file=sys.stderr)
+    return {
+        "benchmark": "micro",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "calibration_ns": calibration["min_ns"],
+        "cases": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> tuple[list[str], list[str]]:
+    """
+    Compara por caso el tiempo relativo a la carga de referencia. Retorna las
+    líneas del informe y los casos que empeoran más que `threshold`
+    (fracción, 0.20 = 20%).
+    """
+    lines = [
+        f"Referencia: {baseline['calibration_ns']:.1f} ns en la línea base, {current['calibration_ns']:.1f} ns ahora",
+        f"{'caso':<32} {'base ns':>12} {'actual ns':>12} {'cambio':>8}",
+    ]
+    regressions = []
+    for name, result in current["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            lines.append(f"{name:<32} {'-':>12} {result['min_ns']:>12.1f} {'nuevo':>8}")
+            continue
+        change = result["relative"] / base["relative"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESIÓN"
+        lines.append(f"{name:<32} {base['min_ns']:>12.1f} {result['min_ns']:>12.1f} {change:>+8.1%}{flag}")
+    if baseline.get("python") != current.get("python") or baseline.get("platform") != current.get("platform"):
+        lines.append(
+            f"Aviso: la línea base es de Python {baseline.get('python')} en {baseline.get('platform')}; "
+            "los tiempos pueden no ser comparables."
+        )
+    return lines, regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("run", "Mide los casos y emite el JSON"), ("compare", "Mide (o lee) y compara con la línea base")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Repeticiones de cada medición")
+        command.add_argument("--filter", nargs="*", default=[], help="Solo los casos cuyo nombre contiene alguno de estos textos")
+    commands.choices["run"].add_argument("--output", default=None, help="Archivo JSON de salida (por defecto stdout)")
+    compare_parser = commands.choices["compare"]
+    compare_parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON de la línea base")
+    compare_parser.add_argument("--current", default=None, help="JSON ya medido (por defecto se mide ahora)")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Empeoramiento tolerado (0.20 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    harness.prepare_environment()
+    harness.quiet_logger()
+
+    if args.command == "run":
+        payload = json.dumps(run(args), indent=2, ensure_ascii=False)
+        if args.output:
+            os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+            with open(args.output, "w", encoding="utf-8") as fh:
+                fh.write(payload + "\n")
+        else:
+            print(payload)
+        return
+
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    if args.current:
+        with open(args.current, encoding="utf-8") as fh:
+            current = json.load(fh)
+    else:
+        current = run(args)
+    lines, regressions = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"{len(regressions)} caso(s) más de un {args.threshold:.0%} más lentos: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
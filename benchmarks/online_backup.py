@@ -0,0 +1,205 @@
+# benchmarks/online_backup.py
+"""
+Impacto de la copia de seguridad en caliente (`services/backup_service.py`)
+sobre las escrituras de los handlers.
+
+Cada operación imita un handler: registra la interacción del usuario
+(`UserService.register_user`) y le suma puntos (`PointsService.add_points`).
+En los modos con copia, mientras corren las operaciones se hacen copias de la
+base una tras otra (`backup_database`), así que toda la medición transcurre
+con una copia en curso. Cada modo corre en un subproceso propio sobre una
+copia de la misma base sembrada. Reporta throughput, latencias p50/p99 de las
+operaciones y, por copia, duración, pasos y tamaño; comprueba que todas las
+copias pasen integrity_check y que los puntos sumados coincidan.
+
+Modos:
+    none         sin copia: la referencia
+    stepped      copia por pasos de --pages páginas con --sleep-ms de pausa
+    single_step  copia en un solo paso (pages=-1, sin pausas)
+
+Uso:
+    python -m benchmarks.online_backup
+    python -m benchmarks.online_backup --users 200000 --operations 5000 --pages 128
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import harness
+
+MODES = ("none", "stepped", "single_step")
+
+
+async def run_mode(args: argparse.Namespace) -> dict:
+    harness.prepare_environment(args.db_path)
+    os.environ["BACKUP_DIR"] = os.path.join(os.path.dirname(args.db_path), f"backups_{args.run_mode}")
+    os.environ["BACKUP_KEEP"] = "2"
+    harness.quiet_logger()
+
+    from sqlalchemy import func, select
+    from database.db import AsyncSessionLocal, engine
+    from database.models.user import User
+    from database.writer import close_write_actor
+    from services.backup_service import backup_database
+    from services.points_service import PointsService
+    from services.user_service import UserService
+
+    async def total_points() -> int:
+        async with AsyncSessionLocal() as session:
+            return await session.scalar(select(func.coalesce(func.sum(User.points), 0)))
+
+    points_before = await total_points()
+    rng = random.Random(args.seed)
+    awarded = 0
+
+    async def operation() -> None:
+        nonlocal awarded
+        user_id = harness.USER_ID_OFFSET + rng.randrange(args.users)
+        async with AsyncSessionLocal() as session:
+            user, _ = await UserService(session).register_user(user_id, username=f"user{user_id}", count_interaction=True)
+            await PointsService(session).add_points(user, 5, "benchmark")
+            awarded += 5
+
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(range(args.operations))
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in queue:
+            started = time.perf_counter()
+            try:
+                await operation()
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"{type(e).__name__}: {e}", file=sys.stderr)
+            latencies.append(time.perf_counter() - started)
+
+    backups: list[dict] = []
+    backup_errors = 0
+    done = asyncio.Event()
+
+    async def backup_loop() -> None:
+        nonlocal backup_errors
+        pages, sleep_seconds = (args.pages, args.sleep_ms / 1000) if args.run_mode == "stepped" else (-1, 0.0)
+        while not done.is_set():
+            try:
+                backups.append(await backup_database(pages=pages, sleep_seconds=sleep_seconds))
+            except Exception as e:
+                backup_errors += 1
+                print(f"{type(e).__name__}: {e}", file=sys.stderr)
+                return
+
+    backup_task = asyncio.create_task(backup_loop()) if args.run_mode != "none" else None
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    if backup_task is not None:
+        await backup_task
+    await close_write_actor()
+    points_delta = await total_points() - points_before
+    await engine.dispose()
+
+    latencies.sort()
+    durations = [backup["seconds"] for backup in backups]
+    return {
+        "mode": args.run_mode,
+        "operations": args.operations,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_ops": round(args.operations / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(harness.percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(harness.percentile(latencies, 99) * 1000, 3),
+        "backups": len(backups),
+        "backup_errors": backup_errors,
+        "backup_mean_s": round(sum(durations) / len(durations), 3) if durations else None,
+        "backup_steps": backups[0]["steps"] if backups else None,
+        "backup_bytes": backups[0]["bytes"] if backups else None,
+        "consistent": points_delta == awarded and not backup_errors,
+        "peak_rss_kb": harness.peak_rss_kb(),
+    }
+
+
+def _run_in_subprocess(args: argparse.Namespace, mode: str, db_path: str) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.online_backup",
+        "--run-mode", mode,
+        "--db-path", db_path,
+        "--users", str(args.users),
+        "--operations", str(args.operations),
+        "--concurrency", str(args.concurrency),
+        "--pages", str(args.pages),
+        "--sleep-ms", str(args.sleep_ms),
+        "--seed", str(args.seed),
+    ]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    sys.stderr.write(completed.stderr)
+    return json.loads(completed.stdout)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--operations", type=int, default=3_000, help="Operaciones (handlers simulados) por modo")
+    parser.add_argument("--concurrency", type=int, default=16, help="Operaciones en paralelo")
+    parser.add_argument("--pages", type=int, default=256, help="Páginas por paso en el modo stepped")
+    parser.add_argument("--sleep-ms", type=float, default=10.0, help="Pausa entre pasos en el modo stepped")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--run-mode", choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--db-path", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help="Archivo JSON de salida (por defecto stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.run_mode:
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_online_backup_")
+    seed_path = os.path.join(workdir, "seed.db")
+    harness.prepare_environment(seed_path)
+    dataset = harness.seed_database(seed_path, args.users, 1.0, args.seed)
+    dataset["db_bytes"] = os.path.getsize(seed_path)
+    runs = []
+    for mode in args.modes:
+        db_path = os.path.join(workdir, f"{mode}.db")
+        shutil.copyfile(seed_path, db_path)
+        runs.append(_run_in_subprocess(args, mode, db_path))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "online_backup",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dataset,
+        "concurrency": args.concurrency,
+        "pages": args.pages,
+        "sleep_ms": args.sleep_ms,
+        "runs": runs,
+    }
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+    if any(not run["consistent"] for run in runs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
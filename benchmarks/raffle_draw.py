@@ -0,0 +1,118 @@
+# benchmarks/raffle_draw.py
+"""
+Sorteo ponderado sin reemplazo de `services/raffle_service.draw_winners`
+(suma acumulada + `searchsorted`, con rechazo de ganadores repetidos) frente a
+`numpy.random.Generator.choice(..., replace=False, p=...)` sobre los mismos
+boletos por participante.
+
+Los boletos por participante siguen una distribución de cola larga (pocos
+usuarios con muchos boletos), como en un sorteo real con boletos comprados con
+puntos. Además de los tiempos, comprueba que:
+- la misma semilla reproduce los mismos ganadores (auditoría);
+- la frecuencia del primer ganador en muchos sorteos pequeños coincide con la
+  proporción de boletos de cada participante.
+
+Uso:
+    python -m benchmarks.raffle_draw
+    python -m benchmarks.raffle_draw --participants 2000000 --winners 1 10 100 1000
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from benchmarks import harness
+
+
+def make_entries(participants: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    user_ids = np.arange(participants, dtype=np.int64) + 10_000_000
+    tickets = np.minimum(rng.zipf(1.8, size=participants), 10_000).astype(np.int64)
+    return user_ids, tickets
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def fairness(trials: int, seed: int) -> dict:
+    """Máxima desviación entre la frecuencia del primer ganador y su proporción de boletos."""
+    from services.raffle_service import draw_winners
+
+    user_ids = np.arange(8, dtype=np.int64)
+    tickets = np.array([1, 2, 3, 5, 8, 13, 21, 34], dtype=np.int64)
+    counts = np.zeros(len(user_ids), dtype=np.int64)
+    for trial in range(trials):
+        counts[draw_winners(user_ids, tickets, 3, seed + trial)[0]] += 1
+    expected = tickets / tickets.sum()
+    return {"trials": trials, "max_abs_deviation": round(float(np.abs(counts / trials - expected).max()), 4)}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=1_000_000)
+    parser.add_argument("--winners", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por medición (se toma la mejor)")
+    parser.add_argument("--skip-baseline", action="store_true", help="No medir Generator.choice (lento con K grande)")
+    parser.add_argument("--fairness-trials", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=None, help="Archivo JSON de salida (por defecto stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    harness.prepare_environment()
+    harness.quiet_logger()
+    from services.raffle_service import draw_winners
+
+    user_ids, tickets = make_entries(args.participants, args.seed)
+    probabilities = tickets / tickets.sum()
+
+    runs = []
+    for winners_count in args.winners:
+        run = {
+            "winners": winners_count,
+            "draw_ms": round(_best_of(args.repeat, lambda: draw_winners(user_ids, tickets, winners_count, args.seed)) * 1000, 3),
+        }
+        if not args.skip_baseline:
+            rng = np.random.default_rng(args.seed)
+            run["generator_choice_ms"] = round(_best_of(
+                args.repeat, lambda: rng.choice(len(user_ids), winners_count, replace=False, p=probabilities)
+            ) * 1000, 3)
+        runs.append(run)
+
+    winners = max(args.winners)
+    reproducible = draw_winners(user_ids, tickets, winners, args.seed) == draw_winners(user_ids, tickets, winners, args.seed)
+    report = {
+        "benchmark": "raffle_draw",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "participants": args.participants,
+        "total_tickets": int(tickets.sum()),
+        "runs": runs,
+        "reproducible": reproducible,
+        "fairness": fairness(args.fairness_trials, args.seed),
+    }
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+    if not reproducible:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
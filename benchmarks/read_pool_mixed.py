@@ -0,0 +1,200 @@
+# benchmarks/read_pool_mixed.py
+"""
+Carga mixta de lecturas y escrituras: pool de lectura de solo lectura
+(`database/read_pool.py`) frente a las mismas lecturas sobre el engine de
+aiosqlite que comparten con las escrituras.
+
+Lectores concurrentes ejecutan las rutinas de /catalogo, /ranking, /status y
+/myrewards mientras escritores concurrentes suman puntos (una transacción por
+operación, como un handler). Cada modo corre en un subproceso propio sobre una
+copia de la misma base sembrada. Reporta throughput y latencias p50/p99 de
+lecturas y escrituras en JSON.
+
+Modos:
+    engine      READ_POOL_SIZE=0: las rutinas corren con run_sync en el engine compartido
+    read_pool   READ_POOL_SIZE=N: las rutinas corren en el pool de solo lectura
+
+Uso:
+    python -m benchmarks.read_pool_mixed
+    python -m benchmarks.read_pool_mixed --users 100000 --reads 4000 --writes 1000 --pool-size 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import harness
+
+MODES = ("engine", "read_pool")
+READ_ROUTINES = ("catalogo", "ranking", "status", "myrewards")
+
+
+def _summary(latencies: list[float], elapsed: float, errors: int) -> dict:
+    latencies.sort()
+    return {
+        "operations": len(latencies),
+        "errors": errors,
+        "throughput_ops": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(harness.percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(harness.percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run_mode(args: argparse.Namespace) -> dict:
+    harness.prepare_environment(args.db_path)
+    os.environ["READ_POOL_SIZE"] = str(args.pool_size if args.run_mode == "read_pool" else 0)
+    harness.quiet_logger()
+
+    from database.db import AsyncSessionLocal, engine
+    from database.models.user import User
+    from database.read_pool import close_read_pool
+    from services.level_service import LevelService
+    from services.points_service import PointsService
+    from services.purchase_service import PurchaseService
+    from services.ranking_service import RankingService
+    from services.reward_service import RewardService
+
+    rng = random.Random(args.seed)
+
+    def random_user() -> int:
+        return harness.USER_ID_OFFSET + rng.randrange(args.users)
+
+    async def read(routine: str) -> None:
+        async with AsyncSessionLocal() as session:
+            user_id = random_user()
+            if routine == "catalogo":
+                await RewardService(session, None).get_active_rewards()
+            elif routine == "ranking":
+                await RankingService(session).get_ranking_snapshot(user_id, 10)
+            elif routine == "status":
+                await LevelService(session).get_status_levels(rng.randrange(1, 6), rng.randrange(5_000))
+            else:
+                await PurchaseService(session).get_purchase_page(user_id, None, 10)
+
+    async def write() -> None:
+        async with AsyncSessionLocal() as session:
+            user = await session.get(User, random_user())
+            await PointsService(session).add_points(user, 5, "benchmark")
+
+    async def drain(operations, concurrency: int, latencies: list[float]) -> int:
+        errors = 0
+
+        async def worker() -> None:
+            nonlocal errors
+            for operation in operations:
+                started = time.perf_counter()
+                try:
+                    await operation()
+                except Exception as e:
+                    errors += 1
+                    if errors <= 3:
+                        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return errors
+
+    # Calentamiento: ventanas, pool de lectura y conexiones del engine
+    for routine in READ_ROUTINES:
+        await read(routine)
+
+    reads = iter([lambda routine=rng.choice(READ_ROUTINES): read(routine) for _ in range(args.reads)])
+    writes = iter([write] * args.writes)
+    read_latencies: list[float] = []
+    write_latencies: list[float] = []
+    started = time.perf_counter()
+    read_task = asyncio.ensure_future(drain(reads, args.readers, read_latencies))
+    write_task = asyncio.ensure_future(drain(writes, args.writers, write_latencies))
+    read_errors, write_errors = await asyncio.gather(read_task, write_task)
+    elapsed = time.perf_counter() - started
+
+    close_read_pool()
+    await engine.dispose()
+    return {
+        "mode": args.run_mode,
+        "elapsed_s": round(elapsed, 4),
+        "reads": _summary(read_latencies, elapsed, read_errors),
+        "writes": _summary(write_latencies, elapsed, write_errors),
+        "peak_rss_kb": harness.peak_rss_kb(),
+    }
+
+
+def _run_in_subprocess(args: argparse.Namespace, mode: str, db_path: str) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.read_pool_mixed",
+        "--run-mode", mode,
+        "--db-path", db_path,
+        "--users", str(args.users),
+        "--reads", str(args.reads),
+        "--writes", str(args.writes),
+        "--readers", str(args.readers),
+        "--writers", str(args.writers),
+        "--pool-size", str(args.pool_size),
+        "--seed", str(args.seed),
+    ]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    sys.stderr.write(completed.stderr)
+    return json.loads(completed.stdout)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--purchases-per-user", type=float, default=1.0)
+    parser.add_argument("--reads", type=int, default=4_000, help="Lecturas totales por modo")
+    parser.add_argument("--writes", type=int, default=1_000, help="Escrituras totales por modo")
+    parser.add_argument("--readers", type=int, default=16, help="Lectores concurrentes")
+    parser.add_argument("--writers", type=int, default=4, help="Escritores concurrentes")
+    parser.add_argument("--pool-size", type=int, default=4, help="Conexiones del pool de lectura en el modo read_pool")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--run-mode", choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--db-path", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help="Archivo JSON de salida (por defecto stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.run_mode:
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_read_pool_")
+    seed_path = os.path.join(workdir, "seed.db")
+    harness.prepare_environment(seed_path)
+    dataset = harness.seed_database(seed_path, args.users, args.purchases_per_user, args.seed)
+    runs = []
+    for mode in args.modes:
+        db_path = os.path.join(workdir, f"{mode}.db")
+        shutil.copyfile(seed_path, db_path)
+        runs.append(_run_in_subprocess(args, mode, db_path))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "read_pool_mixed",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dataset,
+        "readers": args.readers,
+        "writers": args.writers,
+        "runs": runs,
+    }
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
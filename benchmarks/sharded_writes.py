@@ -0,0 +1,236 @@
+# benchmarks/sharded_writes.py
+"""
+Escrituras concurrentes con los datos de usuario en un solo archivo frente a
+repartidos en N shards (`database/shards.py`), cada uno con su escritor de
+commit agrupado.
+
+Cada operación imita un handler: registra la interacción del usuario
+(`UserService.register_user`), le suma puntos (`PointsService.add_points`) y,
+en una de cada `--purchase-every` operaciones, registra una compra. Cada modo
+corre en un subproceso propio sobre una copia de la misma base sembrada (en
+modo shards, con los usuarios ya repartidos). Reporta throughput, latencias
+p50/p99 y commits, comprueba que los puntos sumados a los usuarios coincidan
+con los de los buckets diarios del ranking y que el top-N del ranking (mezcla
+k-way de los top-N por shard) sea igual al de ordenar todos los usuarios.
+
+Modos:
+    single   DB_SHARD_URLS vacío: todo en la base principal, un escritor
+    sharded  --shards archivos de usuario, un escritor por shard
+
+Uso:
+    python -m benchmarks.sharded_writes
+    python -m benchmarks.sharded_writes --users 100000 --operations 5000 --shards 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import harness
+
+MODES = ("single", "sharded")
+TOP_LIMIT = 10
+
+
+class _CommitCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+
+def _shard_paths(workdir: str, shards: int) -> list[str]:
+    return [os.path.join(workdir, f"shard{index}.db") for index in range(shards)]
+
+
+def _set_shard_urls(workdir: str, shards: int) -> None:
+    """Configura DB_SHARD_URLS (antes de importar la aplicación: la lee al importarse)."""
+    urls = [f"sqlite+aiosqlite:///{path}" for path in _shard_paths(workdir, shards)]
+    os.environ["DB_SHARD_URLS"] = json.dumps(urls)
+
+
+async def run_mode(args: argparse.Namespace) -> dict:
+    harness.prepare_environment(args.db_path)
+    if args.run_mode == "sharded":
+        _set_shard_urls(os.path.dirname(args.db_path), args.shards)
+    else:
+        os.environ.pop("DB_SHARD_URLS", None)
+    harness.quiet_logger()
+
+    from datetime import date
+    from sqlalchemy import event, func, select
+    from sqlalchemy.engine import Engine
+    from database.db import AsyncSessionLocal, engine
+    from database.models.daily_points import DailyPoints
+    from database.models.user import User
+    from database.shards import close_shard_engines, sharding_enabled, init_shards
+    from database.writer import close_write_actor
+    from services.points_service import PointsService
+    from services.purchase_service import PurchaseService
+    from services.ranking_service import RankingService
+    from services.user_service import UserService
+
+    if sharding_enabled():
+        await init_shards()
+
+    async def totals() -> tuple[int, int]:
+        async with AsyncSessionLocal() as session:
+            # Con shards llega una suma por shard
+            points = sum((await session.execute(select(func.coalesce(func.sum(User.points), 0)))).scalars().all())
+            daily = sum((await session.execute(
+                select(func.coalesce(func.sum(DailyPoints.points), 0)).filter(DailyPoints.day == date.today())
+            )).scalars().all())
+        return points, daily
+
+    points_before, daily_before = await totals()
+    commits = _CommitCounter()
+    event.listen(Engine, "commit", commits)
+
+    rng = random.Random(args.seed)
+    awarded = 0
+
+    async def operation(index: int) -> None:
+        nonlocal awarded
+        user_id = harness.USER_ID_OFFSET + rng.randrange(args.users)
+        async with AsyncSessionLocal() as session:
+            user, _ = await UserService(session).register_user(user_id, username=f"user{user_id}", count_interaction=True)
+            await PointsService(session).add_points(user, 5, "benchmark")
+            awarded += 5
+            if args.purchase_every and index % args.purchase_every == 0:
+                _, points = await PurchaseService(session).register_purchase(user_id, 300.0, "benchmark")
+                awarded += points
+
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(range(args.operations))
+
+    async def worker() -> None:
+        nonlocal errors
+        for index in queue:
+            started = time.perf_counter()
+            try:
+                await operation(index)
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"{type(e).__name__}: {e}", file=sys.stderr)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    await close_write_actor()
+    event.remove(Engine, "commit", commits)
+
+    points_after, daily_after = await totals()
+    async with AsyncSessionLocal() as session:
+        started_top = time.perf_counter()
+        top = await RankingService(session).get_top_users(TOP_LIMIT)
+        top_ms = (time.perf_counter() - started_top) * 1000
+        all_points = (await session.execute(select(User.points))).scalars().all()
+    expected_top = sorted(all_points, reverse=True)[:TOP_LIMIT]
+
+    await close_shard_engines()
+    await engine.dispose()
+    latencies.sort()
+    return {
+        "mode": args.run_mode,
+        "shards": args.shards if args.run_mode == "sharded" else 0,
+        "operations": args.operations,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_ops": round(args.operations / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(harness.percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(harness.percentile(latencies, 99) * 1000, 3),
+        "commits": commits.count,
+        "points_awarded": awarded,
+        "points_delta": points_after - points_before,
+        # Los puntos de los usuarios y los buckets diarios se confirman juntos (incluye premios de misiones)
+        "consistent": points_after - points_before == daily_after - daily_before >= awarded,
+        "top_ms": round(top_ms, 3),
+        "top_matches": [user.points for user, _ in top] == expected_top,
+        "peak_rss_kb": harness.peak_rss_kb(),
+    }
+
+
+def _run_in_subprocess(args: argparse.Namespace, mode: str, db_path: str) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.sharded_writes",
+        "--run-mode", mode,
+        "--db-path", db_path,
+        "--users", str(args.users),
+        "--operations", str(args.operations),
+        "--concurrency", str(args.concurrency),
+        "--purchase-every", str(args.purchase_every),
+        "--shards", str(args.shards),
+        "--seed", str(args.seed),
+    ]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    sys.stderr.write(completed.stderr)
+    return json.loads(completed.stdout)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--operations", type=int, default=2_000, help="Operaciones (handlers simulados) por modo")
+    parser.add_argument("--concurrency", type=int, default=32, help="Operaciones en paralelo")
+    parser.add_argument("--purchase-every", type=int, default=10, help="Una compra cada N operaciones (0 = ninguna)")
+    parser.add_argument("--shards", type=int, default=4, help="Archivos de usuario en el modo sharded")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--run-mode", choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--db-path", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help="Archivo JSON de salida (por defecto stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.run_mode:
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_sharded_writes_")
+    seed_path = os.path.join(workdir, "seed.db")
+    harness.prepare_environment(seed_path)
+    _set_shard_urls(workdir, args.shards)
+    dataset = harness.seed_database(seed_path, args.users, 1.0, args.seed)
+    runs = []
+    for mode in args.modes:
+        db_path = os.path.join(workdir, f"{mode}.db")
+        shutil.copyfile(seed_path, db_path)
+        if mode == "sharded":
+            dataset["users_per_shard"] = harness.split_into_shards(db_path, _shard_paths(workdir, args.shards))
+        runs.append(_run_in_subprocess(args, mode, db_path))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "sharded_writes",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dataset,
+        "concurrency": args.concurrency,
+        "runs": runs,
+    }
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+    if any(not run["consistent"] or not run["top_matches"] for run in runs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,115 @@
+# bot.py
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import Config
-from handlers.start import router as start_router
-from handlers.gamification import router as gamification_router
-from handlers.leaderboard import router as leaderboard_router
-from middlewares.auth import AuthMiddleware
-from utils.logger import Logger
-
-async def start_bot():
-    logger = Logger.setup_logger()
-    logger.info("Initializing bot...")
-    
-    bot = Bot(token=Config.get_bot_token())
+
+from config.settings import settings
+from database.db import AsyncSessionLocal, init_db
+from database.read_pool import close_read_pool
+from database.shards import sharding_enabled, init_shards, close_shard_engines
+from database.writer import close_write_actor
+from handlers.admin.admin_commands import router as admin_router
+from handlers.interactions.callback_handlers import router as interactions_router
+from handlers.users.raffle_commands import router as raffle_router
+from handlers.users.redeem_commands import router as redeem_router
+from handlers.users.user_commands import router as user_router
+from middlewares.db_middleware import DbSessionMiddleware
+from middlewares.overload_middleware import OverloadMiddleware
+from middlewares.throttling_middleware import ThrottlingMiddleware
+from middlewares.user_middleware import UserMiddleware
+from utils.logger import logger
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+
+def create_dispatcher(session_pool=AsyncSessionLocal) -> Dispatcher:
+    """
+    Construye el Dispatcher con los middlewares y routers del bot.
+    Se usa tanto en producción como en los benchmarks (benchmarks/).
+    """
     dp = Dispatcher(storage=MemoryStorage())
-    
-    # Registrar middleware
-    dp.message.middleware(AuthMiddleware())
-    dp.callback_query.middleware(AuthMiddleware())
-    
+
+    # Registrar middlewares (el orden importa: primero el límite por usuario y la
+    # degradación por sobrecarga, que responden sin tocar la base, luego la sesión
+    # y por último el usuario)
+    throttling = ThrottlingMiddleware(settings)
+    overload = OverloadMiddleware()
+    for observer in (dp.message, dp.callback_query):
+        observer.outer_middleware(throttling)
+        observer.outer_middleware(overload)
+        observer.middleware(DbSessionMiddleware(session_pool))
+        observer.middleware(UserMiddleware(settings))
+
     # Registrar handlers
-    dp.include_router(start_router)
-    dp.include_router(gamification_router)
-    dp.include_router(leaderboard_router)
-    
-    logger.info("Bot initialized successfully")
-    return bot, dp
+    dp.include_router(admin_router)
+    dp.include_router(user_router)
+    dp.include_router(redeem_router)
+    dp.include_router(raffle_router)
+    dp.include_router(interactions_router)
+    return dp
+
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def _deferred_startup(bot: Bot):
+    """
+    Tareas que no hacen falta antes del primer update (APScheduler, jobs y
+    reanudación de campañas de difusión y backfills retroactivos).
+    Se importan aquí para no cargar su coste en el arranque.
+    """
+    from scheduler.scheduler_config import setup_scheduler
+    from services.broadcast_service import resume_campaigns
+    from services.backfill_service import resume_backfills
+    await setup_scheduler(bot)
+    await resume_campaigns(bot)
+    await resume_backfills(bot)
+
+
+async def on_startup(bot: Bot):
+    """Lanza en segundo plano el arranque diferido para no retrasar el polling."""
+    task = asyncio.create_task(_deferred_startup(bot))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
 
 async def main():
-    logger = Logger.setup_logger()
-    bot, dp = await start_bot()
+    logger.info("Inicializando bot...")
+    started = time.perf_counter()
+    schema_applied = await init_db()
+    if sharding_enabled():
+        await init_shards(apply_data=schema_applied)
+    init_db_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    bot = Bot(token=settings.BOT_TOKEN)
+    dp = create_dispatcher()
+    dispatcher_seconds = time.perf_counter() - started
+    logger.info(
+        f"Arranque: imports {IMPORT_SECONDS * 1000:.0f} ms, "
+        f"init_db {init_db_seconds * 1000:.0f} ms ({'esquema aplicado' if schema_applied else 'huella sin cambios'}), "
+        f"dispatcher {dispatcher_seconds * 1000:.0f} ms"
+    )
+
+    dp.startup.register(on_startup)
+
     try:
-        logger.info("Starting polling...")
+        logger.info("Iniciando polling...")
         await dp.start_polling(bot)
     except Exception as e:
-        logger.error(f"Error during polling: {e}")
+        logger.error(f"Error durante el polling: {e}")
     finally:
         await bot.session.close()
-        logger.info("Bot session closed")
+        await close_write_actor()
+        await close_shard_engines()
+        close_read_pool()
+        logger.info("Sesión del bot cerrada")
+
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
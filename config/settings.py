@@ -1,11 +1,9 @@
 # config/settings.py
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from dotenv import load_dotenv
-import os
 from pydantic import Field
 
-# Cargar variables de entorno desde .env si existe (útil para desarrollo local)
-load_dotenv()
+# El archivo .env (útil para desarrollo local) lo lee pydantic-settings vía `env_file`;
+# no hace falta cargarlo además con python-dotenv al importar este módulo.
 
 class Settings(BaseSettings):
     """
@@ -23,6 +21,25 @@ class Settings(BaseSettings):
     # No la necesitamos como variable de entorno si el archivo es local y fijo
     DATABASE_URL: str = "sqlite+aiosqlite:///./database.db" # <--- ¡CAMBIO CLAVE!
     ADMIN_IDS: list[int] = Field(default_factory=list)
+    # Conexiones de solo lectura para las consultas pesadas (database/read_pool.py); 0 lo desactiva
+    READ_POOL_SIZE: int = 4
+    # Escrituras de puntos/usuarios/compras por el escritor único con commit agrupado (database/writer.py)
+    WRITE_GROUP_COMMIT: bool = True
+    # Shards de datos de usuario (database/shards.py): una URL SQLite por shard. Vacío: todo en DATABASE_URL
+    DB_SHARD_URLS: list[str] = Field(default_factory=list)
+    # Archivo de compras (services/archive_service.py): los meses anteriores a ARCHIVE_AFTER_DAYS
+    # se mueven a un archivo SQLite comprimido por mes dentro de ARCHIVE_DIR
+    ARCHIVE_AFTER_DAYS: int = 365
+    ARCHIVE_DIR: str = "./archives"
+    # Copias de seguridad en caliente (services/backup_service.py): una carpeta por copia dentro
+    # de BACKUP_DIR; se conservan las BACKUP_KEEP más recientes
+    BACKUP_DIR: str = "./backups"
+    BACKUP_KEEP: int = 7
+    # Modo sobrecarga (utils/overload.py): se activa cuando el retraso medio del event loop
+    # supera OVERLOAD_ENTER_LAG_MS y se desactiva tras OVERLOAD_EXIT_HOLD_SECONDS por debajo de OVERLOAD_EXIT_LAG_MS
+    OVERLOAD_ENTER_LAG_MS: int = 200
+    OVERLOAD_EXIT_LAG_MS: int = 50
+    OVERLOAD_EXIT_HOLD_SECONDS: float = 10.0
 
 # Crear una instancia de Settings que se usará en toda la aplicación
 settings = Settings()
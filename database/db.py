@@ -1,8 +1,12 @@
 # database/db.py
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event, func, inspect, insert, select, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
 from contextlib import asynccontextmanager
-from sqlalchemy.future import select
+import hashlib
+import json
 
 # Importar Base desde su archivo separado (sin cambios)
 from database.base_model import Base
@@ -10,70 +14,222 @@ from database.base_model import Base
 from config.settings import settings
 from utils.logger import logger
 
-# Importar modelos para que Base.metadata.create_all los reconozca (sin cambios)
-from database.models.user import User
-from database.models.level import Level, INITIAL_LEVELS
-from database.models.badge import Badge, INITIAL_BADGES
-from database.models.purchase import Purchase
-from database.models.reward import Reward, INITIAL_REWARDS
-
 DATABASE_URL = settings.DATABASE_URL # <--- Usa la URL definida en settings.py
 
 # Crear el engine asíncrono (sin cambios importantes aquí)
 engine = create_async_engine(DATABASE_URL, echo=False)
 
-AsyncSessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-)
 
-async def init_db():
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL: los lectores (exportaciones, rankings) no bloquean a los escritores ni al
+    revés, así que una lectura larga no detiene los handlers que escriben.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")  # Seguro con WAL; evita un fsync por commit
+    cursor.close()
+
+if settings.DB_SHARD_URLS:
+    # Datos de usuario repartidos en shards: las sesiones enrutan cada sentencia (database/shards.py)
+    from database.shards import sharded_session_options
+
+    AsyncSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        **sharded_session_options(),
+    )
+else:
+    AsyncSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+
+FINGERPRINT_KEY = "fingerprint"
+
+
+def load_models():
+    """
+    Importa todos los modelos para que Base.metadata los reconozca.
+    Se hace bajo demanda (y no al importar este módulo) para no pagar su coste
+    en procesos que solo necesitan el engine o la sesión.
+    """
+    from database.models import user, level, badge, purchase, reward, schema_meta, stats_counter, job_lease, daily_points, campaign, raffle, mission, backfill, archive  # noqa: F401
+
+
+def _seed_data() -> list[tuple]:
+    """Pares (modelo, filas) de los datos iniciales, en orden de inserción."""
+    from database.models.level import Level, INITIAL_LEVELS
+    from database.models.badge import Badge, INITIAL_BADGES
+    from database.models.reward import Reward, INITIAL_REWARDS
+    from database.models.mission import Mission, INITIAL_MISSIONS
+    return [(Level, INITIAL_LEVELS), (Badge, INITIAL_BADGES), (Reward, INITIAL_REWARDS), (Mission, INITIAL_MISSIONS)]
+
+
+def _added_column_values() -> dict[str, object]:
+    """
+    Valor inicial (expresión SQL) de las columnas añadidas a una tabla existente
+    cuyo default no sirve para las filas que ya estaban. Las demás toman su default.
+    """
+    from database.models.user import User
+    from utils.constants import MILESTONE_6_MONTHS_DAYS
+
+    return {
+        # El primer hito se cuenta desde la fecha de unión, no desde la migración
+        "users.next_milestone_due_at": func.datetime(
+            func.coalesce(User.join_date, func.now()), f"+{MILESTONE_6_MONTHS_DAYS} days"
+        ),
+    }
+
+
+def _column_initial_value(column):
+    override = _added_column_values().get(f"{column.table.name}.{column.name}")
+    if override is not None:
+        return override
+    default = column.default
+    if default is None:
+        return None
+    if default.is_callable:
+        return default.arg(None)  # SQLAlchemy envuelve los callables para recibir el contexto
+    return default.arg  # Escalar o expresión SQL (p. ej. func.now())
+
+
+def _normalize_purchase_dates(sync_conn):
+    # Las compras guardadas con CURRENT_TIMESTAMP no tienen microsegundos; como texto
+    # quedarían antes que el cursor de /myrewards de su mismo segundo
+    sync_conn.execute(text(
+        "UPDATE purchases SET purchase_date = purchase_date || '.000000' WHERE length(purchase_date) = 19"
+    ))
+
+
+def _recompute_purchase_points_total(sync_conn):
+    # Resumen de /myrewards: compras recientes más las archivadas (purchase_rollups)
+    sync_conn.execute(text(
+        "UPDATE users SET purchase_points_total = "
+        "(SELECT coalesce(sum(points_awarded), 0) FROM purchases WHERE purchases.user_id = users.id) + "
+        "(SELECT coalesce(sum(points_awarded), 0) FROM purchase_rollups WHERE purchase_rollups.user_id = users.id)"
+    ))
+
+
+# Correcciones de datos que se aplican (en orden) cada vez que cambia la huella. Deben ser
+# idempotentes; sus nombres forman parte de la huella, así que añadir una la ejecuta.
+DATA_STEPS = [
+    ("purchase_date_microseconds", _normalize_purchase_dates),
+    ("purchase_points_total", _recompute_purchase_points_total),
+]
+
+
+def apply_data_steps(sync_conn):
+    """Ejecuta DATA_STEPS sobre las tablas que existen en esta base (p. ej. un shard)."""
+    inspector = inspect(sync_conn)
+    if not (inspector.has_table("users") and inspector.has_table("purchases")):
+        return
+    for name, step in DATA_STEPS:
+        step(sync_conn)
+    logger.info(f"Correcciones de datos aplicadas: {', '.join(name for name, _ in DATA_STEPS)}.")
+
+
+def migrate_existing_tables(sync_conn, tables=None):
+    """
+    `create_all` solo crea las tablas que faltan: a una tabla existente no le añade
+    columnas ni índices nuevos. Añade con ALTER TABLE ADD COLUMN las columnas del
+    modelo que la tabla aún no tiene, les da su valor inicial en las filas
+    existentes y crea los índices que falten. Retorna las columnas añadidas.
     """
-    Inicializa la base de datos: crea todas las tablas definidas en Base.
+    inspector = inspect(sync_conn)
+    added = []
+    for table in tables if tables is not None else Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            value = _column_initial_value(column)
+            if value is not None:
+                sync_conn.execute(update(table).values({column.name: value}))
+            added.append(f"{table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+    if added:
+        logger.info(f"Columnas añadidas a tablas existentes: {', '.join(added)}.")
+    return added
+
+
+def schema_fingerprint() -> str:
     """
+    Huella SHA-256 del DDL de todas las tablas e índices más los datos iniciales
+    y los nombres de DATA_STEPS. Cambia cuando se modifica un modelo, cualquiera
+    de las listas INITIAL_* o se añade una corrección de datos.
+    """
+    load_models()
+    dialect = engine.dialect
+    digest = hashlib.sha256()
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda ix: ix.name or ""):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    for model, rows in _seed_data():
+        digest.update(model.__tablename__.encode())
+        digest.update(json.dumps(rows, sort_keys=True, ensure_ascii=False).encode())
+    for name, _ in DATA_STEPS:
+        digest.update(name.encode())
+    return digest.hexdigest()
+
+
+async def init_db() -> bool:
+    """
+    Inicializa la base de datos: crea las tablas y siembra los datos iniciales,
+    salvo que la huella guardada coincida con la actual (arranque en caliente).
+    Retorna True si se aplicó el esquema/siembra, False si se omitió.
+    """
+    fingerprint = schema_fingerprint()
+    from database.models.schema_meta import SchemaMeta
+
     async with engine.begin() as conn:
+        try:
+            result = await conn.execute(select(SchemaMeta.value).filter_by(key=FINGERPRINT_KEY))
+            stored = result.scalar()
+        except OperationalError:
+            stored = None  # Base nueva: la tabla schema_meta aún no existe
+
+        if stored == fingerprint:
+            logger.info("Esquema y datos iniciales sin cambios; se omite create_all y la siembra.")
+            return False
+
         await conn.run_sync(Base.metadata.create_all)
-    logger.info("Base de datos inicializada correctamente.")
+        await conn.run_sync(migrate_existing_tables)
+        await conn.run_sync(apply_data_steps)
+        for model, rows in _seed_data():
+            await conn.execute(insert(model).prefix_with("OR IGNORE"), rows)
+        await conn.execute(
+            text("INSERT OR REPLACE INTO schema_meta (key, value) VALUES (:key, :value)"),
+            {"key": FINGERPRINT_KEY, "value": fingerprint},
+        )
+    logger.info("Base de datos inicializada correctamente (esquema y datos iniciales aplicados).")
+    return True
 
 async def insert_initial_data(session: AsyncSession):
-    """Inserta los niveles, insignias y recompensas iniciales si las tablas están vacías."""
-    # (El resto de esta función es igual, no la he repetido entera para brevedad,
-    # pero usa la versión completa que tienes)
-    # Insertar niveles
-    result_levels = await session.execute(select(Level))
-    if not result_levels.scalars().first():
-        logger.info("No se encontraron niveles, insertando niveles iniciales...")
-        for level_data in INITIAL_LEVELS:
-            session.add(Level(**level_data))
-        await session.commit()
-        logger.info("Niveles iniciales insertados correctamente.")
-    else:
-        logger.info("Los niveles ya existen en la base de datos.")
-
-    # Insertar insignias
-    result_badges = await session.execute(select(Badge))
-    if not result_badges.scalars().first():
-        logger.info("No se encontraron insignias, insertando insignias iniciales...")
-        for badge_data in INITIAL_BADGES:
-            session.add(Badge(**badge_data))
-        await session.commit()
-        logger.info("Insignias iniciales insertadas correctamente.")
-    else:
-        logger.info("Las insignias ya existen en la base de datos.")
-
-    # Insertar recompensas
-    result_rewards = await session.execute(select(Reward))
-    if not result_rewards.scalars().first():
-        logger.info("No se encontraron recompensas, insertando recompensas iniciales...")
-        for reward_data in INITIAL_REWARDS:
-            session.add(Reward(**reward_data))
-        await session.commit()
-        logger.info("Recompensas iniciales insertadas correctamente.")
-    else:
-        logger.info("Las recompensas ya existen en la base de datos.")
+    """
+    Inserta los niveles, insignias y recompensas iniciales que falten.
+    Un único lote INSERT OR IGNORE por tabla y un solo commit.
+    `init_db` ya lo hace en su propia transacción; esta función queda para
+    resembrar manualmente una sesión existente.
+    """
+    for model, rows in _seed_data():
+        await session.execute(insert(model).prefix_with("OR IGNORE"), rows)
+    await session.commit()
+    logger.info("Datos iniciales verificados (niveles, insignias y recompensas).")
 
 
 @asynccontextmanager
@@ -0,0 +1,31 @@
+# database/models/archive.py
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, DECIMAL
+from sqlalchemy.sql import func
+from database.base_model import Base # ¡Importación corregida!
+
+class ArchivePartition(Base):
+    """Un mes de compras movido a su archivo (services/archive_service.py)."""
+    __tablename__ = 'archive_partitions'
+
+    month = Column(String, primary_key=True) # "AAAA-MM"
+    path = Column(String, nullable=False) # Archivo SQLite del mes
+    rows = Column(Integer, nullable=False, default=0) # Compras archivadas
+    users = Column(Integer, nullable=False, default=0) # Usuarios con compras ese mes
+    size_bytes = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return f"<ArchivePartition(month='{self.month}', rows={self.rows}, path='{self.path}')>"
+
+class PurchaseRollup(Base):
+    """Resumen por usuario y mes de las compras que ya están en un archivo."""
+    __tablename__ = 'purchase_rollups'
+
+    user_id = Column(BigInteger, ForeignKey('users.id'), primary_key=True)
+    month = Column(String, primary_key=True) # "AAAA-MM"
+    purchases = Column(Integer, nullable=False, default=0)
+    amount = Column(DECIMAL(12, 2), nullable=False, default=0)
+    points_awarded = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<PurchaseRollup(user_id={self.user_id}, month='{self.month}', purchases={self.purchases})>"
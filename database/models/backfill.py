@@ -0,0 +1,30 @@
+# database/models/backfill.py
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime
+from sqlalchemy.sql import func
+from database.base_model import Base # ¡Importación corregida!
+
+# Estados de un backfill retroactivo de insignias y niveles
+BACKFILL_RUNNING = "running"
+BACKFILL_COMPLETED = "completed"
+BACKFILL_CANCELLED = "cancelled"
+
+class BackfillRun(Base):
+    __tablename__ = 'backfill_runs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default=BACKFILL_RUNNING, index=True)
+    created_by = Column(BigInteger, nullable=False) # Admin que lo lanzó
+    status_chat_id = Column(BigInteger, nullable=False) # Chat y mensaje donde se edita el progreso
+    status_message_id = Column(Integer, nullable=True)
+    last_user_id = Column(BigInteger, nullable=True) # Cursor: último users.id procesado (checkpoint)
+    shard_index = Column(Integer, nullable=False, default=0) # Con shards: shard que se recorre (last_user_id es su cursor)
+    total_users = Column(Integer, nullable=False, default=0) # Usuarios al lanzarlo (para el progreso)
+    scanned = Column(Integer, nullable=False, default=0)
+    badges_awarded = Column(Integer, nullable=False, default=0)
+    levels_changed = Column(Integer, nullable=False, default=0)
+    notified = Column(Integer, nullable=False, default=0) # Avisos entregados
+    created_at = Column(DateTime, default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<BackfillRun(id={self.id}, status='{self.status}', last_user_id={self.last_user_id}, scanned={self.scanned})>"
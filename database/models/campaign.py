@@ -0,0 +1,29 @@
+# database/models/campaign.py
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text
+from sqlalchemy.sql import func
+from database.base_model import Base # ¡Importación corregida!
+
+# Estados de una campaña de difusión
+CAMPAIGN_RUNNING = "running"
+CAMPAIGN_COMPLETED = "completed"
+CAMPAIGN_CANCELLED = "cancelled"
+
+class Campaign(Base):
+    __tablename__ = 'campaigns'
+
+    id = Column(Integer, primary_key=True, index=True)
+    text = Column(Text, nullable=False) # Mensaje a difundir
+    status = Column(String, nullable=False, default=CAMPAIGN_RUNNING, index=True)
+    created_by = Column(BigInteger, nullable=False) # Admin que la creó
+    status_chat_id = Column(BigInteger, nullable=False) # Chat y mensaje donde se edita el progreso
+    status_message_id = Column(Integer, nullable=True)
+    last_user_id = Column(BigInteger, nullable=True) # Cursor: último users.id procesado (checkpoint)
+    total_users = Column(Integer, nullable=False, default=0) # Usuarios al crear la campaña (para el progreso)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0) # Usuarios que bloquearon el bot
+    created_at = Column(DateTime, default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Campaign(id={self.id}, status='{self.status}', last_user_id={self.last_user_id}, sent={self.sent})>"
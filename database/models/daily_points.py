@@ -0,0 +1,13 @@
+# database/models/daily_points.py
+from sqlalchemy import Column, Integer, BigInteger, Date, ForeignKey
+from database.base_model import Base # ¡Importación corregida!
+
+class DailyPoints(Base):
+    __tablename__ = 'daily_points'
+
+    user_id = Column(BigInteger, ForeignKey('users.id'), primary_key=True)
+    day = Column(Date, primary_key=True, index=True) # Índice por día: ventana de rankings y purga
+    points = Column(Integer, nullable=False, default=0) # Puntos ganados por el usuario ese día
+
+    def __repr__(self):
+        return f"<DailyPoints(user_id={self.user_id}, day={self.day}, points={self.points})>"
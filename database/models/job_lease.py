@@ -0,0 +1,17 @@
+# database/models/job_lease.py
+from sqlalchemy import Column, String, Integer, DateTime
+from database.base_model import Base # ¡Importación corregida!
+
+class JobLease(Base):
+    __tablename__ = 'job_leases'
+
+    job_id = Column(String, primary_key=True) # ID del job en el scheduler
+    owner = Column(String, nullable=True) # Proceso que tiene el lease (None si está libre)
+    expires_at = Column(DateTime, nullable=True) # El lease caduca si el dueño deja de renovarlo
+    heartbeat_at = Column(DateTime, nullable=True) # Última renovación del dueño
+    last_window = Column(Integer, nullable=True) # Índice de la última ventana completada
+    last_run_at = Column(DateTime, nullable=True) # Inicio de la última ejecución
+    last_success_at = Column(DateTime, nullable=True) # Fin de la última ejecución correcta
+
+    def __repr__(self):
+        return f"<JobLease(job_id='{self.job_id}', owner='{self.owner}', last_window={self.last_window})>"
@@ -0,0 +1,61 @@
+# database/models/mission.py
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, DateTime, ForeignKey, Index
+from database.base_model import Base # ¡Importación corregida!
+
+# Eventos que hacen avanzar las misiones
+MISSION_EVENT_REACTION = "reaction"
+MISSION_EVENT_SURVEY_VOTE = "survey_vote"
+MISSION_EVENT_NARRATIVE_CHOICE = "narrative_choice"
+MISSION_EVENT_PURCHASE = "purchase"
+MISSION_EVENT_DAILY_CLAIM = "daily_claim"
+
+# Periodos de las misiones (el progreso se reinicia al empezar cada uno)
+MISSION_PERIOD_WEEKLY = "weekly"    # Semana de lunes a domingo
+MISSION_PERIOD_MONTHLY = "monthly"  # Mes natural
+
+class Mission(Base):
+    __tablename__ = 'missions'
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    description = Column(String, nullable=False)
+    event_type = Column(String, nullable=False) # Evento que la hace avanzar (MISSION_EVENT_*)
+    target = Column(Integer, nullable=False) # Eventos necesarios para completarla
+    period = Column(String, nullable=False) # MISSION_PERIOD_*
+    reward_points = Column(Integer, nullable=False)
+    active = Column(Boolean, nullable=False, default=True)
+
+    def __repr__(self):
+        return f"<Mission(id={self.id}, name='{self.name}', event_type='{self.event_type}', target={self.target})>"
+
+class MissionProgress(Base):
+    __tablename__ = 'mission_progress'
+
+    user_id = Column(BigInteger, ForeignKey('users.id'), primary_key=True)
+    mission_id = Column(Integer, ForeignKey('missions.id'), primary_key=True)
+    period_start = Column(Date, nullable=False) # Inicio del periodo al que corresponde el progreso
+    progress = Column(Integer, nullable=False, default=0)
+    completed_at = Column(DateTime, nullable=True) # Cuándo se completó en este periodo (y se otorgaron los puntos)
+
+    __table_args__ = (
+        # Reinicio por periodo: progreso de periodos anteriores de una misión
+        Index("ix_mission_progress_mission_id_period_start", mission_id, period_start),
+    )
+
+    def __repr__(self):
+        return f"<MissionProgress(user_id={self.user_id}, mission_id={self.mission_id}, progress={self.progress})>"
+
+# Datos iniciales para las misiones
+INITIAL_MISSIONS = [
+    {"id": 1, "name": "Fan de la semana", "description": "Reacciona a 5 publicaciones esta semana.",
+     "event_type": MISSION_EVENT_REACTION, "target": 5, "period": MISSION_PERIOD_WEEKLY, "reward_points": 25, "active": True},
+    {"id": 2, "name": "Voz de la comunidad", "description": "Vota en 3 encuestas esta semana.",
+     "event_type": MISSION_EVENT_SURVEY_VOTE, "target": 3, "period": MISSION_PERIOD_WEEKLY, "reward_points": 15, "active": True},
+    {"id": 3, "name": "Constancia", "description": "Reclama tus puntos diarios 5 veces esta semana.",
+     "event_type": MISSION_EVENT_DAILY_CLAIM, "target": 5, "period": MISSION_PERIOD_WEEKLY, "reward_points": 20, "active": True},
+    {"id": 4, "name": "Cliente del mes", "description": "Realiza 2 compras este mes.",
+     "event_type": MISSION_EVENT_PURCHASE, "target": 2, "period": MISSION_PERIOD_MONTHLY, "reward_points": 100, "active": True},
+    {"id": 5, "name": "Protagonista", "description": "Toma 10 decisiones en las narrativas este mes.",
+     "event_type": MISSION_EVENT_NARRATIVE_CHOICE, "target": 10, "period": MISSION_PERIOD_MONTHLY, "reward_points": 40, "active": True},
+    # Puedes añadir más misiones aquí
+]
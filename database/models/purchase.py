@@ -1,6 +1,6 @@
 # database/models/purchase.py
-from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, DECIMAL
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, DECIMAL, Index
+from datetime import datetime
 from sqlalchemy.orm import relationship
 from database.base_model import Base # ¡Importación corregida!
 
@@ -12,9 +12,16 @@ class Purchase(Base):
     amount = Column(DECIMAL(10, 2), nullable=False) # Monto de la compra
     points_awarded = Column(Integer, nullable=False) # Puntos otorgados por esta compra
     description = Column(String, nullable=True)
-    purchase_date = Column(DateTime, default=func.now())
+    # Fecha en Python (no CURRENT_TIMESTAMP): se guarda con microsegundos, el mismo formato
+    # con el que se enlaza el cursor (purchase_date, id) de /myrewards al compararlo
+    purchase_date = Column(DateTime, default=datetime.now)
 
     user = relationship("User") # Relación con el modelo User
 
+    __table_args__ = (
+        # Historial por usuario, de la compra más reciente a la más antigua (/myrewards)
+        Index("ix_purchases_user_id_purchase_date", user_id, purchase_date.desc()),
+    )
+
     def __repr__(self):
         return f"<Purchase(id={self.id}, user_id={self.user_id}, amount={self.amount}, points={self.points_awarded})>"
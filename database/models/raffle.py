@@ -0,0 +1,67 @@
+# database/models/raffle.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from database.base_model import Base # ¡Importación corregida!
+
+# Estados de un sorteo
+RAFFLE_OPEN = "open"      # Se pueden conseguir boletos
+RAFFLE_CLOSED = "closed"  # Boletos congelados, pendiente de sortear
+RAFFLE_DRAWN = "drawn"    # Ganadores registrados
+
+class Raffle(Base):
+    __tablename__ = 'raffles'
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String, nullable=False)
+    winners_count = Column(Integer, nullable=False, default=1)
+    ticket_cost = Column(Integer, nullable=False, default=0) # Puntos por boleto (0 = no se venden con puntos)
+    tickets_per_purchase = Column(Integer, nullable=False, default=0) # Boletos regalados por cada compra registrada
+    status = Column(String, nullable=False, default=RAFFLE_OPEN)
+    closes_at = Column(DateTime, nullable=False)
+    created_by = Column(BigInteger, nullable=False) # Admin que lo creó
+    created_at = Column(DateTime, default=func.now())
+    seed = Column(BigInteger, nullable=True) # Semilla del sorteo (auditoría: el sorteo se puede repetir)
+    total_tickets = Column(BigInteger, nullable=True) # Boletos y participantes al cerrar
+    participants = Column(Integer, nullable=True)
+    drawn_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Sorteos abiertos que ya vencieron (job de cierre) o que regalan boletos por compra
+        Index("ix_raffles_status_closes_at", status, closes_at),
+    )
+
+    def __repr__(self):
+        return f"<Raffle(id={self.id}, title='{self.title}', status='{self.status}', closes_at={self.closes_at})>"
+
+class RaffleEntry(Base):
+    __tablename__ = 'raffle_entries'
+
+    # Un renglón por usuario y sorteo con su número de boletos (no un renglón por boleto)
+    raffle_id = Column(Integer, ForeignKey('raffles.id'), primary_key=True)
+    user_id = Column(BigInteger, ForeignKey('users.id'), primary_key=True)
+    tickets = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<RaffleEntry(raffle_id={self.raffle_id}, user_id={self.user_id}, tickets={self.tickets})>"
+
+class RaffleWinner(Base):
+    __tablename__ = 'raffle_winners'
+
+    raffle_id = Column(Integer, ForeignKey('raffles.id'), primary_key=True)
+    position = Column(Integer, primary_key=True) # 1 = primer ganador extraído
+    user_id = Column(BigInteger, ForeignKey('users.id'), nullable=False)
+
+    def __repr__(self):
+        return f"<RaffleWinner(raffle_id={self.raffle_id}, position={self.position}, user_id={self.user_id})>"
+
+class RaffleClosure(Base):
+    __tablename__ = 'raffle_closures'
+
+    # Marca de cierre en cada archivo con boletos (el compartido y cada shard): un boleto
+    # solo se escribe si su archivo aún no tiene la marca del sorteo
+    raffle_id = Column(Integer, primary_key=True)
+    closed_at = Column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<RaffleClosure(raffle_id={self.raffle_id}, closed_at={self.closed_at})>"
@@ -0,0 +1,12 @@
+# database/models/schema_meta.py
+from sqlalchemy import Column, String
+from database.base_model import Base # ¡Importación corregida!
+
+class SchemaMeta(Base):
+    __tablename__ = 'schema_meta'
+
+    key = Column(String, primary_key=True) # Ej. "fingerprint"
+    value = Column(String, nullable=False)
+
+    def __repr__(self):
+        return f"<SchemaMeta(key='{self.key}', value='{self.value}')>"
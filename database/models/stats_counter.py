@@ -0,0 +1,12 @@
+# database/models/stats_counter.py
+from sqlalchemy import Column, String, BigInteger
+from database.base_model import Base # ¡Importación corregida!
+
+class StatsCounter(Base):
+    __tablename__ = 'stats_counters'
+
+    name = Column(String, primary_key=True) # Ej. "users_total", "points_total"
+    value = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<StatsCounter(name='{self.name}', value={self.value})>"
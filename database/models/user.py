@@ -1,7 +1,8 @@
 # database/models/user.py
+from datetime import datetime
 from sqlalchemy import BigInteger, Column, String, Integer, DateTime, Boolean, DECIMAL
-from sqlalchemy.sql import func
 from database.base_model import Base # ¡Importación corregida!
+from utils.misc import days_from_now, months_from_now
 
 class User(Base):
     __tablename__ = 'users'
@@ -12,12 +13,22 @@ class User(Base):
     last_name = Column(String, nullable=True)
     points = Column(Integer, default=0)
     level_id = Column(Integer, default=1) # Por defecto al Nivel 1
-    last_interaction_at = Column(DateTime, default=func.now())
+    last_interaction_at = Column(DateTime, default=datetime.now) # Reloj local, como datetime.now() en los servicios
     interactions_count = Column(Integer, default=0) # Contador de interacciones diarias
+    daily_points_earned = Column(Integer, default=0) # Puntos ganados hoy por interacciones (límite diario)
+    last_daily_reset = Column(DateTime, default=datetime.now) # Último reinicio del contador diario
     last_daily_points_claim = Column(DateTime, nullable=True) # Ultima vez que reclamó puntos diarios (permanencia)
     is_admin = Column(Boolean, default=False)
     purchase_count = Column(Integer, default=0) # Contador de compras para bonus
-    join_date = Column(DateTime, default=func.now()) # Fecha de unión para hitos de permanencia
+    purchase_points_total = Column(Integer, default=0) # Suma de puntos de todas sus compras (resumen de /myrewards)
+    reactions_count = Column(Integer, default=0) # Reacciones a publicaciones con puntos (reglas de insignias)
+    redemptions_count = Column(Integer, default=0) # Recompensas canjeadas (reglas de insignias)
+    join_date = Column(DateTime, default=datetime.now) # Fecha de unión para hitos de permanencia
+    # Próximos vencimientos de permanencia: el job diario solo lee los usuarios con fecha <= ahora
+    next_permanence_due_at = Column(DateTime, default=days_from_now(7), index=True) # Próximos puntos semanales
+    next_monthly_due_at = Column(DateTime, default=months_from_now(1), index=True) # Próximos puntos mensuales
+    next_milestone_due_at = Column(DateTime, default=days_from_now(180), index=True) # Próximo hito (6 meses, 1 año); 9999-12-31 si no quedan
+    weekly_streak = Column(Integer, default=0) # Semanas consecutivas premiadas (bonus de racha)
     total_redeemed_rewards_value = Column(DECIMAL(10, 2), default=0.00) # Valor total de recompensas canjeadas
     badges_json = Column(String, default="[]") # Guardará una lista JSON de insignias ganadas
 
@@ -0,0 +1,141 @@
+# database/read_pool.py
+"""
+Pool de lectura de solo lectura para SQLite.
+
+Las lecturas pesadas (/ranking, /catalogo, /status, /myrewards) no pasan por el
+engine de aiosqlite que comparten con las escrituras: se ejecutan en un pool
+pequeño de hilos, cada uno con su propia conexión `sqlite3` abierta con
+`mode=ro` (lectores WAL, que no bloquean ni esperan a los escritores).
+
+Cada rutina de lectura se envía entera en una sola llamada al pool (un solo
+salto de hilo para todas sus sentencias, no uno por sentencia). Los servicios
+marcan esas rutinas con `@read_only`:
+
+    class RewardService:
+        @read_only
+        def get_active_rewards(self, db: Session) -> List[Reward]:
+            return db.execute(select(Reward)...).scalars().all()
+
+    rewards = await reward_service.get_active_rewards()
+
+La rutina se escribe síncrona y recibe una `Session` de SQLAlchemy; quien la
+llama la espera como cualquier otro método async. Si el pool está desactivado
+(READ_POOL_SIZE=0, una base que no es un archivo SQLite o datos repartidos en
+shards) la misma rutina se ejecuta con `AsyncSession.run_sync` sobre la sesión
+del servicio, que enruta cada sentencia a su shard.
+
+Las rutinas ven el último estado confirmado: no sirven para leer cambios aún
+no confirmados de la transacción en curso. Tampoco deben usar `self.session`,
+porque corren en otro hilo. Los objetos que devuelven están desligados de
+cualquier sesión; solo deben usarse sus columnas ya cargadas.
+"""
+import asyncio
+import functools
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import SingletonThreadPool
+
+from config.settings import settings
+from utils.logger import logger
+
+T = TypeVar("T")
+
+
+class ReadPool:
+    """Hilos de lectura con una conexión `sqlite3` de solo lectura por hilo."""
+
+    def __init__(self, database_path: str, size: int):
+        self.size = size
+        self._uri = f"{Path(database_path).resolve().as_uri()}?mode=ro"
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="sqlite-ro")
+        # SingletonThreadPool: una conexión por hilo, que se reutiliza en cada rutina
+        self._engine = create_engine(
+            "sqlite://", creator=self._connect, poolclass=SingletonThreadPool, pool_size=size,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        connection.execute("PRAGMA query_only=1")
+        return connection
+
+    def _call(self, routine: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        # La sesión termina su transacción al cerrarse: se libera la instantánea WAL
+        with Session(self._engine) as db:
+            return routine(db, *args, **kwargs)
+
+    async def run(self, routine: Callable[..., T], *args, **kwargs) -> T:
+        """Ejecuta `routine(db, *args, **kwargs)` en un hilo lector y espera su resultado."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, routine, args, kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._engine.dispose()
+
+
+_read_pool: Optional[ReadPool] = None
+_read_pool_size: Optional[int] = None  # None: se toma de settings.READ_POOL_SIZE
+
+
+def _sqlite_database_path() -> Optional[str]:
+    """Ruta del archivo de la base principal, o None si no es un archivo SQLite."""
+    from database.db import engine
+
+    url = engine.url
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        return None
+    return url.database
+
+
+def get_read_pool() -> Optional[ReadPool]:
+    """Pool de lectura del proceso (se crea en el primer uso), o None si está desactivado."""
+    global _read_pool
+    if _read_pool is None:
+        size = settings.READ_POOL_SIZE if _read_pool_size is None else _read_pool_size
+        # Con shards las lecturas pasan por la sesión enrutada (database/shards.py)
+        database_path = _sqlite_database_path() if size > 0 and not settings.DB_SHARD_URLS else None
+        if database_path is None:
+            return None
+        _read_pool = ReadPool(database_path, size)
+        logger.info(f"Pool de lectura SQLite creado: {size} conexiones de solo lectura.")
+    return _read_pool
+
+
+def configure_read_pool(size: Optional[int]):
+    """
+    Cambia el tamaño del pool de lectura (0 lo desactiva; None vuelve al valor
+    de la configuración). Cierra el pool actual; el nuevo se crea en el primer uso.
+    """
+    global _read_pool_size
+    close_read_pool()
+    _read_pool_size = size
+
+
+def close_read_pool():
+    global _read_pool
+    if _read_pool is not None:
+        _read_pool.close()
+        _read_pool = None
+
+
+def read_only(routine: Callable[..., T]) -> Callable[..., Any]:
+    """
+    Marca un método de servicio como rutina de solo lectura: `routine(self, db, ...)`
+    pasa a ser un método async `method(self, ...)` que se ejecuta en el pool de
+    lectura, o con `run_sync` sobre `self.session` si el pool está desactivado.
+    """
+    @functools.wraps(routine)
+    async def wrapper(self, *args, **kwargs):
+        bound = functools.partial(routine, self)
+        pool = get_read_pool()
+        if pool is not None:
+            return await pool.run(bound, *args, **kwargs)
+        return await self.session.run_sync(bound, *args, **kwargs)
+
+    wrapper.read_only = True
+    return wrapper
@@ -0,0 +1,277 @@
+# database/shards.py
+"""
+Almacenamiento opcional de los datos de usuario en varios archivos SQLite (shards).
+
+Con DB_SHARD_URLS vacío (por defecto) todo vive en DATABASE_URL y este módulo no
+interviene. Con N URLs, las tablas por usuario (USER_SCOPED_TABLES) se reparten
+en N archivos según `shard_for(user_id)`; las tablas de referencia (levels,
+badges, rewards, missions, ...) y las demás siguen en el archivo compartido.
+Cada shard tiene su engine y su escritor (database/writer.py), así que las
+escrituras de usuarios de shards distintos ya no se turnan un único bloqueo.
+
+Cada conexión a un shard adjunta el archivo compartido (`ATTACH ... AS shared`):
+SQLite busca los nombres sin calificar primero en el shard y luego en el
+compartido, así que una consulta que une users con levels funciona igual. Los
+escritores de los shards abren sus transacciones en modo diferido y solo leen
+del compartido (niveles, misiones, sorteos abiertos): todo lo que escriben es
+del usuario y vive en su shard, incluidos sus boletos de sorteo. Si un shard
+escribiera en el compartido competiría con los demás escritores por su bloqueo.
+
+Las sesiones de `get_db()` son ShardedSession (sqlalchemy.ext.horizontal_shard):
+- un objeto de USER_SCOPED_TABLES se guarda en el shard de su usuario;
+- `session.get(User, id)` va directo al shard de `id`;
+- una sentencia sobre esas tablas va a los shards de los usuarios que fija su
+  WHERE (`user_id == x`, `User.id IN (...)`) o, si no fija ninguno, a todos, y
+  los resultados se concatenan. El orden global y los agregados se combinan en
+  el servicio: p. ej. el top-N del ranking mezcla (k-way) los top-N de cada shard.
+
+`stats_counters` existe en el compartido y en cada shard: cada escritor suma a
+su propia copia y el valor de un contador es la suma de todas.
+
+El cierre de un sorteo (escritor compartido) no se serializa por sí solo con
+los boletos que entran en los shards: el escritor de un shard puede leer el
+sorteo en una foto del compartido anterior al cierre. Por eso el cierre escribe
+además una marca (raffle_closures) en cada shard con el escritor del shard, y
+los boletos solo se insertan si su shard no tiene la marca
+(services/raffle_service.py).
+
+Los procesos masivos recorren los shards uno a uno con `get_shard_db` o el
+escritor de cada shard: el backfill retroactivo, las exportaciones y la
+importación de compras (que reparte cada lote por el shard de cada usuario).
+"""
+import heapq
+import zlib
+from contextlib import asynccontextmanager
+from itertools import islice
+from typing import Callable, Iterable, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+from sqlalchemy.sql.util import find_tables
+
+from config.settings import settings
+from utils.logger import logger
+
+T = TypeVar("T")
+
+SHARED = "shared"
+# Tablas cuyas filas pertenecen a un usuario: viven en el shard de ese usuario
+USER_SCOPED_TABLES = frozenset({
+    "users", "purchases", "daily_points", "mission_progress", "raffle_entries", "purchase_rollups",
+})
+# Tablas con una copia en el compartido y en cada shard (contadores: el valor es la suma;
+# particiones archivadas: cada archivo registra las suyas; cierres de sorteo: marca en cada archivo)
+PARTITIONED_TABLES = frozenset({"stats_counters", "archive_partitions", "raffle_closures"})
+
+_shard_engines: dict[str, AsyncEngine] = {}
+
+
+def sharding_enabled() -> bool:
+    return bool(settings.DB_SHARD_URLS)
+
+
+def shard_names() -> list[str]:
+    """Nombres de los shards de usuario ("shard0", "shard1", ...); vacío sin shards."""
+    return [f"shard{index}" for index in range(len(settings.DB_SHARD_URLS))]
+
+
+def shard_for(user_id: int) -> str:
+    """
+    Shard de un usuario: CRC32 de su id (estable entre procesos y reinicios,
+    a diferencia de `hash()`) módulo el número de shards.
+    """
+    index = zlib.crc32(int(user_id).to_bytes(8, "big", signed=True)) % len(settings.DB_SHARD_URLS)
+    return f"shard{index}"
+
+
+def user_shard(user_id: int) -> Optional[str]:
+    """Shard de escritura del usuario, o None sin shards (escritor principal)."""
+    return shard_for(user_id) if settings.DB_SHARD_URLS else None
+
+
+def merge_top_n(per_shard: Iterable[list[T]], limit: int, key: Callable[[T], object]) -> list[T]:
+    """
+    Mezcla k-way de listas ya ordenadas por `key` (el top-N de cada shard):
+    el top-N global son los `limit` primeros de la mezcla.
+    """
+    return list(islice(heapq.merge(*per_shard, key=key), limit))
+
+
+def shard_url(shard: str) -> str:
+    return settings.DB_SHARD_URLS[int(shard.removeprefix("shard"))]
+
+
+def _attach_shared(dbapi_connection, connection_record):
+    from database.db import engine
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("ATTACH DATABASE ? AS shared", (engine.url.database,))
+    cursor.close()
+
+
+def get_shard_engine(shard: str) -> AsyncEngine:
+    """Engine de un shard (se crea en el primer uso), con el compartido adjunto."""
+    shard_engine = _shard_engines.get(shard)
+    if shard_engine is None:
+        from database.db import _set_sqlite_pragmas
+
+        shard_engine = create_async_engine(shard_url(shard), echo=False)
+        event.listen(shard_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        event.listen(shard_engine.sync_engine, "connect", _attach_shared)
+        _shard_engines[shard] = shard_engine
+    return shard_engine
+
+
+def _tables_of(statement) -> set[str]:
+    # check_columns también devuelve el `table` (None) de columnas sueltas como count(*)
+    return {table.name for table in find_tables(statement, include_crud=True, check_columns=True) if table is not None}
+
+
+def _fixed_user_ids(statement) -> Optional[list[int]]:
+    """
+    Ids de usuario que fija el WHERE de la sentencia con igualdades o IN en su
+    conjunción de primer nivel (users.id o una columna user_id), o None.
+    """
+    where = getattr(statement, "whereclause", None)
+    if where is None:
+        return None
+    clauses = where.clauses if isinstance(where, BooleanClauseList) and where.operator is operators.and_ else [where]
+    for clause in clauses:
+        if not isinstance(clause, BinaryExpression) or not isinstance(clause.right, BindParameter):
+            continue
+        column = clause.left
+        table = getattr(column, "table", None)
+        is_user_key = (getattr(table, "name", None) == "users" and column.key == "id") or (
+            getattr(table, "name", None) in USER_SCOPED_TABLES and column.key == "user_id"
+        )
+        if not is_user_key:
+            continue
+        value = clause.right.effective_value
+        if clause.operator is operators.eq and value is not None:
+            return [value]
+        if clause.operator is operators.in_op and value is not None:
+            return list(value)
+    return None
+
+
+def _shards_for_tables(tables: set[str], user_ids: Optional[list[int]], is_select: bool) -> list[str]:
+    if tables & USER_SCOPED_TABLES:
+        if user_ids is not None:
+            return sorted({shard_for(user_id) for user_id in user_ids}) or shard_names()[:1]
+        return shard_names()
+    if tables & PARTITIONED_TABLES and is_select:
+        return [SHARED, *shard_names()]
+    return [SHARED]
+
+
+def _shard_chooser(mapper, instance, clause=None):
+    table = mapper.local_table.name if mapper is not None else None
+    if instance is not None and table in USER_SCOPED_TABLES:
+        return shard_for(instance.id if table == "users" else instance.user_id)
+    return SHARED
+
+
+def _identity_chooser(mapper, primary_key, **kwargs):
+    table = mapper.local_table.name
+    if table in ("users", "daily_points", "mission_progress", "purchase_rollups"):
+        return [shard_for(primary_key[0])]  # La PK empieza por el id del usuario
+    return _shards_for_tables({table}, None, is_select=True)
+
+
+def _inserted_user_ids(orm_context) -> Optional[list[int]]:
+    """Ids de usuario de las filas de un INSERT (columna id de users o user_id), o None."""
+    statement = orm_context.statement
+    table = getattr(statement, "table", None)
+    if not orm_context.is_insert or getattr(table, "name", None) not in USER_SCOPED_TABLES:
+        return None
+    key = "id" if table.name == "users" else "user_id"
+    params = orm_context.parameters
+    rows = params if isinstance(params, list) else [params] if params else [statement.compile().params]
+    user_ids = [
+        value for row in rows for name, value in row.items()
+        if value is not None and (name == key or name.startswith(f"{key}_m"))  # user_id_m0, ... en un VALUES múltiple
+    ]
+    return user_ids or None
+
+
+def _execute_chooser(orm_context):
+    statement = orm_context.statement
+    tables = _tables_of(statement)
+    user_ids = _fixed_user_ids(statement)
+    if orm_context.is_insert:
+        user_ids = _inserted_user_ids(orm_context)
+        if user_ids is None and tables & USER_SCOPED_TABLES:
+            raise ValueError(
+                "INSERT sobre una tabla por usuario sin id de usuario: "
+                "usa submit_write(..., shard=user_shard(user_id))."
+            )
+    return _shards_for_tables(tables, user_ids, orm_context.is_select)
+
+
+def sharded_session_options() -> dict:
+    """Argumentos para un sessionmaker de AsyncSession con las sesiones enrutadas por shard."""
+    from database.db import engine
+
+    shards = {SHARED: engine.sync_engine}
+    shards.update({shard: get_shard_engine(shard).sync_engine for shard in shard_names()})
+    return {
+        "sync_session_class": ShardedSession,
+        "shards": shards,
+        "shard_chooser": _shard_chooser,
+        "identity_chooser": _identity_chooser,
+        "execute_chooser": _execute_chooser,
+    }
+
+
+def single_shard_session(shard_engine: AsyncEngine, shard: str, **kwargs) -> AsyncSession:
+    """
+    Sesión sobre un solo shard cuyos objetos llevan el nombre del shard en su
+    identidad (lo que espera una ShardedSession al adoptarlos con `merge`).
+    """
+    return AsyncSession(
+        sync_session_class=ShardedSession,
+        shards={shard: shard_engine.sync_engine},
+        shard_chooser=lambda *args, **kw: shard,
+        identity_chooser=lambda *args, **kw: [shard],
+        execute_chooser=lambda orm_context: [shard],
+        **kwargs,
+    )
+
+
+@asynccontextmanager
+async def get_shard_db(shard: str):
+    """Sesión de un solo shard (p. ej. para recorrerlos uno a uno)."""
+    session = single_shard_session(get_shard_engine(shard), shard, autoflush=False, expire_on_commit=False)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def init_shards(apply_data: bool = False):
+    """
+    Crea en cada shard las tablas por usuario y las particionadas (si faltan) y
+    les añade las columnas e índices nuevos del modelo. Con `apply_data` (la
+    huella cambió en `init_db`) aplica también las correcciones de datos.
+    """
+    from database.base_model import Base
+    from database.db import apply_data_steps, load_models, migrate_existing_tables
+
+    load_models()
+    tables = [table for table in Base.metadata.sorted_tables if table.name in USER_SCOPED_TABLES | PARTITIONED_TABLES]
+    for shard in shard_names():
+        async with get_shard_engine(shard).begin() as conn:
+            await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=tables))
+            await conn.run_sync(migrate_existing_tables, tables)
+            if apply_data:
+                await conn.run_sync(apply_data_steps)
+    logger.info(f"Shards de usuario listos: {len(shard_names())} archivos ({', '.join(sorted(USER_SCOPED_TABLES))}).")
+
+
+async def close_shard_engines():
+    for shard_engine in _shard_engines.values():
+        await shard_engine.dispose()
+    _shard_engines.clear()
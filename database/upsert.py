@@ -0,0 +1,45 @@
+# database/upsert.py
+"""
+Upsert de una sola sentencia para SQLite:
+INSERT ... ON CONFLICT (...) DO UPDATE SET ... RETURNING *.
+
+Solo depende de SQLAlchemy (no de la configuración del bot), así que lo usan
+tanto el bot principal como `newbot`.
+"""
+from typing import Any, Iterable, Mapping, Optional, Type, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+ModelT = TypeVar("ModelT")
+
+
+async def upsert_returning(
+    session: AsyncSession,
+    model: Type[ModelT],
+    values: Mapping[str, Any],
+    conflict_columns: Iterable[str],
+    refresh_columns: Iterable[str] = (),
+    update_values: Optional[Mapping[str, Any]] = None,
+) -> ModelT:
+    """
+    Inserta la fila o, si ya existe (conflicto en `conflict_columns`), la actualiza,
+    y devuelve el objeto ORM resultante en un único viaje a la base.
+
+    :param values: Valores del INSERT (los defaults de columna se aplican a los que falten).
+    :param refresh_columns: Columnas que en conflicto toman el valor propuesto (excluded).
+    :param update_values: Expresiones adicionales para el DO UPDATE, p. ej.
+        `{"interactions_count": User.interactions_count + 1}`.
+    No hace commit. Con SQLite DO UPDATE necesita al menos una columna que actualizar.
+    """
+    stmt = sqlite_insert(model).values(**values)
+    set_ = {column: stmt.excluded[column] for column in refresh_columns}
+    set_.update(update_values or {})
+    stmt = stmt.on_conflict_do_update(index_elements=list(conflict_columns), set_=set_).returning(model)
+
+    # populate_existing: si la sesión ya tenía el objeto, se sobrescribe con la fila devuelta
+    result = await session.execute(
+        select(model).from_statement(stmt).execution_options(populate_existing=True)
+    )
+    return result.scalar_one()
@@ -0,0 +1,304 @@
+# database/writer.py
+"""
+Escritor único con commit agrupado (group commit).
+
+Con SQLite cada commit es un fsync y los escritores concurrentes se turnan el
+bloqueo de la base (con reintentos de "database is locked"). En lugar de que
+cada handler confirme su propia transacción, los servicios envían sus
+escrituras como closures a una sola tarea escritora, dueña de la conexión de
+escritura (un engine propio de una conexión):
+
+    async def apply(db: AsyncSession) -> User:
+        db_user = await load_for_write(db, user)
+        db_user.points += 10
+        return db_user
+
+    db_user = await submit_write(apply)
+    refresh_from(user, db_user)
+
+El escritor junta todo lo que llega en unos milisegundos en una transacción
+(`BEGIN IMMEDIATE`) y un commit. Cada closure corre en su propio SAVEPOINT:
+si falla, se revierte solo su parte y su llamador recibe la excepción; los
+demás se confirman. El futuro de cada llamador se resuelve tras el commit.
+
+Reglas para las closures:
+- Solo usan la sesión `db` que reciben; los objetos del llamador se copian a
+  esa sesión con `load_for_write` (que arrastra también sus cambios pendientes).
+- No hacen E/S fuera de la base (nada de la Bot API): retrasan a todo el lote.
+- Las escrituras anidadas (un servicio que llama a otro dentro de una closure)
+  se ejecutan en línea, en la misma transacción.
+- Quien envía no debe tener escrituras sin confirmar en su propia sesión: el
+  escritor esperaría su bloqueo mientras él espera al escritor.
+
+Los objetos devueltos quedan desligados de la sesión del escritor (solo sus
+columnas cargadas); `refresh_from` los vuelca en el objeto del llamador y
+`AsyncSession.merge(obj, load=False)` los adopta en otra sesión sin consultas.
+
+Con shards de usuario (database/shards.py) hay un escritor por shard además del
+principal: `submit_write(closure, shard=user_shard(user.id))` envía la closure al
+escritor del shard del usuario. Una escritura anidada se ejecuta en línea en el
+escritor en curso, que debe ser el de su shard.
+
+Con WRITE_GROUP_COMMIT=False cada closure corre en su propia sesión del engine
+principal con su propio commit (el comportamiento anterior, para comparar).
+"""
+import asyncio
+import contextvars
+import copy
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config.settings import settings
+from utils.logger import logger
+
+T = TypeVar("T")
+WriteClosure = Callable[[AsyncSession], Awaitable[T]]
+
+# Tiempo que se espera a más escrituras antes de confirmar un lote (solo si hay concurrencia)
+WRITE_COALESCE_SECONDS = 0.002
+# Escrituras máximas por transacción
+WRITE_BATCH_MAX = 500
+
+# Sesión del escritor mientras ejecuta una closure (para las escrituras anidadas)
+_writer_session: contextvars.ContextVar[Optional[AsyncSession]] = contextvars.ContextVar("writer_session", default=None)
+
+
+class WriteActor:
+    """Tarea única que ejecuta las closures de escritura en lotes, con un commit por lote."""
+
+    def __init__(self, database_url: str, coalesce_seconds: float = WRITE_COALESCE_SECONDS, batch_max: int = WRITE_BATCH_MAX,
+                 shard: Optional[str] = None):
+        self.shard = shard
+        self.coalesce_seconds = coalesce_seconds
+        self.batch_max = batch_max
+        self.batches = 0
+        self.writes = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        # Una sola conexión, que se conserva entre lotes
+        self._engine = create_async_engine(
+            database_url, echo=False, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0,
+        )
+        self._install_transaction_hooks()
+        if settings.DB_SHARD_URLS:
+            from database.shards import SHARED, single_shard_session
+
+            self._session = single_shard_session(self._engine, shard or SHARED, autoflush=False, expire_on_commit=False)
+        else:
+            self._session = AsyncSession(self._engine, autoflush=False, expire_on_commit=False)
+        self._task = asyncio.create_task(self._run())
+
+    def _install_transaction_hooks(self):
+        """
+        pysqlite abre las transacciones por su cuenta y no soporta SAVEPOINT bien:
+        se desactiva ese manejo y SQLAlchemy emite `BEGIN IMMEDIATE` (toma el bloqueo
+        de escritura al empezar el lote, sin esperas a mitad de transacción).
+        En un shard el BEGIN es diferido: IMMEDIATE bloquearía también el archivo
+        compartido adjunto, y este escritor es el único del shard.
+        """
+        from database.db import _set_sqlite_pragmas
+
+        sync_engine = self._engine.sync_engine
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+        if self.shard is not None:
+            from database.shards import _attach_shared
+
+            event.listen(sync_engine, "connect", _attach_shared)
+        begin_sql = "BEGIN" if self.shard is not None else "BEGIN IMMEDIATE"
+
+        @event.listens_for(sync_engine, "connect")
+        def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(sync_engine, "begin")
+        def _begin(conn):
+            conn.exec_driver_sql(begin_sql)
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    async def submit(self, closure: WriteClosure) -> T:
+        future = self._loop.create_future()
+        await self._queue.put((closure, future))
+        return await future
+
+    def _drain(self, batch: list):
+        while len(batch) < self.batch_max:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    async def _run(self):
+        last_batch_size = 0
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            self._drain(batch)
+            # Con una escritura aislada se confirma enseguida; si hay concurrencia se esperan más
+            if self.coalesce_seconds and len(batch) < self.batch_max and (len(batch) > 1 or last_batch_size > 1):
+                await asyncio.sleep(self.coalesce_seconds)
+                self._drain(batch)
+            stop = any(entry is None for entry in batch)
+            batch = [entry for entry in batch if entry is not None]
+            last_batch_size = len(batch)
+            if batch:
+                try:
+                    await self._run_batch(batch)
+                except Exception as e:
+                    # Fallo fuera de las closures (p. ej. el BEGIN): el escritor sigue vivo
+                    logger.error(f"Error en el escritor con un lote de {len(batch)} escrituras: {e}", exc_info=True)
+                    await self._session.rollback()
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+            if stop:
+                return
+
+    async def _run_batch(self, batch: list):
+        db = self._session
+        results = []
+        token = _writer_session.set(db)
+        try:
+            for closure, future in batch:
+                if future.cancelled():
+                    continue
+                # Los pendientes de estadísticas/rankings de una closure fallida no deben confirmarse
+                info_before = {key: copy.copy(value) for key, value in db.info.items()}
+                try:
+                    async with db.begin_nested():
+                        result = await closure(db)
+                except Exception as e:
+                    db.info.clear()
+                    db.info.update(info_before)
+                    future.set_exception(e)
+                    continue
+                results.append((future, result))
+
+            try:
+                await db.commit()
+            except Exception as e:
+                logger.error(f"Falló el commit de un lote de {len(batch)} escrituras: {e}", exc_info=True)
+                await db.rollback()
+                for future, _ in results:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        finally:
+            _writer_session.reset(token)
+            db.expunge_all()
+
+        self.batches += 1
+        self.writes += len(batch)
+        for future, result in results:
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Confirma lo que quede en la cola y cierra la conexión de escritura."""
+        await self._queue.put(None)
+        await self._task
+        await self._session.close()
+        await self._engine.dispose()
+
+
+# Escritores del event loop actual: None es el de la base principal, los demás son shards
+_actors: dict[Optional[str], WriteActor] = {}
+
+
+def get_write_actor(shard: Optional[str] = None) -> WriteActor:
+    """Escritor de la base principal o de un shard en el event loop actual (se crea en el primer uso)."""
+    loop = asyncio.get_running_loop()
+    actor = _actors.get(shard)
+    if actor is None or actor.loop is not loop:
+        if shard is None:
+            from database.db import DATABASE_URL
+
+            actor = WriteActor(DATABASE_URL)
+            logger.info("Escritor único de la base iniciado (commit agrupado).")
+        else:
+            from database.shards import shard_url
+
+            actor = WriteActor(shard_url(shard), shard=shard)
+            logger.info(f"Escritor del shard {shard} iniciado (commit agrupado).")
+        _actors[shard] = actor
+    return actor
+
+
+async def close_write_actor():
+    """Cierra los escritores (principal y shards) del event loop actual."""
+    loop = asyncio.get_running_loop()
+    for actor in list(_actors.values()):
+        if actor.loop is loop:
+            await actor.close()
+    _actors.clear()
+
+
+async def _run_with_own_commit(closure: WriteClosure, shard: Optional[str] = None) -> T:
+    """Modo sin agrupar: una sesión, una transacción y un commit por escritura."""
+    from database.db import AsyncSessionLocal
+    from database.shards import get_shard_db
+
+    async with (AsyncSessionLocal() if shard is None else get_shard_db(shard)) as db:
+        token = _writer_session.set(db)
+        try:
+            result = await closure(db)
+            await db.commit()
+        finally:
+            _writer_session.reset(token)
+        db.expunge_all()
+        return result
+
+
+async def submit_write(closure: WriteClosure, shard: Optional[str] = None) -> T:
+    """
+    Ejecuta `closure(db)` en el escritor (el de `shard`, si se indica) y devuelve
+    su resultado una vez confirmado (o lanza su excepción). Dentro de otra closure
+    se ejecuta en línea.
+    """
+    db = _writer_session.get()
+    if db is not None:
+        return await closure(db)
+    if not settings.WRITE_GROUP_COMMIT:
+        return await _run_with_own_commit(closure, shard)
+    return await get_write_actor(shard).submit(closure)
+
+
+def _column_keys(obj) -> list[str]:
+    return [attr.key for attr in inspect(obj).mapper.column_attrs]
+
+
+async def load_for_write(db: AsyncSession, obj: T) -> Optional[T]:
+    """
+    La fila de `obj` en la sesión del escritor, con los cambios que el llamador
+    hizo sobre `obj` y aún no confirmó (se confirman junto con la escritura).
+    """
+    state = inspect(obj)
+    if state.session is db.sync_session:
+        return obj
+    db_obj = await db.get(type(obj), state.mapper.primary_key_from_instance(obj))
+    if db_obj is None:
+        return None
+    for key in _column_keys(obj):
+        history = state.attrs[key].history
+        if history.added:
+            setattr(db_obj, key, history.added[0])
+    return db_obj
+
+
+def refresh_from(target, source) -> None:
+    """
+    Vuelca en `target` los valores confirmados de `source` (la misma fila leída en
+    el escritor) sin marcarlo como modificado: equivale a un `refresh()` sin consulta.
+    """
+    if target is source:
+        return
+    for key in _column_keys(source):
+        set_committed_value(target, key, getattr(source, key))
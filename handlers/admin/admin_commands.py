@@ -1,14 +1,39 @@
 # handlers/admin/admin_commands.py
 from aiogram import Router, F
-from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, FSInputFile, Message
 from sqlalchemy.ext.asyncio import AsyncSession
 from services.purchase_service import PurchaseService
+from services.level_service import LevelService
+from services.broadcast_service import BroadcastService, start_campaign, format_campaign_status
+from services.backfill_service import BackfillService, start_backfill, format_backfill_status
+from services.raffle_service import RaffleService, notify_winners
+from database.models.raffle import Raffle
+from services.export_service import ExportService, EXPORT_TABLES
+from services.purchase_import_service import PurchaseImportService, ImportReport, iter_csv_rows, iter_jsonl_rows
 from utils.decorators import is_admin
 from utils.logger import logger
+from utils.pacing import PacedSender, SEND_OK
+from contextlib import suppress
+from datetime import datetime, timedelta
+import asyncio
+import io
+import os
 import re
+import shutil
+import tempfile
+import time
 
 router = Router()
 
+# Importación de compras: tamaño en memoria antes de pasar el archivo a disco
+# y frecuencia máxima de edición del mensaje de progreso
+IMPORT_SPOOL_MAX_BYTES = 1024 * 1024
+IMPORT_PROGRESS_INTERVAL_SECONDS = 2.0
+# Límite de la Bot API para documentos enviados por bots
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
 @router.message(F.text.regexp(r"^/sumarpuntos (\d+) (\d+(\.\d+)?)(.*)?$"))
 @is_admin
 async def cmd_add_points_by_purchase(message: Message, session: AsyncSession):
@@ -61,4 +86,289 @@ async def cmd_add_points_by_purchase(message: Message, session: AsyncSession):
         logger.error(f"Error en comando /sumarpuntos: {e}", exc_info=True)
         await message.reply(
             "❌ Ocurrió un error al procesar la compra. Por favor, intenta de nuevo más tarde."
-        )
\ No newline at end of file
+        )
+
+@router.message(Command("recalcularniveles"))
+@is_admin
+async def cmd_recompute_levels(message: Message, session: AsyncSession, command: CommandObject):
+    """
+    Handler para el comando /recalcularniveles [notificar].
+    Recalcula el nivel de todos los usuarios con la tabla de niveles actual
+    (tras editar umbrales). Con `notificar` avisa a los usuarios que subieron de nivel.
+    """
+    notify = (command.args or "").strip().lower() == "notificar"
+    logger.info(f"Admin {message.from_user.id} inició el recálculo masivo de niveles (notificar={notify}).")
+
+    try:
+        level_service = LevelService(session)
+        stats = await level_service.recompute_all_levels(collect_level_ups=notify)
+
+        await message.reply(
+            "✅ **Niveles recalculados**\n\n"
+            f"👥 **Usuarios revisados:** {stats['scanned']}\n"
+            f"🔄 **Niveles actualizados:** {stats['changed']}\n"
+            f"⏱️ **Tiempo:** {stats['elapsed_s']} s ({stats['users_per_s']} usuarios/s)",
+            parse_mode="Markdown"
+        )
+
+        if notify and stats["level_ups"]:
+            level_names = {level.id: level.name for level in await level_service.get_all_levels()}
+            sender = PacedSender(message.bot)
+            outcomes = await asyncio.gather(*(
+                sender.send_message(
+                    user_id, f"🚀 ¡Subiste de nivel! Ahora eres **{level_names.get(new_level_id, new_level_id)}**.",
+                    parse_mode="Markdown"
+                )
+                for user_id, _, new_level_id in stats["level_ups"]
+            ))
+            sent = outcomes.count(SEND_OK)
+            await message.reply(f"📣 Notificados {sent} de {len(stats['level_ups'])} usuarios que subieron de nivel.")
+    except Exception as e:
+        logger.error(f"Error en comando /recalcularniveles: {e}", exc_info=True)
+        await message.reply("❌ Ocurrió un error al recalcular los niveles. Por favor, intenta de nuevo más tarde.")
+
+def _format_import_progress(report: ImportReport, done: bool = False) -> str:
+    header = "✅ **Importación terminada**" if done else "⏳ **Importando compras...**"
+    return (
+        f"{header}\n\n"
+        f"📄 **Filas leídas:** {report.processed}\n"
+        f"🛒 **Compras importadas:** {report.imported}\n"
+        f"🎯 **Puntos otorgados:** {report.points_awarded} ({report.bonuses} bonos de 5 compras)\n"
+        f"🏅 **Insignias:** {report.badges_awarded} · 🏁 **Misiones completadas:** {report.missions_completed} · "
+        f"🎟️ **Boletos regalados:** {report.raffle_tickets}\n"
+        f"⚠️ **Filas rechazadas:** {len(report.rejected)}"
+    )
+
+@router.message(F.document, F.caption.regexp(r"^/importarcompras\b"))
+@is_admin
+async def cmd_import_purchases(message: Message, session: AsyncSession):
+    """
+    Importación masiva de compras: el administrador envía un documento CSV
+    (user_id,amount[,description,purchase_date]) o JSONL con el texto
+    `/importarcompras` como pie. El progreso se edita en un único mensaje y las
+    filas rechazadas se devuelven como archivo.
+    """
+    document = message.document
+    is_jsonl = (document.file_name or "").lower().endswith((".jsonl", ".json"))
+    logger.info(f"Admin {message.from_user.id} inició la importación de compras desde '{document.file_name}'.")
+    progress_message = await message.reply("⏳ **Importando compras...**", parse_mode="Markdown")
+    last_edit = time.monotonic()
+
+    async def on_progress(report: ImportReport):
+        nonlocal last_edit
+        if time.monotonic() - last_edit < IMPORT_PROGRESS_INTERVAL_SECONDS:
+            return
+        last_edit = time.monotonic()
+        with suppress(TelegramBadRequest):  # "message is not modified"
+            await progress_message.edit_text(_format_import_progress(report), parse_mode="Markdown")
+
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MAX_BYTES) as buffer:
+            await message.bot.download(document, destination=buffer)
+            buffer.seek(0)
+            stream = io.TextIOWrapper(buffer, encoding="utf-8-sig", newline="")
+            rows = iter_jsonl_rows(stream) if is_jsonl else iter_csv_rows(stream)
+            report = await PurchaseImportService(session).import_rows(rows, on_progress=on_progress)
+    except Exception as e:
+        logger.error(f"Error en la importación de compras: {e}", exc_info=True)
+        await progress_message.edit_text(
+            "❌ La importación se interrumpió. Los lotes ya confirmados se conservan; revisa el archivo e inténtalo de nuevo."
+        )
+        return
+
+    with suppress(TelegramBadRequest):
+        await progress_message.edit_text(_format_import_progress(report, done=True), parse_mode="Markdown")
+    if report.rejected:
+        await message.answer_document(
+            BufferedInputFile(report.rejected_csv(), filename="compras_rechazadas.csv"),
+            caption=f"⚠️ {len(report.rejected)} filas rechazadas (línea, motivo y contenido original).",
+        )
+
+@router.message(Command("export"))
+@is_admin
+async def cmd_export(message: Message, session: AsyncSession, command: CommandObject):
+    """
+    Handler para el comando /export users|purchases|ledger.
+    Genera un CSV comprimido (gzip) en un archivo temporal, leyendo la tabla por lotes,
+    y lo envía como documento.
+    """
+    kind = (command.args or "").strip().lower()
+    if kind not in EXPORT_TABLES:
+        await message.reply(
+            f"**Uso:** `/export {'|'.join(EXPORT_TABLES)}`\n(`ledger`: puntos ganados por usuario y día)",
+            parse_mode="Markdown"
+        )
+        return
+
+    logger.info(f"Admin {message.from_user.id} solicitó la exportación '{kind}'.")
+    progress_message = await message.reply(f"⏳ Generando exportación de `{kind}`...", parse_mode="Markdown")
+    workdir = tempfile.mkdtemp(prefix="export_")
+    filename = f"{kind}_{time.strftime('%Y%m%d_%H%M%S')}.csv.gz"
+    path = os.path.join(workdir, filename)
+    try:
+        started = time.perf_counter()
+        rows = await ExportService(session).export_csv_gzip(kind, path)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(path)
+        if size > MAX_UPLOAD_BYTES:
+            await progress_message.edit_text(
+                f"❌ La exportación ocupa {size / 1024 / 1024:.1f} MB y supera el límite de 50 MB de Telegram."
+            )
+            return
+        await message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=f"📦 {kind}: {rows} filas ({size / 1024:.0f} KB, {elapsed:.1f} s)",
+        )
+        with suppress(TelegramBadRequest):
+            await progress_message.delete()
+    except Exception as e:
+        logger.error(f"Error en comando /export {kind}: {e}", exc_info=True)
+        await progress_message.edit_text("❌ Ocurrió un error al generar la exportación. Por favor, intenta de nuevo más tarde.")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+@router.message(Command("difundir"))
+@is_admin
+async def cmd_broadcast(message: Message, session: AsyncSession, command: CommandObject):
+    """
+    Handler para el comando /difundir [texto].
+    Crea una campaña que envía el texto (sin formato) a todos los usuarios en segundo
+    plano, a ritmo controlado; el progreso se edita en un único mensaje de estado.
+    """
+    text = (command.args or "").strip()
+    if not text:
+        await message.reply(
+            "**Uso:** `/difundir [texto]`\nEnvía el texto a todos los usuarios. Cancela con `/cancelardifusion [id]`.",
+            parse_mode="Markdown"
+        )
+        return
+
+    status_message = await message.reply("📣 Preparando la difusión...")
+    campaign = await BroadcastService(session).create_campaign(
+        text, message.from_user.id, status_message.chat.id, status_message.message_id
+    )
+    with suppress(TelegramBadRequest):
+        await status_message.edit_text(format_campaign_status(campaign), parse_mode="Markdown")
+    start_campaign(message.bot, campaign.id)
+
+@router.message(Command("cancelardifusion"))
+@is_admin
+async def cmd_cancel_broadcast(message: Message, session: AsyncSession, command: CommandObject):
+    """Handler para el comando /cancelardifusion [id]: detiene una campaña en curso."""
+    args = (command.args or "").strip()
+    if not args.isdigit():
+        await message.reply("**Uso:** `/cancelardifusion [id]`", parse_mode="Markdown")
+        return
+    if await BroadcastService(session).cancel_campaign(int(args)):
+        await message.reply(f"⛔ Campaña #{args} cancelada; se detiene al terminar el lote en curso.")
+    else:
+        await message.reply(f"❌ No hay una campaña en curso con ID {args}.")
+
+@router.message(Command("retroactivo"))
+@is_admin
+async def cmd_backfill(message: Message, session: AsyncSession):
+    """
+    Handler para el comando /retroactivo.
+    Otorga en segundo plano las insignias y niveles que los usuarios ya merecen
+    (p. ej. tras añadir una regla de insignia o un nivel) y les avisa; se reanuda
+    solo tras un reinicio y el progreso se edita en un único mensaje de estado.
+    """
+    status_message = await message.reply("🔄 Preparando el backfill retroactivo...")
+    run = await BackfillService(session).create_backfill(
+        message.from_user.id, status_message.chat.id, status_message.message_id
+    )
+    with suppress(TelegramBadRequest):
+        await status_message.edit_text(format_backfill_status(run), parse_mode="Markdown")
+    start_backfill(message.bot, run.id)
+
+@router.message(Command("cancelarretroactivo"))
+@is_admin
+async def cmd_cancel_backfill(message: Message, session: AsyncSession, command: CommandObject):
+    """Handler para el comando /cancelarretroactivo [id]: detiene un backfill en curso."""
+    args = (command.args or "").strip()
+    if not args.isdigit():
+        await message.reply("**Uso:** `/cancelarretroactivo [id]`", parse_mode="Markdown")
+        return
+    if await BackfillService(session).cancel_backfill(int(args)):
+        await message.reply(f"⛔ Backfill #{args} cancelado; se detiene al terminar el lote en curso.")
+    else:
+        await message.reply(f"❌ No hay un backfill en curso con ID {args}.")
+
+@router.message(Command("crearsorteo"))
+@is_admin
+async def cmd_create_raffle(message: Message, session: AsyncSession, command: CommandObject):
+    """
+    Handler para el comando /crearsorteo [días] [ganadores] [puntos_por_boleto] [boletos_por_compra] [título].
+    Crea un sorteo que cierra en `días`; el scheduler lo sortea automáticamente al vencer.
+    Ej: /crearsorteo 30 3 50 2 Sorteo mensual de octubre
+    """
+    match = re.match(r"^(\d+) (\d+) (\d+) (\d+) (.+)$", (command.args or "").strip())
+    if not match or int(match.group(2)) == 0:
+        await message.reply(
+            "**Uso:** `/crearsorteo [días] [ganadores] [puntos_por_boleto] [boletos_por_compra] [título]`\n"
+            "**Ejemplo:** `/crearsorteo 30 3 50 2 Sorteo mensual`\n"
+            "Usa 0 puntos por boleto para que solo se consigan con compras (o al revés).",
+            parse_mode="Markdown"
+        )
+        return
+
+    days, winners_count, ticket_cost, tickets_per_purchase = (int(value) for value in match.groups()[:4])
+    raffle = await RaffleService(session).create_raffle(
+        match.group(5).strip(), winners_count, datetime.now() + timedelta(days=days), message.from_user.id,
+        ticket_cost=ticket_cost, tickets_per_purchase=tickets_per_purchase,
+    )
+    await message.reply(
+        f"✅ **Sorteo #{raffle.id} creado:** {raffle.title}\n"
+        f"🏆 **Ganadores:** {raffle.winners_count}\n"
+        f"🎟️ **Boleto:** {ticket_cost} puntos · {tickets_per_purchase} por compra\n"
+        f"⏰ **Cierra:** {raffle.closes_at:%d/%m/%Y %H:%M}",
+        parse_mode="Markdown"
+    )
+
+@router.message(Command("sortear"))
+@is_admin
+async def cmd_draw_raffle(message: Message, session: AsyncSession, command: CommandObject):
+    """Handler para el comando /sortear [id]: cierra el sorteo ya, extrae ganadores y los avisa."""
+    args = (command.args or "").strip()
+    if not args.isdigit():
+        await message.reply("**Uso:** `/sortear [id]`", parse_mode="Markdown")
+        return
+
+    raffle_service = RaffleService(session)
+    winners = await raffle_service.draw_raffle(int(args))
+    if winners is None:
+        await message.reply(f"❌ No hay un sorteo pendiente con ID {args}.")
+        return
+    raffle = await session.get(Raffle, int(args), populate_existing=True)
+    sent = await notify_winners(message.bot, raffle, winners)
+    winners_text = "\n".join(f"{position}. `{user_id}`" for position, user_id in enumerate(winners, start=1)) or "Sin participantes."
+    await message.reply(
+        f"🎉 **Sorteo #{raffle.id} realizado:** {raffle.title}\n"
+        f"🎟️ {raffle.total_tickets} boletos de {raffle.participants} participantes\n"
+        f"🔑 **Semilla:** `{raffle.seed}`\n\n{winners_text}\n\n"
+        f"📣 Avisados {sent} de {len(winners)} ganadores.",
+        parse_mode="Markdown"
+    )
+
+@router.message(Command("auditarsorteo"))
+@is_admin
+async def cmd_audit_raffle(message: Message, session: AsyncSession, command: CommandObject):
+    """Handler para el comando /auditarsorteo [id]: repite el sorteo con su semilla y compara ganadores."""
+    args = (command.args or "").strip()
+    if not args.isdigit():
+        await message.reply("**Uso:** `/auditarsorteo [id]`", parse_mode="Markdown")
+        return
+
+    audit = await RaffleService(session).audit_draw(int(args))
+    if audit is None:
+        await message.reply(f"❌ El sorteo {args} no existe o aún no se ha sorteado.")
+        return
+    recorded, replayed = audit
+    if recorded == replayed:
+        await message.reply(f"✅ Sorteo #{args} verificado: la semilla reproduce los {len(recorded)} ganadores registrados.")
+    else:
+        logger.warning(f"Auditoría del sorteo {args}: registrados {recorded}, recalculados {replayed}.")
+        await message.reply(
+            f"⚠️ Sorteo #{args}: la semilla NO reproduce a los ganadores registrados.\n"
+            f"Registrados: {recorded}\nRecalculados: {replayed}"
+        )
@@ -9,7 +9,7 @@ from utils.logger import logger
 router = Router()
 
 @router.callback_query(F.data.startswith("react_post:"))
-async def handle_reaction_callback(callback_query: CallbackQuery, db_user: User, session: AsyncSession):
+async def handle_reaction_callback(callback_query: CallbackQuery, user: User, session: AsyncSession, overload_deferred: bool = False):
     """
     Maneja las reacciones a publicaciones desde botones inline.
     Formato de callback_data: "react_post:<post_id>:<points>"
@@ -17,19 +17,20 @@ async def handle_reaction_callback(callback_query: CallbackQuery, db_user: User,
     _, post_id, points_str = callback_query.data.split(':')
     points = int(points_str)
 
-    logger.info(f"Usuario {db_user.id} reaccionó al post {post_id} con {points} puntos.")
+    logger.info(f"Usuario {user.id} reaccionó al post {post_id} con {points} puntos.")
 
     interaction_service = InteractionService(session)
-    success, message = await interaction_service.process_reaction(db_user, post_id, points)
+    success, message = await interaction_service.process_reaction(user, post_id, points)
 
-    await callback_query.answer(message, show_alert=False) # Muestra un pop-up discreto
+    if not overload_deferred:  # Diferido por sobrecarga: ya se respondió al recibirlo
+        await callback_query.answer(message, show_alert=False) # Muestra un pop-up discreto
     # Opcional: editar el mensaje original para indicar que ya reaccionó
     # if success:
     #     await callback_query.message.edit_reply_markup(reply_markup=None) # Remueve los botones una vez reaccionado
 
 
 @router.callback_query(F.data.startswith("survey_vote:"))
-async def handle_survey_callback(callback_query: CallbackQuery, db_user: User, session: AsyncSession):
+async def handle_survey_callback(callback_query: CallbackQuery, user: User, session: AsyncSession, overload_deferred: bool = False):
     """
     Maneja los votos en encuestas desde botones inline.
     Formato de callback_data: "survey_vote:<survey_id>:<option_index>:<points>"
@@ -38,18 +39,19 @@ async def handle_survey_callback(callback_query: CallbackQuery, db_user: User, s
     option_index = int(option_index_str)
     points = int(points_str)
 
-    logger.info(f"Usuario {db_user.id} votó en encuesta {survey_id}, opción {option_index} con {points} puntos.")
+    logger.info(f"Usuario {user.id} votó en encuesta {survey_id}, opción {option_index} con {points} puntos.")
 
     interaction_service = InteractionService(session)
-    success, message = await interaction_service.process_survey_vote(db_user, survey_id, option_index, points)
+    success, message = await interaction_service.process_survey_vote(user, survey_id, option_index, points)
 
-    await callback_query.answer(message, show_alert=False)
+    if not overload_deferred:
+        await callback_query.answer(message, show_alert=False)
     # Una vez votado, se podría deshabilitar el teclado o editar el mensaje para mostrar el resultado
     # await callback_query.message.edit_reply_markup(reply_markup=None)
 
 
 @router.callback_query(F.data.startswith("narrative_choice:"))
-async def handle_narrative_callback(callback_query: CallbackQuery, db_user: User, session: AsyncSession):
+async def handle_narrative_callback(callback_query: CallbackQuery, user: User, session: AsyncSession, overload_deferred: bool = False):
     """
     Maneja las decisiones narrativas desde botones inline.
     Formato de callback_data: "narrative_choice:<decision_id>:<choice_value>:<points>"
@@ -57,10 +59,11 @@ async def handle_narrative_callback(callback_query: CallbackQuery, db_user: User
     _, decision_id, choice_value, points_str = callback_query.data.split(':')
     points = int(points_str)
 
-    logger.info(f"Usuario {db_user.id} eligió '{choice_value}' en narrativa {decision_id} con {points} puntos.")
+    logger.info(f"Usuario {user.id} eligió '{choice_value}' en narrativa {decision_id} con {points} puntos.")
 
     interaction_service = InteractionService(session)
-    success, message = await interaction_service.process_narrative_choice(db_user, decision_id, choice_value, points)
+    success, message = await interaction_service.process_narrative_choice(user, decision_id, choice_value, points)
 
-    await callback_query.answer(message, show_alert=False)
+    if not overload_deferred:
+        await callback_query.answer(message, show_alert=False)
     # await callback_query.message.edit_reply_markup(reply_markup=None)
\ No newline at end of file
@@ -0,0 +1,51 @@
+# handlers/users/raffle_commands.py
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models.user import User
+from services.raffle_service import RaffleService
+from utils.logger import logger
+
+router = Router()
+
+@router.message(Command("sorteos"))
+async def cmd_raffles(message: types.Message, session: AsyncSession, user: User):
+    """Lista los sorteos abiertos con el precio del boleto y los boletos del usuario."""
+    raffle_service = RaffleService(session)
+    raffles = await raffle_service.get_open_raffles()
+    if not raffles:
+        await message.answer("🎟️ No hay sorteos abiertos en este momento. ¡Vuelve pronto!")
+        return
+
+    my_tickets = await raffle_service.get_user_tickets(user.id, [raffle.id for raffle in raffles])
+    lines = ["🎟️ **Sorteos abiertos**\n"]
+    for raffle in raffles:
+        ways = []
+        if raffle.ticket_cost > 0:
+            ways.append(f"{raffle.ticket_cost} puntos por boleto")
+        if raffle.tickets_per_purchase > 0:
+            ways.append(f"{raffle.tickets_per_purchase} boleto(s) por cada compra")
+        lines.append(
+            f"**#{raffle.id} {raffle.title}** ({raffle.winners_count} ganador(es))\n"
+            f"   Cierra: {raffle.closes_at:%d/%m/%Y %H:%M} · {' · '.join(ways) or 'Boletos por invitación'}\n"
+            f"   Tus boletos: {my_tickets.get(raffle.id, 0)}"
+        )
+    lines.append("\nCompra boletos con `/boletos [ID_sorteo] [cantidad]`.")
+    await message.answer("\n".join(lines), parse_mode="Markdown")
+
+@router.message(Command("boletos"))
+async def cmd_buy_tickets(message: types.Message, session: AsyncSession, user: User, command: CommandObject):
+    """Handler para el comando /boletos [ID_sorteo] [cantidad]: compra boletos con puntos."""
+    args = (command.args or "").split()
+    if len(args) not in (1, 2) or not all(arg.isdigit() for arg in args):
+        await message.answer("**Uso:** `/boletos [ID_sorteo] [cantidad]`\nEjemplo: `/boletos 3 5`", parse_mode="Markdown")
+        return
+
+    raffle_id, count = int(args[0]), int(args[1]) if len(args) == 2 else 1
+    try:
+        _, response = await RaffleService(session).buy_tickets(user, raffle_id, count)
+        await message.answer(response)
+    except Exception as e:
+        logger.error(f"Error en comando /boletos para usuario {user.id}: {e}", exc_info=True)
+        await message.answer("❌ Ocurrió un error al comprar los boletos. Por favor, intenta de nuevo más tarde.")
@@ -118,12 +118,12 @@ async def handle_redeem_confirm_callback(callback_query: CallbackQuery, user: Us
         logger.error(f"Error en redeem_confirm callback: {e}", exc_info=True)
         await callback_query.answer("Error al procesar el canje.", show_alert=True)
 
-@router.callback_query(F.data == "redeem_cancel")
-async def handle_redeem_cancel_callback(callback_query: CallbackQuery, user: User):
+@router.callback_query(F.data == "redeem_cancel", flags={"skip_user_context": True})
+async def handle_redeem_cancel_callback(callback_query: CallbackQuery):
     """
-    Maneja el callback para cancelar el canje.
+    Maneja el callback para cancelar el canje (no necesita la base de datos).
     """
-    logger.info(f"Usuario {user.id} canceló el canje de recompensa.")
+    logger.info(f"Usuario {callback_query.from_user.id} canceló el canje de recompensa.")
     await callback_query.message.edit_text(
         "❌ **Canje cancelado**\n\nPuedes volver a ver el catálogo con `/catalogo`."
     )
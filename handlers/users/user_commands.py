@@ -1,22 +1,27 @@
 # handlers/users/user_commands.py
-from aiogram import Router, types
-from aiogram.filters import Command
+from aiogram import Router, F, types
+from aiogram.filters import Command, CommandObject
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from sqlalchemy.sql import func
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from database.models.user import User
 from database.models.level import Level
 from database.models.badge import Badge
-from database.models.purchase import Purchase
 from services.points_service import PointsService
 from services.level_service import LevelService
-from services.badge_service import BadgeService
 from services.ranking_service import RankingService
+from services.purchase_service import PurchaseService
+from services.mission_service import MissionService
+from database.models.mission import MISSION_EVENT_DAILY_CLAIM, MISSION_PERIOD_WEEKLY
+from services.stats_service import StatsService, USERS_TOTAL, REWARDS_ACTIVE, POINTS_TOTAL
 from utils.logger import logger
-from utils.formatter import format_user_status, format_ranking_entry_anonymous
+from utils.formatter import format_user_status, format_ranking_entry_anonymous, format_purchase_history_page
+from keyboards.inline import get_purchase_history_keyboard
+from middlewares.throttling_middleware import shed_counters
+from utils.overload import lag_monitor, overload_counters, stale_snapshots, snapshot_key
 from config.settings import settings
+from utils.constants import RANKING_WINDOWS, RANKING_WINDOW_TITLES
 import json
 
 router = Router()
@@ -38,9 +43,10 @@ async def cmd_start(message: types.Message, session: AsyncSession, user: User):
     )
     await message.answer(welcome_message)
 
-@router.message(Command("help"))
-async def cmd_help(message: types.Message, session: AsyncSession, user: User):
-    logger.info(f"Comando /help recibido de usuario: {user.username or user.first_name} (ID: {user.id})")
+@router.message(Command("help"), flags={"skip_user_context": True})
+async def cmd_help(message: types.Message):
+    # Texto estático: sin contexto de usuario ni trabajo de base de datos
+    logger.info(f"Comando /help recibido de usuario: {message.from_user.username or message.from_user.first_name} (ID: {message.from_user.id})")
     help_message = (
         "Aquí tienes una lista de comandos disponibles:\n\n"
         "📚 **/start** - Inicia el bot y recibe un mensaje de bienvenida.\n"
@@ -49,7 +55,9 @@ async def cmd_help(message: types.Message, session: AsyncSession, user: User):
         "🛒 **/catalogo** - Explora el catálogo de recompensas disponibles para canjear con tus puntos.\n"
         "💰 **/points** - Reclama tus puntos diarios por permanencia (una vez cada 24 horas).\n"
         "🎁 **/myrewards** - Ve las recompensas que has canjeado.\n"
-        "🏆 **/ranking** - Ve tu posición en el ranking de la comunidad.\n\n"
+        "🏆 **/ranking** - Ve tu posición en el ranking de la comunidad (`/ranking semana` o `/ranking mes` para el periodo).\n"
+        "🎯 **/misiones** - Consulta tus misiones semanales y mensuales y tu progreso.\n"
+        "🎟️ **/sorteos** - Ve los sorteos abiertos y tus boletos; compra boletos con `/boletos [ID] [cantidad]`.\n\n"
         "¡Estamos aquí para ayudarte a sacar el máximo provecho de nuestra comunidad! 😊"
     )
     await message.answer(help_message)
@@ -62,17 +70,9 @@ async def cmd_status(message: types.Message, session: AsyncSession, user: User):
     logger.info(f"Comando /status recibido de usuario: {user.username or user.first_name} (ID: {user.id})")
 
     try:
-        # Obtener servicios necesarios
+        # Nivel actual (nivel 1 si no existe) y siguiente nivel en una sola lectura
         level_service = LevelService(session)
-        badge_service = BadgeService(session)
-        
-        # Cargar el nivel actual
-        current_level = await level_service.get_level_by_id(user.level_id)
-        if not current_level:
-            current_level = await level_service.get_level_by_id(1)  # Fallback al nivel 1
-        
-        # Obtener información del siguiente nivel
-        next_level, points_to_next_level = await level_service.get_next_level_info(user.points)
+        current_level, next_level, points_to_next_level = await level_service.get_status_levels(user.level_id, user.points)
         
         # Cargar insignias del usuario
         try:
@@ -109,6 +109,8 @@ async def cmd_status(message: types.Message, session: AsyncSession, user: User):
         if user.is_admin:
             status_message += "👑 **Rol:** Administrador\n"
             
+        # Respuesta de reserva para el modo sobrecarga (utils/overload.py)
+        stale_snapshots.put(snapshot_key(message, user.id), status_message)
         await message.answer(status_message, parse_mode="Markdown")
         
     except Exception as e:
@@ -124,31 +126,27 @@ async def cmd_claim_daily_points(message: types.Message, session: AsyncSession,
     
     try:
         points_service = PointsService(session)
-        now = datetime.now()
-        
-        # Verificar si ya reclamó puntos hoy
-        if user.last_daily_points_claim:
-            time_since_last_claim = now - user.last_daily_points_claim
-            if time_since_last_claim < timedelta(hours=24):
-                hours_remaining = 24 - int(time_since_last_claim.total_seconds() / 3600)
-                await message.answer(
-                    f"⏰ Ya reclamaste tus puntos diarios hoy.\n"
-                    f"Podrás reclamar nuevamente en {hours_remaining} horas."
-                )
-                return
-        
-        # Otorgar puntos diarios (10 puntos base)
+
+        # Otorgar puntos diarios (10 puntos base) si no los reclamó en las últimas 24 horas
         daily_points = 10
-        await points_service.add_points(user, daily_points, "Puntos diarios por permanencia")
-        
-        # Actualizar la fecha de último reclamo
-        user.last_daily_points_claim = now
-        await session.commit()
-        await session.refresh(user)
+        time_since_last_claim = await points_service.claim_daily_points(user, daily_points)
+        if time_since_last_claim is not None:
+            hours_remaining = 24 - int(time_since_last_claim.total_seconds() / 3600)
+            await message.answer(
+                f"⏰ Ya reclamaste tus puntos diarios hoy.\n"
+                f"Podrás reclamar nuevamente en {hours_remaining} horas."
+            )
+            return
+
+        completed = await MissionService(session).record_event(user, MISSION_EVENT_DAILY_CLAIM)
+        missions_text = "".join(
+            f"🎯 ¡Misión **{mission.name}** completada! +{mission.reward_points} puntos\n" for mission in completed
+        )
         
         success_message = (
             f"🎉 **¡Puntos diarios reclamados!**\n\n"
             f"💰 Has ganado **{daily_points} puntos** por tu permanencia diaria.\n"
+            f"{missions_text}"
             f"💎 **Puntos totales:** {user.points}\n\n"
             f"¡Vuelve mañana para reclamar más puntos! 🚀"
         )
@@ -159,23 +157,65 @@ async def cmd_claim_daily_points(message: types.Message, session: AsyncSession,
         logger.error(f"Error en comando /points para usuario {user.id}: {e}", exc_info=True)
         await message.answer("❌ Ocurrió un error al reclamar tus puntos. Por favor, intenta de nuevo más tarde.")
 
+@router.message(Command("misiones"))
+async def cmd_missions(message: types.Message, session: AsyncSession, user: User):
+    """Handler para el comando /misiones: misiones activas y progreso del periodo actual."""
+    missions = await MissionService(session).get_user_missions(user.id)
+    if not missions:
+        await message.answer("🎯 No hay misiones activas en este momento.")
+        return
+
+    lines = ["🎯 **Tus misiones**\n"]
+    for mission, progress, completed in missions:
+        period = "esta semana" if mission.period == MISSION_PERIOD_WEEKLY else "este mes"
+        state = "✅" if completed else f"{min(progress, mission.target)}/{mission.target}"
+        lines.append(f"**{mission.name}** ({period}) — {state}\n   {mission.description} Premio: {mission.reward_points} puntos.")
+    await message.answer("\n".join(lines), parse_mode="Markdown")
+
+MY_REWARDS_PAGE_SIZE = 10
+_CURSOR_DATE_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+def _encode_purchase_cursor(cursor: tuple[datetime, int]) -> str:
+    """Codifica el cursor (purchase_date, id) para caber en callback_data."""
+    purchase_date, purchase_id = cursor
+    return f"{purchase_date.strftime(_CURSOR_DATE_FORMAT)}-{purchase_id}"
+
+
+def _decode_purchase_cursor(raw: str) -> tuple[datetime, int]:
+    date_str, purchase_id = raw.split("-")
+    return datetime.strptime(date_str, _CURSOR_DATE_FORMAT), int(purchase_id)
+
+
+async def _render_my_rewards_page(session: AsyncSession, user: User, page: int, before: tuple[datetime, int] | None):
+    """Devuelve (texto, teclado) de una página de /myrewards, o (None, None) si está vacía."""
+    purchase_service = PurchaseService(session)
+    purchases, next_cursor = await purchase_service.get_purchase_page(user.id, before, MY_REWARDS_PAGE_SIZE)
+    if not purchases:
+        return None, None
+
+    text = format_purchase_history_page(
+        purchases,
+        first_index=(page - 1) * MY_REWARDS_PAGE_SIZE + 1,
+        total_count=user.purchase_count or 0,
+        total_points=user.purchase_points_total or 0,
+    )
+    keyboard = get_purchase_history_keyboard(page + 1, _encode_purchase_cursor(next_cursor)) if next_cursor else None
+    return text, keyboard
+
+
 @router.message(Command("myrewards"))
 async def cmd_my_rewards(message: types.Message, session: AsyncSession, user: User):
     """
     Handler para el comando /myrewards - Muestra las recompensas canjeadas por el usuario.
+    Solo lee la primera página; los totales salen del resumen del usuario.
     """
     logger.info(f"Comando /myrewards recibido de usuario: {user.username or user.first_name} (ID: {user.id})")
     
     try:
-        # Obtener las compras/canjes del usuario
-        result = await session.execute(
-            select(Purchase)
-            .filter(Purchase.user_id == user.id)
-            .order_by(Purchase.purchase_date.desc())
-        )
-        purchases = result.scalars().all()
-        
-        if not purchases:
+        rewards_message, keyboard = await _render_my_rewards_page(session, user, 1, None)
+
+        if not rewards_message:
             await message.answer(
                 "🎁 **Mis Recompensas**\n\n"
                 "Aún no has canjeado ninguna recompensa.\n"
@@ -183,50 +223,89 @@ async def cmd_my_rewards(message: types.Message, session: AsyncSession, user: Us
             )
             return
         
-        rewards_message = "🎁 **Mis Recompensas Canjeadas**\n\n"
-        
-        for i, purchase in enumerate(purchases[:10], 1):  # Mostrar últimas 10
-            date_str = purchase.purchase_date.strftime('%Y-%m-%d')
-            rewards_message += (
-                f"**{i}.** {purchase.description or 'Recompensa'}\n"
-                f"   💰 Costo: {purchase.points_awarded} puntos\n"
-                f"   📅 Fecha: {date_str}\n\n"
-            )
-        
-        if len(purchases) > 10:
-            rewards_message += f"... y {len(purchases) - 10} recompensas más.\n\n"
-            
-        rewards_message += (
-            f"💎 **Total de puntos gastados:** {sum(p.points_awarded for p in purchases)}\n"
-            f"🛒 **Total de canjes:** {len(purchases)}"
-        )
-        
-        await message.answer(rewards_message, parse_mode="Markdown")
+        await message.answer(rewards_message, reply_markup=keyboard, parse_mode="Markdown")
         
     except Exception as e:
         logger.error(f"Error en comando /myrewards para usuario {user.id}: {e}", exc_info=True)
         await message.answer("❌ Ocurrió un error al obtener tus recompensas. Por favor, intenta de nuevo más tarde.")
 
+@router.callback_query(F.data.startswith("myrewards_page:"))
+async def handle_my_rewards_page_callback(callback_query: types.CallbackQuery, session: AsyncSession, user: User):
+    """
+    Muestra una página anterior del historial de /myrewards.
+    Formato de callback_data: "myrewards_page:<página>:<cursor>"
+    """
+    try:
+        _, page_str, raw_cursor = callback_query.data.split(':')
+        rewards_message, keyboard = await _render_my_rewards_page(
+            session, user, int(page_str), _decode_purchase_cursor(raw_cursor)
+        )
+        if not rewards_message:
+            await callback_query.answer("No hay más recompensas en tu historial.")
+            return
+
+        await callback_query.message.edit_text(rewards_message, reply_markup=keyboard, parse_mode="Markdown")
+        await callback_query.answer()
+
+    except Exception as e:
+        logger.error(f"Error en myrewards_page callback para usuario {user.id}: {e}", exc_info=True)
+        await callback_query.answer("Error al cargar tu historial.", show_alert=True)
+
+async def _send_window_ranking(message: types.Message, session: AsyncSession, user: User, period: str):
+    """
+    Ranking por puntos ganados en la ventana móvil del periodo (semana/mes),
+    servido desde los totales en memoria de RankingService.
+    """
+    days = RANKING_WINDOWS[period]
+    ranking_service = RankingService(session)
+    top_users = await ranking_service.get_top_users_window(days, 10)
+
+    if not top_users:
+        await message.answer(f"📊 Nadie ha ganado puntos en el último periodo ({period}) todavía.")
+        return
+
+    user_rank, window_points = await ranking_service.get_user_window_rank(user.id, days)
+
+    ranking_message = f"🏆 **Ranking {RANKING_WINDOW_TITLES[period]}** (últimos {days} días) 🏆\n\n"
+    for i, (ranked_user, level, points) in enumerate(top_users, 1):
+        ranking_message += f"{format_ranking_entry_anonymous(i, ranked_user, level, user.id, points)}\n"
+
+    ranking_message += "\n" + "─" * 30 + "\n"
+    if user_rank:
+        ranking_message += f"🎯 **Tu posición:** #{user_rank}"
+    else:
+        ranking_message += "🎯 **Tu posición:** No clasificado aún"
+    ranking_message += f"\n💎 **Tus puntos del periodo:** {window_points}"
+
+    stale_snapshots.put(snapshot_key(message, user.id), ranking_message)
+    await message.answer(ranking_message, parse_mode="Markdown")
+
 @router.message(Command("ranking"))
-async def cmd_ranking(message: types.Message, session: AsyncSession, user: User):
+async def cmd_ranking(message: types.Message, session: AsyncSession, user: User, command: CommandObject):
     """
     Handler para el comando /ranking - Muestra el ranking de usuarios.
+    `/ranking semana` y `/ranking mes` muestran el ranking del periodo.
     """
     logger.info(f"Comando /ranking recibido de usuario: {user.username or user.first_name} (ID: {user.id})")
     
     try:
+        period = (command.args or "").strip().lower()
+        if period:
+            if period not in RANKING_WINDOWS:
+                await message.answer("Uso: `/ranking`, `/ranking semana` o `/ranking mes`", parse_mode="Markdown")
+                return
+            await _send_window_ranking(message, session, user, period)
+            return
+
         ranking_service = RankingService(session)
         
-        # Obtener top 10 usuarios
-        top_users = await ranking_service.get_top_users(10)
+        # Top 10 y posición del usuario actual en una sola lectura
+        top_users, user_rank = await ranking_service.get_ranking_snapshot(user.id, 10)
         
         if not top_users:
             await message.answer("📊 El ranking está vacío por el momento.")
             return
         
-        # Obtener la posición del usuario actual
-        user_rank = await ranking_service.get_user_rank(user.id)
-        
         ranking_message = "🏆 **Ranking de la Comunidad VIP** 🏆\n\n"
         
         for i, (ranked_user, level) in enumerate(top_users, 1):
@@ -245,6 +324,7 @@ async def cmd_ranking(message: types.Message, session: AsyncSession, user: User)
             
         ranking_message += f"\n💎 **Tus puntos:** {user.points}"
         
+        stale_snapshots.put(snapshot_key(message, user.id), ranking_message)
         await message.answer(ranking_message, parse_mode="Markdown")
         
     except Exception as e:
@@ -257,16 +337,37 @@ async def cmd_admin_panel(message: types.Message, session: AsyncSession, user: U
     Muestra el panel de administración si el usuario es un administrador.
     """
     if user.id in settings.ADMIN_IDS or user.is_admin:
+        counters = await StatsService(session).get_counters()
         admin_message = (
             "👑 **Panel de Administración** 👑\n\n"
             "Comandos disponibles:\n\n"
             "💰 `/sumarpuntos [user_id] [monto] [descripción]`\n"
             "   - Registra una compra y asigna puntos\n"
             "   - Ej: `/sumarpuntos 123456789 350.00 Acceso Canal VIP`\n\n"
+            "📥 Documento CSV/JSONL con el pie `/importarcompras`\n"
+            "   - Importa compras en lote (columnas: user_id, amount, description, purchase_date)\n\n"
+            "📦 `/export users|purchases|ledger`\n"
+            "   - Exporta la tabla como CSV comprimido (gzip)\n\n"
+            "📣 `/difundir [texto]`\n"
+            "   - Envía un anuncio a todos los usuarios (cancelar: `/cancelardifusion [id]`)\n\n"
+            "📈 `/recalcularniveles [notificar]`\n"
+            "   - Recalcula el nivel de todos los usuarios tras cambiar los umbrales\n\n"
+            "🏅 `/retroactivo`\n"
+            "   - Otorga y avisa las insignias y niveles que los usuarios ya merecen (cancelar: `/cancelarretroactivo [id]`)\n\n"
             "📊 **Estadísticas del sistema:**\n"
-            f"👥 Usuarios registrados: En desarrollo\n"
-            f"🎁 Recompensas activas: En desarrollo\n"
-            f"💎 Puntos totales distribuidos: En desarrollo"
+            f"👥 Usuarios registrados: {counters[USERS_TOTAL]}\n"
+            f"🎁 Recompensas activas: {counters[REWARDS_ACTIVE]}\n"
+            f"💎 Puntos en circulación: {counters[POINTS_TOTAL]}\n\n"
+            "🚦 **Updates descartados por límite:**\n"
+            f"👆 Interacciones: {shed_counters['interaccion']}\n"
+            f"🔎 Consultas: {shed_counters['consulta']}\n"
+            f"💬 Otros: {shed_counters['general']}\n\n"
+            f"🚨 **Modo sobrecarga:** {'ACTIVO' if lag_monitor.overloaded else 'inactivo'} "
+            f"(retraso del event loop: {lag_monitor.lag * 1000:.0f} ms)\n"
+            f"🔁 Activaciones: {overload_counters['activaciones']}\n"
+            f"⏳ Interacciones diferidas: {overload_counters['diferidos']} "
+            f"(descartadas: {overload_counters['descartados']})\n"
+            f"🗂️ Respuestas desde caché: {overload_counters['desde_cache']}"
         )
     else:
         admin_message = "🚫 Acceso denegado. No tienes permisos de administrador."
@@ -46,7 +46,7 @@ def get_rewards_catalog_keyboard(rewards: List[Reward]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for reward in rewards:
         builder.row(
-            InlineKeyboardButton(text=f"{reward.name} ({reward.cost_points} Pts)", callback_data=f"show_reward:{reward.id}")
+            InlineKeyboardButton(text=f"{reward.name} ({reward.points_cost} Pts)", callback_data=f"show_reward:{reward.id}")
         )
     return builder.as_markup()
 
@@ -59,4 +59,15 @@ def get_confirm_redeem_keyboard(reward_id: int) -> InlineKeyboardMarkup:
         InlineKeyboardButton(text="✅ Confirmar Canje", callback_data=f"redeem_confirm:{reward_id}"),
         InlineKeyboardButton(text="❌ Cancelar", callback_data="redeem_cancel")
     )
-    return builder.as_markup()
\ No newline at end of file
+    return builder.as_markup()
+
+def get_purchase_history_keyboard(next_page: int, cursor: str) -> InlineKeyboardMarkup:
+    """
+    Genera un teclado inline para ver la siguiente página (más antigua) de /myrewards.
+    cursor: Cursor keyset codificado de la última compra mostrada.
+    """
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="⬅️ Ver anteriores", callback_data=f"myrewards_page:{next_page}:{cursor}")
+    )
+    return builder.as_markup()
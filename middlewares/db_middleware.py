@@ -3,11 +3,38 @@ from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy.ext.asyncio import AsyncSession
-from contextlib import suppress
+
+
+class LazySession:
+    """
+    Proxy de AsyncSession que no abre la sesión (ni toma una conexión del pool)
+    hasta el primer uso. Los handlers y servicios lo usan como una AsyncSession
+    normal; si el update no toca la base, no se hace ningún trabajo de DB.
+    """
+
+    def __init__(self, session_pool: Callable[[], AsyncSession]):
+        self._session_pool = session_pool
+        self._session: AsyncSession | None = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str) -> Any:
+        # Solo se llama para atributos que el proxy no define: se delega en la sesión real
+        if self._session is None:
+            self._session = self._session_pool()
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
 
 class DbSessionMiddleware(BaseMiddleware):
     """
     Middleware que proporciona una sesión de base de datos a los handlers.
+    La sesión es perezosa (LazySession): solo se abre si algo la usa.
     """
     def __init__(self, session_pool: Callable[[], AsyncSession]):
         super().__init__()
@@ -19,6 +46,9 @@ class DbSessionMiddleware(BaseMiddleware):
         event: Message | CallbackQuery,
         data: Dict[str, Any]
     ) -> Any:
-        async with self.session_pool() as session:
-            data["session"] = session
+        session = LazySession(self.session_pool)
+        data["session"] = session
+        try:
             return await handler(event, data)
+        finally:
+            await session.close()
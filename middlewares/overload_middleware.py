@@ -0,0 +1,100 @@
+# middlewares/overload_middleware.py
+import asyncio
+from collections import deque
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+
+from utils.logger import logger
+from utils.overload import (
+    LoopLagMonitor, SnapshotCache, lag_monitor, stale_snapshots, overload_counters,
+    classify_priority, snapshot_key, PRIORITY_INTERACTION,
+)
+
+# Reacciones/votos diferidos como máximo en memoria; más allá se descartan
+DEFERRED_MAX = 10_000
+# Pausa del procesador de diferidos mientras dura la sobrecarga
+DEFERRED_IDLE_SECONDS = 0.5
+
+DEFERRED_MESSAGE = "✅ ¡Recibido! Hay mucha actividad: tus puntos se sumarán en unos momentos."
+DROPPED_MESSAGE = "⏳ Hay mucha actividad en este momento. Inténtalo de nuevo en unos minutos."
+
+
+class OverloadMiddleware(BaseMiddleware):
+    """
+    Degradación por prioridades en modo sobrecarga (ver utils/overload.py).
+    Va como middleware externo, tras el límite por usuario y antes de la sesión:
+    - Reacciones y votos: se responde al instante y el update se procesa más tarde,
+      cuando pasa la sobrecarga (el handler recibe `overload_deferred=True` y no
+      vuelve a responder al callback). Si la cola está llena, se descarta.
+    - /status y /ranking: se responde con la última respuesta guardada del usuario,
+      sin tocar la base; si no hay ninguna, se procesa normalmente.
+    - Admin, canjes, compras y el resto de comandos: sin cambios.
+    """
+
+    def __init__(self, monitor: LoopLagMonitor = lag_monitor, snapshots: SnapshotCache = stale_snapshots,
+                 deferred_max: int = DEFERRED_MAX):
+        super().__init__()
+        self.monitor = monitor
+        self.snapshots = snapshots
+        self._deferred: deque = deque()
+        self._deferred_max = deferred_max
+        self._drain_task: asyncio.Task | None = None
+
+    @property
+    def deferred_pending(self) -> int:
+        return len(self._deferred)
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        self.monitor.ensure_started()
+        if not self.monitor.overloaded:
+            return await handler(event, data)
+
+        priority = classify_priority(event)
+        if priority == PRIORITY_INTERACTION and isinstance(event, CallbackQuery):
+            if len(self._deferred) >= self._deferred_max:
+                overload_counters["descartados"] += 1
+                await event.answer(DROPPED_MESSAGE, show_alert=False)
+                return None
+            data["overload_deferred"] = True
+            self._deferred.append((handler, event, data))
+            overload_counters["diferidos"] += 1
+            self._ensure_draining()
+            await event.answer(DEFERRED_MESSAGE, show_alert=False)
+            return None
+
+        if isinstance(event, Message) and event.from_user:
+            snapshot = self.snapshots.get(snapshot_key(event, event.from_user.id))
+            if snapshot:
+                text, age_seconds = snapshot
+                overload_counters["desde_cache"] += 1
+                await event.answer(
+                    f"{text}\n\n_⏱️ Datos de hace {int(age_seconds // 60)} min (alta demanda)._",
+                    parse_mode="Markdown",
+                )
+                return None
+
+        return await handler(event, data)
+
+    def _ensure_draining(self):
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        """Procesa los updates diferidos de uno en uno cuando ya no hay sobrecarga."""
+        while self._deferred:
+            if self.monitor.overloaded:
+                await asyncio.sleep(DEFERRED_IDLE_SECONDS)
+                continue
+            handler, event, data = self._deferred.popleft()
+            try:
+                await handler(event, data)
+            except Exception as e:
+                logger.error(f"Error al procesar un update diferido por sobrecarga: {e}", exc_info=True)
+        logger.info("Updates diferidos por sobrecarga procesados.")
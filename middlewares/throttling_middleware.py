@@ -0,0 +1,100 @@
+# middlewares/throttling_middleware.py
+from collections import Counter
+from typing import Callable, Dict, Any, Awaitable
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+
+from config.settings import Settings
+from utils.constants import THROTTLE_LIMITS, THROTTLE_SWEEP_INTERVAL_SECONDS
+from utils.logger import logger
+
+# Prefijos de callback_data y comandos -> clase de límite (el resto es "general")
+_INTERACTION_CALLBACK_PREFIXES = ("react_post:", "survey_vote:", "narrative_choice:")
+_QUERY_COMMANDS = {"/ranking", "/status", "/catalogo", "/myrewards", "/sorteos", "/misiones"}
+
+THROTTLED_MESSAGE = "⏳ Vas muy rápido. Espera un momento e inténtalo de nuevo."
+
+# Updates descartados por clase desde el arranque (se muestran en /admin)
+shed_counters: Counter = Counter()
+
+
+def classify_update(event: Message | CallbackQuery) -> str:
+    """Clase de límite del update (una clave de THROTTLE_LIMITS)."""
+    if isinstance(event, CallbackQuery):
+        if event.data and event.data.startswith(_INTERACTION_CALLBACK_PREFIXES):
+            return "interaccion"
+        return "general"
+    if event.text and event.text.startswith("/"):
+        command = event.text.split(maxsplit=1)[0].split("@", 1)[0].lower()
+        if command in _QUERY_COMMANDS:
+            return "consulta"
+    return "general"
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Limita los updates de cada usuario con un token bucket por clase de comando.
+    Va como middleware externo, antes de DbSessionMiddleware/UserMiddleware: un
+    update por encima del límite se descarta sin tocar la base. A los callbacks
+    se les responde con un aviso breve (para que el botón no quede cargando);
+    los mensajes se ignoran en silencio. Los administradores no tienen límite.
+
+    Cada bucket es una tupla (tokens, instante de la última actualización) en un
+    dict por (usuario, clase). Periódicamente se eliminan los que ya se habrían
+    rellenado del todo: equivalen a un bucket nuevo.
+    """
+
+    def __init__(self, settings: Settings, limits: dict[str, tuple[float, int]] = THROTTLE_LIMITS,
+                 sweep_interval: float = THROTTLE_SWEEP_INTERVAL_SECONDS):
+        super().__init__()
+        self.admin_ids = set(settings.ADMIN_IDS)
+        self.limits = limits
+        self.sweep_interval = sweep_interval
+        self._buckets: dict[tuple[int, str], tuple[float, float]] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def _allow(self, user_id: int, update_class: str, now: float) -> bool:
+        rate, burst = self.limits[update_class]
+        key = (user_id, update_class)
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def _sweep(self, now: float):
+        before = len(self._buckets)
+        self._buckets = {
+            key: (tokens, updated_at)
+            for key, (tokens, updated_at) in self._buckets.items()
+            if tokens + (now - updated_at) * self.limits[key[1]][0] < self.limits[key[1]][1]
+        }
+        self._next_sweep = now + self.sweep_interval
+        logger.debug(f"Throttling: {before - len(self._buckets)} buckets inactivos eliminados, {len(self._buckets)} activos.")
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        telegram_user = event.from_user
+        if not telegram_user or telegram_user.id in self.admin_ids:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        update_class = classify_update(event)
+        if self._allow(telegram_user.id, update_class, now):
+            return await handler(event, data)
+
+        shed_counters[update_class] += 1
+        if isinstance(event, CallbackQuery):
+            await event.answer(THROTTLED_MESSAGE, show_alert=False)
+        return None
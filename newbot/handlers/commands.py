@@ -1,9 +1,11 @@
+import asyncio
 from aiogram import Router, F
 from aiogram.types import Message
 from ..database import get_session
 from ..services.user_service import UserService
 from ..services.gamification_service import GamificationService
 from ..config import config
+from ..utils.logger import logger
 
 router = Router()
 
@@ -37,3 +39,22 @@ async def leaderboard_cmd(message: Message):
         users = await user_service.top_users()
     lines = [f"{idx+1}. {u.telegram_id} - {u.points} pts" for idx, u in enumerate(users)]
     await message.answer("\n".join(lines) or "Sin usuarios")
+
+@router.message(F.text.in_({"/recomputelevels", "/recomputelevels notify"}))
+async def recompute_levels_cmd(message: Message):
+    if message.from_user.id not in config.admin_ids:
+        await message.answer("No autorizado")
+        return
+    notify = message.text.endswith("notify")
+    async with get_session() as session:
+        stats = await GamificationService.recompute_levels(session, collect_level_ups=notify)
+    await message.answer(
+        f"Niveles recalculados: {stats['changed']} de {stats['scanned']} usuarios "
+        f"en {stats['elapsed_s']}s ({stats['users_per_s']} usuarios/s)"
+    )
+    for telegram_id, _, new_level in stats["level_ups"]:
+        try:
+            await message.bot.send_message(telegram_id, f"Subiste al nivel {new_level}!")
+        except Exception as e:
+            logger.warning(f"Level-up notification failed for {telegram_id}: {e}")
+        await asyncio.sleep(0.05)
@@ -1,5 +1,12 @@
+import time
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import User
+
+
 class GamificationService:
     LEVEL_THRESHOLDS = [0, 100, 300, 600, 1000]
+    RECOMPUTE_CHUNK_SIZE = 50_000
 
     @classmethod
     def calculate_level(cls, points: int) -> int:
@@ -10,3 +17,60 @@ class GamificationService:
             else:
                 break
         return level - 1
+
+    @classmethod
+    async def recompute_levels(cls, session: AsyncSession, chunk_size: int = RECOMPUTE_CHUNK_SIZE, collect_level_ups: bool = False) -> dict:
+        """Bulk version of calculate_level for every user after LEVEL_THRESHOLDS changes.
+
+        Reads (id, points, level) in id-ordered chunks, assigns levels with
+        np.searchsorted and writes back only the rows that changed (executemany).
+        """
+        import numpy as np
+
+        thresholds = np.array(sorted(cls.LEVEL_THRESHOLDS), dtype=np.int64)
+        update_stmt = (
+            update(User.__table__)
+            .where(User.__table__.c.id == bindparam("user_pk"))
+            .values(level=bindparam("new_level"))
+        )
+
+        started = time.perf_counter()
+        scanned = changed = 0
+        level_ups: list[tuple[int, int, int]] = []
+        last_id = 0
+        while True:
+            rows = (await session.execute(
+                select(User.id, User.telegram_id, User.points, User.level)
+                .where(User.id > last_id)
+                .order_by(User.id)
+                .limit(chunk_size)
+            )).all()
+            if not rows:
+                break
+            chunk = np.array(rows, dtype=np.int64)
+            ids, telegram_ids, points, old_levels = chunk.T
+            last_id = int(ids[-1])
+            scanned += len(ids)
+
+            # Same result as calculate_level: number of thresholds <= points
+            new_levels = np.searchsorted(thresholds, points, side="right")
+            mask = new_levels != old_levels
+            if mask.any():
+                await session.execute(
+                    update_stmt,
+                    [{"user_pk": int(pk), "new_level": int(level)} for pk, level in zip(ids[mask], new_levels[mask])],
+                )
+                await session.commit()
+                changed += int(mask.sum())
+                if collect_level_ups:
+                    up = mask & (new_levels > old_levels)
+                    level_ups.extend(zip(telegram_ids[up].tolist(), old_levels[up].tolist(), new_levels[up].tolist()))
+
+        elapsed = time.perf_counter() - started
+        return {
+            "scanned": scanned,
+            "changed": changed,
+            "elapsed_s": round(elapsed, 3),
+            "users_per_s": round(scanned / elapsed, 1) if elapsed else 0.0,
+            "level_ups": level_ups,
+        }
@@ -1,5 +1,6 @@
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from database.upsert import upsert_returning
 from ..models import User
 
 class UserService:
@@ -7,12 +8,15 @@ class UserService:
         self.session = session
 
     async def get_or_create(self, telegram_id: int, username: str | None = None) -> User:
-        result = await self.session.execute(select(User).where(User.telegram_id == telegram_id))
-        user = result.scalar_one_or_none()
-        if user:
-            return user
-        user = User(telegram_id=telegram_id, username=username)
-        self.session.add(user)
+        # Una sola sentencia: INSERT ... ON CONFLICT(telegram_id) DO UPDATE ... RETURNING.
+        # Sin username (p. ej. /addpoints) se conserva el guardado.
+        user = await upsert_returning(
+            self.session,
+            User,
+            values={"telegram_id": telegram_id, "username": username},
+            conflict_columns=["telegram_id"],
+            update_values={"username": func.coalesce(username, User.username)},
+        )
         await self.session.commit()
         return user
 
@@ -2,6 +2,13 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.db import get_db
 from services.permanence_service import PermanenceService
+from services.stats_service import StatsService
+from services.ranking_service import RankingService
+from services.raffle_service import RaffleService, notify_winners
+from services.mission_service import MissionService
+from services.archive_service import archive_old_purchases
+from services.backup_service import backup_database
+from utils.constants import DAILY_POINTS_RETENTION_DAYS
 from utils.logger import logger
 from aiogram import Bot
 
@@ -12,7 +19,7 @@ async def award_permanence_points_job(bot: Bot):
     """
     logger.info("Iniciando job de otorgamiento de puntos por permanencia...")
     try:
-        async for session in get_db():
+        async with get_db() as session:
             permanence_service = PermanenceService(session, bot)
             awarded_count = await permanence_service.award_weekly_permanence_points()
             logger.info(f"Finalizado job de permanencia. Puntos otorgados a {awarded_count} usuarios.")
@@ -20,6 +27,92 @@ async def award_permanence_points_job(bot: Bot):
             # await permanence_service.award_monthly_permanence_points()
     except Exception as e:
         logger.error(f"Error en el job de permanencia: {e}", exc_info=True)
+        raise  # La ventana no se marca como completada (ver scheduler/lease.py)
 
-# Puedes añadir más jobs aquí si son necesarios
-# Por ejemplo, para reseteo diario de misiones, sorteos mensuales, etc.
\ No newline at end of file
+async def reconcile_stats_job():
+    """
+    Tarea programada que corrige la deriva de los contadores de estadísticas
+    (stats_counters) recalculándolos desde las tablas en segundo plano.
+    """
+    logger.info("Iniciando reconciliación de estadísticas...")
+    try:
+        async with get_db() as session:
+            drift = await StatsService(session).reconcile()
+            logger.info(f"Finalizada reconciliación de estadísticas. Deriva: {drift}")
+    except Exception as e:
+        logger.error(f"Error en el job de reconciliación de estadísticas: {e}", exc_info=True)
+        raise
+
+async def prune_daily_points_job():
+    """
+    Tarea programada que elimina los buckets de puntos diarios que ya no entran
+    en ninguna ventana de ranking.
+    """
+    logger.info("Iniciando purga de puntos diarios...")
+    try:
+        async with get_db() as session:
+            deleted = await RankingService(session).prune_daily_points(DAILY_POINTS_RETENTION_DAYS)
+            logger.info(f"Finalizada purga de puntos diarios. Buckets eliminados: {deleted}")
+    except Exception as e:
+        logger.error(f"Error en el job de purga de puntos diarios: {e}", exc_info=True)
+        raise
+
+async def draw_raffles_job(bot: Bot):
+    """
+    Tarea programada que cierra y sortea los sorteos vencidos y avisa a los ganadores.
+    """
+    logger.info("Iniciando job de sorteos vencidos...")
+    try:
+        async with get_db() as session:
+            drawn = await RaffleService(session).draw_due_raffles()
+        for raffle, winners in drawn:
+            await notify_winners(bot, raffle, winners)
+        logger.info(f"Finalizado job de sorteos. Sorteos realizados: {len(drawn)}")
+    except Exception as e:
+        logger.error(f"Error en el job de sorteos: {e}", exc_info=True)
+        raise
+
+async def reset_missions_job():
+    """
+    Tarea programada que reinicia en bloque el progreso de las misiones
+    semanales y mensuales de periodos ya terminados.
+    """
+    logger.info("Iniciando reinicio de misiones...")
+    try:
+        async with get_db() as session:
+            deleted = await MissionService(session).reset_expired_progress()
+            logger.info(f"Finalizado reinicio de misiones. Filas de progreso eliminadas: {deleted}")
+    except Exception as e:
+        logger.error(f"Error en el job de reinicio de misiones: {e}", exc_info=True)
+        raise
+
+async def archive_purchases_job():
+    """
+    Tarea programada que mueve las compras de los meses que superan el horizonte
+    (ARCHIVE_AFTER_DAYS) a sus archivos mensuales comprimidos.
+    """
+    logger.info("Iniciando archivo de compras antiguas...")
+    try:
+        totals = await archive_old_purchases()
+        logger.info(
+            f"Finalizado archivo de compras: {totals['rows']} compras de {totals['months']} meses "
+            f"({totals['bytes']} bytes en archivos)."
+        )
+    except Exception as e:
+        logger.error(f"Error en el job de archivo de compras: {e}", exc_info=True)
+        raise
+
+async def backup_database_job():
+    """
+    Tarea programada que hace una copia de seguridad en caliente de la base
+    (API de copia en línea por pasos), la verifica y rota las antiguas.
+    """
+    logger.info("Iniciando copia de seguridad de la base...")
+    try:
+        summary = await backup_database()
+        logger.info(f"Finalizada copia de seguridad: {summary['path']} ({summary['seconds']}s).")
+    except Exception as e:
+        logger.error(f"Error en el job de copia de seguridad: {e}", exc_info=True)
+        raise
+
+# Puedes añadir más jobs aquí si son necesarios
\ No newline at end of file
@@ -0,0 +1,181 @@
+# scheduler/lease.py
+"""
+Ejecución de jobs con un único ejecutor entre procesos (lease en la base de datos)
+y recuperación determinista de ventanas perdidas.
+
+Cada job tiene ventanas fijas de duración `interval` alineadas a `anchor`
+(no al arranque del proceso). APScheduler solo "sondea" con frecuencia; el job
+se ejecuta cuando hay una ventana nueva sin completar y este proceso consigue el
+lease. El índice de la última ventana completada se guarda en job_leases, así que
+un reinicio no reinicia el intervalo ni duplica ejecuciones.
+"""
+import asyncio
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database.db import get_db
+from database.models.job_lease import JobLease
+from utils.logger import logger
+
+# Identificador de este proceso como dueño de leases
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+DEFAULT_ANCHOR = datetime(2024, 1, 1)
+DEFAULT_LEASE_TTL = timedelta(minutes=10)
+
+
+def window_index(now: datetime, interval: timedelta, anchor: datetime = DEFAULT_ANCHOR) -> int:
+    """Índice de la ventana que contiene `now` (ventanas alineadas a `anchor`)."""
+    return int((now - anchor) // interval)
+
+
+async def acquire_lease(job_id: str, ttl: timedelta = DEFAULT_LEASE_TTL) -> bool:
+    """
+    Intenta tomar el lease del job. Solo lo consigue si está libre, caducado
+    o ya es de este proceso; la condición se evalúa en un único UPDATE atómico.
+    """
+    now = datetime.now()
+    async with get_db() as session:
+        await session.execute(sqlite_insert(JobLease).values(job_id=job_id).on_conflict_do_nothing())
+        result = await session.execute(
+            update(JobLease)
+            .where(
+                JobLease.job_id == job_id,
+                (JobLease.owner.is_(None)) | (JobLease.owner == OWNER_ID) | (JobLease.expires_at < now),
+            )
+            .values(owner=OWNER_ID, expires_at=now + ttl, heartbeat_at=now)
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def renew_lease(job_id: str, ttl: timedelta = DEFAULT_LEASE_TTL) -> bool:
+    """Extiende el lease (heartbeat). Retorna False si este proceso ya no es el dueño."""
+    now = datetime.now()
+    async with get_db() as session:
+        result = await session.execute(
+            update(JobLease)
+            .where(JobLease.job_id == job_id, JobLease.owner == OWNER_ID)
+            .values(expires_at=now + ttl, heartbeat_at=now)
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def release_lease(job_id: str):
+    """Libera el lease si este proceso es el dueño."""
+    async with get_db() as session:
+        await session.execute(
+            update(JobLease)
+            .where(JobLease.job_id == job_id, JobLease.owner == OWNER_ID)
+            .values(owner=None, expires_at=None)
+        )
+        await session.commit()
+
+
+async def _get_last_window(job_id: str) -> int | None:
+    async with get_db() as session:
+        return await session.scalar(select(JobLease.last_window).filter_by(job_id=job_id))
+
+
+async def _heartbeat(job_id: str, ttl: timedelta, work: asyncio.Task) -> bool:
+    """
+    Renueva el lease mientras corre `work`. Si se pierde, o no se puede renovar
+    (p. ej. "database is locked"), cancela `work` y retorna True: sin renovación
+    el lease caduca y otro proceso podría ejecutar la misma ventana.
+    """
+    while True:
+        await asyncio.sleep(ttl.total_seconds() / 3)
+        try:
+            renewed = await renew_lease(job_id, ttl)
+        except Exception as e:
+            logger.error(f"Job '{job_id}': no se pudo renovar el lease: {e}; se cancela la ejecución.", exc_info=True)
+            renewed = False
+        else:
+            if not renewed:
+                logger.warning(f"Job '{job_id}': se perdió el lease durante la ejecución; se cancela.")
+        if not renewed:
+            work.cancel()
+            return True
+
+
+async def run_leased_job(
+    job_id: str,
+    interval: timedelta,
+    job: Callable[..., Awaitable[Any]],
+    *args: Any,
+    anchor: datetime = DEFAULT_ANCHOR,
+    max_catch_up: int = 1,
+    jitter_seconds: float = 0,
+    ttl: timedelta = DEFAULT_LEASE_TTL,
+):
+    """
+    Sondeo de un job programado: lo ejecuta si hay ventanas pendientes y este
+    proceso obtiene el lease.
+    :param max_catch_up: Ventanas pendientes que se ejecutan una a una, de la más
+        antigua a la más reciente. Con 1 (por defecto) las perdidas se agrupan en
+        una sola ejecución, adecuado para jobs idempotentes basados en fechas.
+        Si el lease se pierde a mitad (otro proceso pudo tomarlo al caducar), la
+        ejecución se cancela y su ventana queda pendiente para el nuevo dueño.
+    :param jitter_seconds: Espera aleatoria máxima antes de ejecutar, para repartir
+        en el tiempo las ejecuciones pesadas de varios jobs o despliegues.
+    """
+    current = window_index(datetime.now(), interval, anchor)
+    last_window = await _get_last_window(job_id)
+    if last_window is not None and last_window >= current:
+        return  # Ventana actual ya completada (por este u otro proceso)
+
+    if jitter_seconds:
+        await asyncio.sleep(random.uniform(0, jitter_seconds))
+
+    if not await acquire_lease(job_id, ttl):
+        logger.debug(f"Job '{job_id}': el lease lo tiene otro proceso; se omite.")
+        return
+
+    async def run_pending():
+        # Releer tras obtener el lease: otro proceso pudo completar la ventana entretanto
+        last_window = await _get_last_window(job_id)
+        if last_window is None:
+            pending = [current]
+        else:
+            missed = current - last_window
+            first = max(last_window + 1, current - max_catch_up + 1)
+            pending = list(range(first, current + 1))
+            if missed > 1:
+                logger.info(f"Job '{job_id}': {missed - 1} ventana(s) perdida(s); se recuperan {len(pending)} ejecución(es).")
+
+        for window in pending:
+            started_at = datetime.now()
+            logger.info(f"Job '{job_id}': ejecutando ventana {window} (dueño {OWNER_ID}).")
+            await job(*args)
+            # Registrar la ventana sin soltar el lease hasta la última
+            async with get_db() as session:
+                await session.execute(
+                    update(JobLease)
+                    .where(JobLease.job_id == job_id, JobLease.owner == OWNER_ID)
+                    .values(last_window=window, last_run_at=started_at, last_success_at=datetime.now())
+                )
+                await session.commit()
+
+    work = asyncio.create_task(run_pending())
+    heartbeat = asyncio.create_task(_heartbeat(job_id, ttl, work))
+    try:
+        await work
+    except asyncio.CancelledError:
+        # El heartbeat solo termina (con True) después de cancelar la ejecución
+        lease_lost = heartbeat.done() and not heartbeat.cancelled() and heartbeat.exception() is None and heartbeat.result()
+        if not lease_lost:
+            raise  # Cancelación desde fuera (p. ej. al detener el scheduler)
+        logger.warning(f"Job '{job_id}': ejecución cancelada por pérdida del lease; la ventana queda pendiente.")
+    except Exception as e:
+        logger.error(f"Job '{job_id}': error durante la ejecución: {e}", exc_info=True)
+    finally:
+        heartbeat.cancel()
+        await release_lease(job_id)
@@ -3,36 +3,127 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime, timedelta
 from utils.logger import logger
-from .jobs import award_permanence_points_job
+from .jobs import award_permanence_points_job, reconcile_stats_job, prune_daily_points_job, draw_raffles_job, reset_missions_job, archive_purchases_job, backup_database_job
+from .lease import run_leased_job
 from aiogram import Bot
 
 scheduler = AsyncIOScheduler()
 
+# Cada cuánto se sondea si algún job tiene una ventana pendiente
+JOB_POLL_MINUTES = 5
+JOB_POLL_JITTER_SECONDS = 30
+
 async def setup_scheduler(bot: Bot):
     """
     Configura y arranca el scheduler para las tareas programadas.
     """
     logger.info("Configurando scheduler...")
 
-    # Calcula la próxima ejecución para que ocurra en un horario específico si se desea
-    # Por ejemplo, cada día a las 00:01 AM (hora del servidor)
-    # next_run_time_daily = datetime.now()
-    # if next_run_time_daily.hour >= 0 and next_run_time_daily.minute >= 1:
-    #     next_run_time_daily += timedelta(days=1)
-    # next_run_time_daily = next_run_time_daily.replace(hour=0, minute=1, second=0, microsecond=0)
-
+    # Los jobs no se ejecutan directamente: APScheduler solo sondea cada pocos minutos y
+    # run_leased_job decide si hay una ventana pendiente (24h / 6h alineadas a un ancla fija)
+    # y si este proceso obtiene el lease en la base. Así, con varios procesos solo uno ejecuta
+    # cada ventana, y tras un reinicio las ventanas perdidas se recuperan en el primer sondeo
+    # (next_run_time=ahora) en lugar de reiniciar el intervalo desde cero.
+    #
     # Cada 24 horas para el chequeo de permanencia.
     # Podríamos hacerlo semanalmente para reducir la carga de la DB si los usuarios son muchos,
     # pero el informe pide puntos semanales con racha, así que un chequeo diario es mejor.
     scheduler.add_job(
-        award_permanence_points_job,
-        trigger=IntervalTrigger(hours=24), # Se ejecuta cada 24 horas
-        # next_run_time=next_run_time_daily, # Descomentar para una hora específica
-        args=[bot], # Pasar el objeto bot al job
+        run_leased_job,
+        trigger=IntervalTrigger(minutes=JOB_POLL_MINUTES, jitter=JOB_POLL_JITTER_SECONDS),
+        next_run_time=datetime.now(),
+        args=['award_permanence_points', timedelta(hours=24), award_permanence_points_job, bot], # Pasar el objeto bot al job
+        kwargs={'jitter_seconds': 300}, # Job pesado: se reparte en los primeros 5 minutos de la ventana
         id='award_permanence_points',
-        name='Otorgar puntos por permanencia'
+        name='Otorgar puntos por permanencia',
+        max_instances=1,
+        coalesce=True,
+    )
+    logger.info("Job 'award_permanence_points' añadido al scheduler (ventanas de 24h con lease).")
+
+    # Reconciliación de los contadores de /admin (corrige deriva, p. ej. por ediciones manuales)
+    scheduler.add_job(
+        run_leased_job,
+        trigger=IntervalTrigger(minutes=JOB_POLL_MINUTES, jitter=JOB_POLL_JITTER_SECONDS),
+        next_run_time=datetime.now(),
+        args=['reconcile_stats', timedelta(hours=6), reconcile_stats_job],
+        kwargs={'jitter_seconds': 120},
+        id='reconcile_stats',
+        name='Reconciliar estadísticas del sistema',
+        max_instances=1,
+        coalesce=True,
+    )
+    logger.info("Job 'reconcile_stats' añadido al scheduler (ventanas de 6h con lease).")
+
+    # Purga de buckets de puntos diarios fuera de las ventanas de /ranking semana|mes
+    scheduler.add_job(
+        run_leased_job,
+        trigger=IntervalTrigger(minutes=JOB_POLL_MINUTES, jitter=JOB_POLL_JITTER_SECONDS),
+        next_run_time=datetime.now(),
+        args=['prune_daily_points', timedelta(hours=24), prune_daily_points_job],
+        kwargs={'jitter_seconds': 120},
+        id='prune_daily_points',
+        name='Purgar puntos diarios antiguos',
+        max_instances=1,
+        coalesce=True,
+    )
+    logger.info("Job 'prune_daily_points' añadido al scheduler (ventanas de 24h con lease).")
+
+    # Cierre y sorteo de los sorteos vencidos (idempotente: solo toma los que siguen abiertos)
+    scheduler.add_job(
+        run_leased_job,
+        trigger=IntervalTrigger(minutes=JOB_POLL_MINUTES, jitter=JOB_POLL_JITTER_SECONDS),
+        next_run_time=datetime.now(),
+        args=['draw_raffles', timedelta(minutes=15), draw_raffles_job, bot],
+        id='draw_raffles',
+        name='Sortear sorteos vencidos',
+        max_instances=1,
+        coalesce=True,
+    )
+    logger.info("Job 'draw_raffles' añadido al scheduler (ventanas de 15 min con lease).")
+
+    # Reinicio en bloque de misiones semanales/mensuales (el progreso ya se reinicia al
+    # primer evento del periodo nuevo; el job elimina las filas de periodos terminados)
+    scheduler.add_job(
+        run_leased_job,
+        trigger=IntervalTrigger(minutes=JOB_POLL_MINUTES, jitter=JOB_POLL_JITTER_SECONDS),
+        next_run_time=datetime.now(),
+        args=['reset_missions', timedelta(hours=24), reset_missions_job],
+        kwargs={'jitter_seconds': 120},
+        id='reset_missions',
+        name='Reiniciar misiones vencidas',
+        max_instances=1,
+        coalesce=True,
+    )
+    logger.info("Job 'reset_missions' añadido al scheduler (ventanas de 24h con lease).")
+
+    # Archivo de las compras de meses que superan ARCHIVE_AFTER_DAYS (archivos mensuales comprimidos)
+    scheduler.add_job(
+        run_leased_job,
+        trigger=IntervalTrigger(minutes=JOB_POLL_MINUTES, jitter=JOB_POLL_JITTER_SECONDS),
+        next_run_time=datetime.now(),
+        args=['archive_purchases', timedelta(hours=24), archive_purchases_job],
+        kwargs={'jitter_seconds': 300},
+        id='archive_purchases',
+        name='Archivar compras antiguas',
+        max_instances=1,
+        coalesce=True,
+    )
+    logger.info("Job 'archive_purchases' añadido al scheduler (ventanas de 24h con lease).")
+
+    # Copia de seguridad en caliente (API de copia en línea por pasos; no bloquea a los handlers)
+    scheduler.add_job(
+        run_leased_job,
+        trigger=IntervalTrigger(minutes=JOB_POLL_MINUTES, jitter=JOB_POLL_JITTER_SECONDS),
+        next_run_time=datetime.now(),
+        args=['backup_database', timedelta(hours=24), backup_database_job],
+        kwargs={'jitter_seconds': 300},
+        id='backup_database',
+        name='Copia de seguridad de la base',
+        max_instances=1,
+        coalesce=True,
     )
-    logger.info("Job 'award_permanence_points' añadido al scheduler (cada 24h).")
+    logger.info("Job 'backup_database' añadido al scheduler (ventanas de 24h con lease).")
 
     if not scheduler.running:
         scheduler.start()
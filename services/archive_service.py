@@ -0,0 +1,397 @@
+# services/archive_service.py
+"""
+Archivo por niveles del historial de compras.
+
+La tabla purchases solo crece, y cada consulta e índice paga por años de filas
+que nadie mira. El job diario `archive_purchases` mueve los meses completos
+anteriores a ARCHIVE_AFTER_DAYS a un archivo SQLite por mes en ARCHIVE_DIR y
+deja en purchase_rollups un resumen por usuario y mes. Los totales del usuario
+(purchase_count, purchase_points_total) no cambian: ya están en su fila.
+
+Cada archivo guarda una fila por usuario con sus compras del mes como JSON
+comprimido con zlib (`archived_purchases`), así que leer el historial de un
+usuario en un mes es una búsqueda por clave primaria y una descompresión. Los
+bloques de un usuario son pequeños y comprimen mal por sí solos: se comprimen
+con un diccionario zlib (`zdict`) sacado de las compras del mismo mes y
+guardado en el archivo. Un mes se escribe en un archivo temporal que luego se
+renombra; las compras se borran de la tabla (por id) en la misma transacción
+que registra los resúmenes y la partición, confirmada por el escritor único
+(database/writer.py) del shard. Si el proceso muere entre ambos pasos, la
+siguiente pasada vuelve a escribir el mes fusionando con lo que ya había (sin
+duplicar ids).
+
+`/myrewards` no cambia: `archived_purchase_page` continúa la paginación por
+cursor en los archivos cuando el usuario pasa de las compras recientes. Para
+auditorías, `python -m services.archive_service audit --months 2024-01 ...`
+adjunta los archivos (ATTACH) a una conexión de solo lectura y expone las
+vistas `archived_purchases` y `all_purchases`.
+
+Con shards (database/shards.py) cada shard archiva sus compras en sus propios
+archivos (`purchases-AAAA-MM.shardN.sqlite`) y registra sus particiones.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import sys
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.db import get_db, load_models
+from database.models.archive import ArchivePartition, PurchaseRollup
+from database.models.purchase import Purchase
+from database.shards import get_shard_db, shard_names, sharding_enabled, user_shard
+from database.writer import submit_write
+from utils.logger import logger
+from utils.misc import add_months
+
+# Compras borradas por sentencia (límite de variables de SQLite)
+ARCHIVE_DELETE_CHUNK = 500
+# Tamaño máximo del diccionario zlib de un archivo (zlib usa como mucho 32 KB)
+ARCHIVE_ZDICT_BYTES = 32 * 1024
+
+_ARCHIVE_SCHEMA = """
+CREATE TABLE archived_purchases (
+    user_id INTEGER PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    payload BLOB NOT NULL -- zlib con zdict de JSON [[id, monto, puntos, descripción, fecha ISO], ...]
+);
+CREATE TABLE archive_meta (key TEXT PRIMARY KEY, value NOT NULL); -- "zdict" es un BLOB
+"""
+
+_purchase_columns = (
+    Purchase.id, Purchase.user_id, Purchase.amount, Purchase.points_awarded, Purchase.description, Purchase.purchase_date,
+)
+
+
+def month_key(date: datetime) -> str:
+    return date.strftime("%Y-%m")
+
+
+def _month_start(month: str) -> datetime:
+    return datetime.strptime(month, "%Y-%m")
+
+
+def archive_path(month: str, source: str | None = None) -> str:
+    """Archivo de un mes (`source` es el shard, o None sin shards)."""
+    suffix = f".{source}" if source else ""
+    return os.path.join(settings.ARCHIVE_DIR, f"purchases-{month}{suffix}.sqlite")
+
+
+def _dumps(rows: list[list]) -> bytes:
+    return json.dumps(rows, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _build_zdict(by_user: dict[int, list[list]]) -> bytes:
+    """
+    Diccionario zlib del mes: compras de muestra repartidas por todo el mes, con
+    las más representativas al final (zlib da prioridad al final del diccionario).
+    """
+    rows = [row for user_rows in by_user.values() for row in user_rows]
+    # El diccionario se guarda en el archivo: en meses pequeños se limita a ~8 bytes por compra
+    size = min(ARCHIVE_ZDICT_BYTES, max(1024, len(rows) * 8))
+    step = max(1, len(rows) * 64 // size)
+    return _dumps(rows[::step])[-size:]
+
+
+def _encode(rows: list[list], zdict: bytes) -> bytes:
+    compressor = zlib.compressobj(9, zdict=zdict)
+    return compressor.compress(_dumps(rows)) + compressor.flush()
+
+
+def _decode(payload: bytes, zdict: bytes) -> list[list]:
+    decompressor = zlib.decompressobj(zdict=zdict)
+    return json.loads(decompressor.decompress(payload) + decompressor.flush())
+
+
+def _zdict_of(conn: sqlite3.Connection, schema: str = "main") -> bytes:
+    return conn.execute(f"SELECT value FROM {schema}.archive_meta WHERE key = 'zdict'").fetchone()[0]
+
+
+def _read_archive(path: str) -> dict[int, list[list]]:
+    """Compras de un archivo por usuario (vacío si el archivo no existe)."""
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        zdict = _zdict_of(conn)
+        return {
+            user_id: _decode(payload, zdict)
+            for user_id, payload in conn.execute("SELECT user_id, payload FROM archived_purchases")
+        }
+    finally:
+        conn.close()
+
+
+def _write_archive(path: str, month: str, by_user: dict[int, list[list]]) -> tuple[int, int, int]:
+    """
+    Escribe el archivo del mes fusionando con el existente (las compras se
+    identifican por id). Retorna (compras, usuarios, bytes) del archivo final.
+    """
+    merged = _read_archive(path)
+    for user_id, rows in by_user.items():
+        known = {row[0] for row in merged.get(user_id, [])}
+        merged.setdefault(user_id, []).extend(row for row in rows if row[0] not in known)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.executescript(_ARCHIVE_SCHEMA)
+        zdict = _build_zdict(merged)
+        total = 0
+        with conn:
+            for user_id in sorted(merged):
+                rows = sorted(merged[user_id], key=lambda row: (row[4], row[0]))
+                total += len(rows)
+                conn.execute("INSERT INTO archived_purchases VALUES (?, ?, ?)", (user_id, len(rows), _encode(rows, zdict)))
+            conn.executemany("INSERT INTO archive_meta VALUES (?, ?)", [
+                ("table", "purchases"), ("month", month), ("rows", str(total)),
+                ("written_at", datetime.now().isoformat(timespec="seconds")), ("zdict", zdict),
+            ])
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(temp_path, path)
+    return total, len(merged), os.path.getsize(path)
+
+
+def _to_purchase(user_id: int, row: list) -> Purchase:
+    purchase_id, amount, points_awarded, description, purchase_date = row
+    return Purchase(
+        id=purchase_id, user_id=user_id, amount=Decimal(amount), points_awarded=points_awarded,
+        description=description, purchase_date=datetime.fromisoformat(purchase_date),
+    )
+
+
+def archived_purchase_page(db: Session, user_id: int, before: tuple[datetime, int] | None, limit: int,
+                           after: tuple[datetime, int] | None = None) -> list[Purchase]:
+    """
+    Continuación de /myrewards en los archivos: hasta `limit` compras archivadas
+    del usuario anteriores al cursor (purchase_date, id) y, si se indica,
+    posteriores a `after`, de la más reciente a la más antigua. Solo abre los
+    meses que el usuario tiene en purchase_rollups dentro de ese rango.
+    Rutina síncrona para usar dentro de una lectura `@read_only`.
+    """
+    query = select(PurchaseRollup.month).filter(PurchaseRollup.user_id == user_id)
+    if before is not None:
+        query = query.filter(PurchaseRollup.month <= month_key(before[0]))
+    if after is not None:
+        query = query.filter(PurchaseRollup.month >= month_key(after[0]))
+    source = user_shard(user_id)
+    purchases: list[Purchase] = []
+    for month in db.execute(query.order_by(PurchaseRollup.month.desc())).scalars().all():
+        path = archive_path(month, source)
+        if not os.path.exists(path):
+            logger.warning(f"Falta el archivo {path} del historial archivado del usuario {user_id}.")
+            continue
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT payload FROM archived_purchases WHERE user_id = ?", (user_id,)).fetchone()
+            zdict = _zdict_of(conn) if row is not None else None
+        finally:
+            conn.close()
+        if row is None:
+            continue
+        for archived in sorted(_decode(row[0], zdict), key=lambda item: (item[4], item[0]), reverse=True):
+            purchase = _to_purchase(user_id, archived)
+            if before is not None and (purchase.purchase_date, purchase.id) >= before:
+                continue
+            if after is not None and (purchase.purchase_date, purchase.id) <= after:
+                return purchases
+            purchases.append(purchase)
+            if len(purchases) >= limit:
+                return purchases
+    return purchases
+
+
+class ArchiveService:
+    def __init__(self, session: AsyncSession, source: str | None = None):
+        """`source`: shard cuyas compras se archivan con esta sesión (None sin shards)."""
+        self.session = session
+        self.source = source
+
+    async def archive_before(self, cutoff: datetime) -> dict:
+        """
+        Archiva, mes a mes, las compras de los meses completos anteriores a `cutoff`
+        (que debe ser el día 1 de un mes). Retorna {"months", "rows", "bytes"}.
+        """
+        stats = {"months": 0, "rows": 0, "bytes": 0}
+        oldest = await self.session.scalar(select(func.min(Purchase.purchase_date)))
+        while oldest is not None and oldest < cutoff:
+            month = month_key(oldest)
+            start = _month_start(month)
+            end = add_months(start, 1)
+            rows, size = await self._archive_month(month, start, end)
+            stats["months"] += 1
+            stats["rows"] += rows
+            stats["bytes"] += size
+            oldest = await self.session.scalar(
+                select(func.min(Purchase.purchase_date)).filter(Purchase.purchase_date >= end)
+            )
+        return stats
+
+    async def _archive_month(self, month: str, start: datetime, end: datetime) -> tuple[int, int]:
+        """Mueve las compras de un mes a su archivo. Retorna (compras movidas, bytes del archivo)."""
+        result = await self.session.execute(
+            select(*_purchase_columns)
+            .filter(Purchase.purchase_date >= start, Purchase.purchase_date < end)
+            .order_by(Purchase.user_id, Purchase.purchase_date, Purchase.id)
+        )
+        rows = result.all()
+        await self.session.commit()  # Cierra la lectura mientras se escribe el archivo
+
+        by_user: dict[int, list[list]] = defaultdict(list)
+        rollups: dict[int, dict] = {}
+        for purchase_id, user_id, amount, points_awarded, description, purchase_date in rows:
+            by_user[user_id].append([purchase_id, str(amount), points_awarded, description, purchase_date.isoformat()])
+            rollup = rollups.setdefault(user_id, {"user_id": user_id, "month": month, "purchases": 0, "amount": Decimal(0), "points_awarded": 0})
+            rollup["purchases"] += 1
+            rollup["amount"] += Decimal(amount)
+            rollup["points_awarded"] += points_awarded
+
+        path = archive_path(month, self.source)
+        total, users, size = await asyncio.to_thread(_write_archive, path, month, by_user)
+
+        # Resúmenes, borrado y partición en una sola transacción del escritor del shard: un mes
+        # grande no compite por el bloqueo con las escrituras de los handlers
+        async def apply(db: AsyncSession) -> None:
+            stmt = sqlite_insert(PurchaseRollup.__table__)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[PurchaseRollup.user_id, PurchaseRollup.month],
+                    set_={
+                        "purchases": PurchaseRollup.purchases + stmt.excluded.purchases,
+                        "amount": PurchaseRollup.amount + stmt.excluded.amount,
+                        "points_awarded": PurchaseRollup.points_awarded + stmt.excluded.points_awarded,
+                    },
+                ),
+                list(rollups.values()),
+            )
+            ids = [row[0] for row in rows]
+            for index in range(0, len(ids), ARCHIVE_DELETE_CHUNK):
+                await db.execute(delete(Purchase).where(Purchase.id.in_(ids[index:index + ARCHIVE_DELETE_CHUNK])))
+            partition = sqlite_insert(ArchivePartition).values(month=month, path=path, rows=total, users=users, size_bytes=size)
+            await db.execute(partition.on_conflict_do_update(
+                index_elements=[ArchivePartition.month],
+                set_={"path": path, "rows": total, "users": users, "size_bytes": size, "archived_at": datetime.now()},
+            ))
+
+        await submit_write(apply, shard=self.source)
+        logger.info(f"Archivo {month}{f' ({self.source})' if self.source else ''}: {len(rows)} compras movidas a {path} ({size} bytes).")
+        return len(rows), size
+
+    async def get_partitions(self) -> list[ArchivePartition]:
+        result = await self.session.execute(select(ArchivePartition).order_by(ArchivePartition.month))
+        return result.scalars().all()
+
+
+async def archive_old_purchases(now: datetime | None = None) -> dict:
+    """
+    Archiva los meses completos anteriores a ARCHIVE_AFTER_DAYS (en cada shard,
+    si los hay). Retorna los totales de la pasada.
+    """
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=settings.ARCHIVE_AFTER_DAYS)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    totals = {"months": 0, "rows": 0, "bytes": 0}
+    for source in (shard_names() if sharding_enabled() else [None]):
+        async with (get_shard_db(source) if source else get_db()) as session:
+            stats = await ArchiveService(session, source).archive_before(cutoff)
+        for key in totals:
+            totals[key] += stats[key]
+    return totals
+
+
+def open_audit_connection(months: list[str], source: str | None = None) -> sqlite3.Connection:
+    """
+    Conexión de solo lectura a la base (o al shard `source`) con los archivos de
+    `months` adjuntos y dos vistas temporales: `archived_purchases` (las compras
+    de los archivos, descomprimidas) y `all_purchases` (recientes y archivadas,
+    con la columna `archived`). SQLite adjunta como máximo 10 bases por conexión.
+    """
+    from sqlalchemy import make_url
+    from database.db import engine
+    from database.shards import shard_url
+
+    if source is None and sharding_enabled():
+        raise ValueError("Con DB_SHARD_URLS las compras se archivan por shard: indica --shard.")
+    database_path = make_url(shard_url(source)).database if source else engine.url.database
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    selects = []
+    for index, month in enumerate(months):
+        path = archive_path(month, source)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No existe el archivo del mes {month}: {path}")
+        conn.execute(f"ATTACH DATABASE ? AS archive_{index}", (f"file:{path}?mode=ro",))
+        # Cada archivo tiene su diccionario: una función de descompresión por archivo
+        conn.create_function(
+            f"archive_rows_{index}", 1,
+            lambda payload, zdict=_zdict_of(conn, f"archive_{index}"): _dumps(_decode(payload, zdict)).decode(),
+            deterministic=True,
+        )
+        selects.append(
+            "SELECT CAST(json_extract(r.value, '$[0]') AS INTEGER) AS id, a.user_id AS user_id, "
+            "CAST(json_extract(r.value, '$[1]') AS NUMERIC) AS amount, json_extract(r.value, '$[2]') AS points_awarded, "
+            "json_extract(r.value, '$[3]') AS description, json_extract(r.value, '$[4]') AS purchase_date "
+            f"FROM archive_{index}.archived_purchases AS a, json_each(archive_rows_{index}(a.payload)) AS r"
+        )
+    archived = " UNION ALL ".join(selects) or (
+        "SELECT NULL AS id, NULL AS user_id, NULL AS amount, NULL AS points_awarded, NULL AS description, "
+        "NULL AS purchase_date WHERE 0"
+    )
+    conn.execute(f"CREATE TEMP VIEW archived_purchases AS {archived}")
+    conn.execute(
+        "CREATE TEMP VIEW all_purchases AS "
+        "SELECT id, user_id, amount, points_awarded, description, purchase_date, 0 AS archived FROM main.purchases "
+        "UNION ALL SELECT id, user_id, amount, points_awarded, description, purchase_date, 1 FROM archived_purchases"
+    )
+    return conn
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Archivo de compras: listar particiones o auditarlas con SQL.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("archive", help="Ejecuta ahora la pasada de archivo")
+    commands.add_parser("list", help="Lista las particiones archivadas")
+    audit = commands.add_parser("audit", help="Adjunta archivos y ejecuta una consulta (salida CSV)")
+    audit.add_argument("--months", nargs="*", default=[], help="Meses AAAA-MM a adjuntar (máx. 10)")
+    audit.add_argument("--shard", default=None, help="Shard cuyos archivos se adjuntan (con DB_SHARD_URLS)")
+    audit.add_argument("--sql", default="SELECT * FROM all_purchases ORDER BY purchase_date, id")
+    args = parser.parse_args(argv)
+    load_models()
+
+    if args.command == "archive":
+        print(json.dumps(asyncio.run(archive_old_purchases())))
+    elif args.command == "list":
+        async def partitions() -> list[ArchivePartition]:
+            async with get_db() as session:
+                return await ArchiveService(session).get_partitions()
+
+        for partition in asyncio.run(partitions()):
+            print(f"{partition.month}\t{partition.rows}\t{partition.users}\t{partition.size_bytes}\t{partition.path}")
+    else:
+        conn = open_audit_connection(args.months, args.shard)
+        try:
+            cursor = conn.execute(args.sql)
+            writer = csv.writer(sys.stdout)
+            writer.writerow([column[0] for column in cursor.description])
+            writer.writerows(cursor)
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
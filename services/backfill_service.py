@@ -0,0 +1,337 @@
+# services/backfill_service.py
+"""
+Backfill retroactivo de insignias y niveles.
+
+Cuando se añade una regla de insignia (BADGE_RULES) o un nivel, los usuarios que
+ya cumplen el criterio no lo reciben hasta que un evento suyo lo evalúa. El
+backfill recorre la tabla users por cursor (id > last_user_id) en lotes y, por
+cada lote, en una sola escritura del escritor único:
+- asigna niveles en bloque con `LevelTable` (np.searchsorted) y un UPDATE
+  executemany de las filas que cambian;
+- otorga cada insignia con un único UPDATE por regla sobre el rango de ids del
+  lote, que añade la insignia a `badges_json` solo a quien cumple el umbral y no
+  la tiene (json_each), devolviendo los ids premiados;
+- guarda el checkpoint (cursor y contadores) en la misma transacción.
+
+Así, si el proceso muere, el backfill continúa al arrancar desde el último lote
+confirmado sin otorgar nada dos veces (los avisos del lote interrumpido pueden
+perderse). Con shards (database/shards.py) se recorren uno tras otro: el lote se
+aplica en el escritor del shard y el checkpoint, que vive en el compartido, se
+guarda justo después. Los avisos salen con PacedSender, bajo el limitador global
+de la Bot API, y un lease por backfill (scheduler/lease.py) evita que dos
+procesos lo ejecuten a la vez.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from sqlalchemy import DateTime, bindparam, func, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import get_db
+from database.models.backfill import BackfillRun, BACKFILL_RUNNING, BACKFILL_COMPLETED, BACKFILL_CANCELLED
+from database.models.user import User
+from database.shards import shard_names, sharding_enabled
+from database.writer import submit_write
+from scheduler.lease import acquire_lease, renew_lease, release_lease
+from services.badge_service import award_statement, badge_rules
+from services.level_service import LevelService, LevelTable
+from services.stats_service import StatsService, USERS_TOTAL
+from utils.logger import logger
+from utils.pacing import PacedSender, SEND_OK
+
+# Usuarios por lote: cada lote es una escritura del escritor único, así que se
+# mantiene pequeño para no retrasar las escrituras de los handlers
+BACKFILL_CHUNK_SIZE = 1000
+BACKFILL_STATUS_INTERVAL_SECONDS = 5.0
+BACKFILL_LEASE_TTL = timedelta(minutes=2)
+BACKFILL_LEASE_RETRY_SECONDS = 30
+
+# Backfills que este proceso está ejecutando: id -> tarea
+_running: dict[int, asyncio.Task] = {}
+
+_users = User.__table__
+
+_level_update = (
+    update(_users)
+    .where(_users.c.id == bindparam("user_id"))
+    .values(level_id=bindparam("new_level_id"))
+)
+
+
+def _lease_id(run_id: int) -> str:
+    return f"backfill:{run_id}"
+
+
+def _counter_value(counter: str, now: datetime):
+    """
+    Expresión SQL del contador de una regla ("tenure_days" o una columna de users).
+    `now` es hora local, el mismo reloj con el que se escribe `join_date` y con el
+    que PermanenceService cuenta los días de antigüedad.
+    """
+    if counter == "tenure_days":
+        now_value = literal(now, DateTime)
+        return func.julianday(now_value) - func.julianday(func.coalesce(_users.c.join_date, now_value))
+    return func.coalesce(_users.c[counter], 0)
+
+
+def _award_statement(counter: str, threshold: int, badge: dict, now: datetime):
+    """UPDATE de una regla sobre un rango de ids (:low, :high]: otorga la insignia a quien alcanza el umbral."""
+    return award_statement(
+        badge,
+        _users.c.id > bindparam("low"),
+        _users.c.id <= bindparam("high"),
+        _counter_value(counter, now) >= threshold,
+    )
+
+
+def format_backfill_status(run: BackfillRun) -> str:
+    total = max(run.total_users, run.scanned)
+    percent = run.scanned * 100 // total if total else 100
+    status_titles = {
+        BACKFILL_RUNNING: "🔄 **Backfill retroactivo en curso**",
+        BACKFILL_COMPLETED: "✅ **Backfill retroactivo terminado**",
+        BACKFILL_CANCELLED: "⛔ **Backfill retroactivo cancelado**",
+    }
+    return "\n".join([
+        f"{status_titles.get(run.status, run.status)} (#{run.id})\n",
+        f"📊 **Progreso:** {run.scanned}/{total} ({percent}%)",
+        f"🏅 **Insignias otorgadas:** {run.badges_awarded}",
+        f"📈 **Niveles actualizados:** {run.levels_changed}",
+        f"📣 **Avisos entregados:** {run.notified}",
+    ])
+
+
+class BackfillService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_backfill(self, created_by: int, status_chat_id: int, status_message_id: int) -> BackfillRun:
+        """Crea el backfill; el total de usuarios sale del contador en memoria (O(1))."""
+        counters = await StatsService(self.session).get_counters()
+        run = BackfillRun(
+            created_by=created_by,
+            status_chat_id=status_chat_id,
+            status_message_id=status_message_id,
+            total_users=counters[USERS_TOTAL],
+        )
+        self.session.add(run)
+        await self.session.commit()
+        await self.session.refresh(run)
+        logger.info(f"Backfill retroactivo #{run.id} creado por {created_by} para {run.total_users} usuarios.")
+        return run
+
+    async def cancel_backfill(self, run_id: int) -> bool:
+        """Marca el backfill como cancelado; se detiene al terminar el lote en curso."""
+        run = await self.session.get(BackfillRun, run_id)
+        if not run or run.status != BACKFILL_RUNNING:
+            return False
+        run.status = BACKFILL_CANCELLED
+        run.finished_at = datetime.now()
+        await self.session.commit()
+        return True
+
+
+def start_backfill(bot: Bot, run_id: int):
+    """Lanza el backfill en segundo plano (si no está ya en marcha en este proceso)."""
+    if run_id in _running:
+        return
+    task = asyncio.create_task(run_backfill(bot, run_id))
+    _running[run_id] = task
+    task.add_done_callback(lambda _: _running.pop(run_id, None))
+
+
+async def resume_backfills(bot: Bot):
+    """Reanuda los backfills que quedaron en curso (p. ej. tras un reinicio)."""
+    async with get_db() as session:
+        result = await session.execute(select(BackfillRun.id).filter(BackfillRun.status == BACKFILL_RUNNING))
+        run_ids = result.scalars().all()
+    for run_id in run_ids:
+        logger.info(f"Reanudando backfill retroactivo #{run_id}.")
+        start_backfill(bot, run_id)
+
+
+async def _edit_status(bot: Bot, run: BackfillRun):
+    if not run.status_message_id:
+        return
+    with suppress(TelegramBadRequest):  # "message is not modified" o mensaje borrado
+        await bot.edit_message_text(
+            format_backfill_status(run),
+            chat_id=run.status_chat_id,
+            message_id=run.status_message_id,
+            parse_mode="Markdown",
+        )
+
+
+@dataclass
+class ChunkResult:
+    """Resultado de aplicar un lote: sin filas, la tabla (o el shard) está terminada."""
+    scanned: int = 0
+    last_user_id: Optional[int] = None
+    levels_changed: int = 0
+    badges_awarded: int = 0
+    messages: dict[int, list[str]] = field(default_factory=lambda: defaultdict(list))
+
+
+async def _apply_chunk(db: AsyncSession, after_id: Optional[int], levels: LevelTable) -> ChunkResult:
+    """
+    Niveles e insignias de los BACKFILL_CHUNK_SIZE usuarios siguientes a
+    `after_id` en la base de `db` (la principal o un shard). Es idempotente:
+    repetir un lote no otorga nada dos veces.
+    """
+    query = (
+        select(_users.c.id, func.coalesce(_users.c.points, 0), func.coalesce(_users.c.level_id, 0))
+        .order_by(_users.c.id)
+        .limit(BACKFILL_CHUNK_SIZE)
+    )
+    if after_id is not None:
+        query = query.where(_users.c.id > after_id)
+    rows = (await db.execute(query)).all()
+    chunk = ChunkResult()
+    if not rows:
+        return chunk
+
+    changed_ids, changed_old, changed_new = levels.changes(rows)
+    if len(changed_ids):
+        await db.execute(
+            _level_update,
+            [{"user_id": int(u), "new_level_id": int(n)} for u, n in zip(changed_ids, changed_new)],
+        )
+        chunk.levels_changed = len(changed_ids)
+        up = levels.is_level_up(changed_old, changed_new)
+        for user_id, new_level_id in zip(changed_ids[up].tolist(), changed_new[up].tolist()):
+            chunk.messages[user_id].append(f"🚀 ¡Subiste de nivel! Ahora eres **{levels.names.get(new_level_id, new_level_id)}**.")
+
+    now = datetime.now()
+    bounds = {"low": after_id if after_id is not None else -1, "high": rows[-1][0]}
+    for counter, threshold, badge in badge_rules.rules():
+        awarded = (await db.execute(_award_statement(counter, threshold, badge, now), bounds)).scalars().all()
+        chunk.badges_awarded += len(awarded)
+        for user_id in awarded:
+            chunk.messages[user_id].append(f"🏅 ¡Nueva insignia: '{badge['name']}'!")
+
+    chunk.scanned = len(rows)
+    chunk.last_user_id = rows[-1][0]
+    return chunk
+
+
+def _advance(run: BackfillRun, chunk: ChunkResult, shard_count: int) -> None:
+    """Checkpoint: avanza el cursor, pasa al shard siguiente o da el backfill por terminado."""
+    if chunk.scanned:
+        run.last_user_id = chunk.last_user_id
+        run.scanned += chunk.scanned
+        run.levels_changed += chunk.levels_changed
+        run.badges_awarded += chunk.badges_awarded
+    elif run.shard_index + 1 < shard_count:
+        run.shard_index += 1
+        run.last_user_id = None
+    else:
+        run.status = BACKFILL_COMPLETED
+        run.finished_at = datetime.now()
+
+
+async def _process_chunk(db: AsyncSession, run_id: int, levels: LevelTable,
+                         notified: int) -> tuple[BackfillRun | None, dict[int, list[str]]]:
+    """
+    Un lote del backfill dentro del escritor: niveles, insignias y checkpoint en
+    la misma transacción. `notified` son los avisos entregados del lote anterior.
+    Retorna el backfill y los avisos por usuario de este lote.
+    """
+    run = await db.get(BackfillRun, run_id)
+    if run is None or run.status != BACKFILL_RUNNING:
+        return run, {}
+    run.notified += notified
+    chunk = await _apply_chunk(db, run.last_user_id, levels)
+    _advance(run, chunk, 1)
+    return run, chunk.messages
+
+
+async def _process_shard_chunk(run_id: int, levels: LevelTable,
+                               notified: int) -> tuple[BackfillRun | None, dict[int, list[str]]]:
+    """
+    Un lote del backfill con shards: los usuarios viven en los shards y el
+    checkpoint en el compartido, así que el lote se aplica en el escritor del
+    shard en curso (`shard_index`) y el checkpoint se guarda después en el
+    escritor compartido. Si el proceso muere entre ambos, el lote se repite al
+    reanudar sin otorgar nada dos veces (sus avisos se pierden).
+    """
+    async with get_db() as session:
+        run = await session.get(BackfillRun, run_id)
+    if run is None or run.status != BACKFILL_RUNNING:
+        return run, {}
+    shards = shard_names()
+    chunk = await submit_write(
+        lambda db: _apply_chunk(db, run.last_user_id, levels), shard=shards[run.shard_index]
+    )
+
+    async def checkpoint(db: AsyncSession) -> BackfillRun | None:
+        current = await db.get(BackfillRun, run_id)
+        if current is None or current.status != BACKFILL_RUNNING:
+            return current
+        current.notified += notified
+        _advance(current, chunk, len(shards))
+        return current
+
+    return await submit_write(checkpoint), chunk.messages
+
+
+async def run_backfill(bot: Bot, run_id: int):
+    """
+    Ejecuta el backfill desde su checkpoint hasta el final de la tabla users y
+    avisa a cada usuario premiado con un único mensaje por lote. Edita el mensaje
+    de estado con el progreso cada pocos segundos.
+    """
+    lease_id = _lease_id(run_id)
+    while not await acquire_lease(lease_id, BACKFILL_LEASE_TTL):
+        # Otro proceso lo ejecuta, o el lease de un proceso caído aún no ha caducado
+        async with get_db() as session:
+            status = await session.scalar(select(BackfillRun.status).filter_by(id=run_id))
+        if status != BACKFILL_RUNNING:
+            return
+        logger.info(f"Backfill #{run_id}: lease en manos de otro proceso; reintento en {BACKFILL_LEASE_RETRY_SECONDS}s.")
+        await asyncio.sleep(BACKFILL_LEASE_RETRY_SECONDS)
+
+    sender = PacedSender(bot)
+    last_status_edit = 0.0
+    notified = 0
+    try:
+        async with get_db() as session:
+            levels = LevelTable(await LevelService(session).get_all_levels())
+        while True:
+            if sharding_enabled():
+                run, messages = await _process_shard_chunk(run_id, levels, notified)
+            else:
+                run, messages = await submit_write(lambda db: _process_chunk(db, run_id, levels, notified))
+            if run is None:
+                return
+            if run.status != BACKFILL_RUNNING:
+                if run.status == BACKFILL_COMPLETED:
+                    logger.info(
+                        f"Backfill #{run_id} terminado: {run.scanned} usuarios, {run.badges_awarded} insignias, "
+                        f"{run.levels_changed} niveles, {run.notified} avisos."
+                    )
+                await _edit_status(bot, run)
+                return
+
+            outcomes = await asyncio.gather(*(
+                sender.send_message(user_id, "\n".join(lines), parse_mode="Markdown")
+                for user_id, lines in messages.items()
+            ))
+            notified = outcomes.count(SEND_OK)
+
+            if not await renew_lease(lease_id, BACKFILL_LEASE_TTL):
+                logger.warning(f"Backfill #{run_id}: se perdió el lease; se detiene en este proceso.")
+                return
+            if time.monotonic() - last_status_edit >= BACKFILL_STATUS_INTERVAL_SECONDS:
+                last_status_edit = time.monotonic()
+                await _edit_status(bot, run)
+    except Exception as e:
+        logger.error(f"Error en el backfill retroactivo #{run_id}: {e}", exc_info=True)
+    finally:
+        await release_lease(lease_id)
@@ -0,0 +1,206 @@
+# services/backup_service.py
+"""
+Copias de seguridad en caliente de la base SQLite.
+
+Copiar `database.db` con el bot en marcha puede dar un archivo inconsistente
+(el WAL aún no volcado, páginas a medio escribir), y bloquear la base para
+copiarla detendría a los handlers. El job `backup_database` usa la API de copia
+en línea de SQLite (`sqlite3.Connection.backup`) en pasos de
+BACKUP_PAGES_PER_STEP páginas con una pausa de BACKUP_STEP_SLEEP_SECONDS entre
+pasos, en un hilo aparte: cada paso suelta el GIL y la pausa deja la E/S libre
+para los escritores.
+
+Antes de copiar, la conexión de origen abre una transacción de lectura y la
+mantiene hasta el final. Con WAL los lectores no bloquean a los escritores, así
+que los handlers siguen confirmando mientras tanto, y la copia es una foto fija
+del momento en que empezó. Sin esa transacción, cada commit de otra conexión
+entre dos pasos reinicia la copia desde la primera página y, con el bot
+escribiendo sin parar, no terminaría nunca. El coste es que el checkpoint no
+puede pasar de esa foto mientras dura la copia: el WAL crece un poco y se
+recupera en el siguiente checkpoint.
+
+Cada copia se escribe en una carpeta temporal, pasa `PRAGMA integrity_check` y
+solo entonces se renombra a `BACKUP_DIR/AAAAMMDD-HHMMSS/`. Las copias quedan en
+modo journal DELETE, en un solo archivo cada una. Se conservan las BACKUP_KEEP
+más recientes. Con shards (database/shards.py) la carpeta incluye un archivo
+por shard, copiados uno tras otro (cada uno es consistente, no todos en el
+mismo instante). Los archivos de compras (services/archive_service.py) no se
+copian: no cambian después de escritos.
+
+Uso manual: `python -m services.backup_service [--list]`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config.settings import settings
+from database.shards import shard_names, shard_url, sharding_enabled
+from utils.logger import logger
+
+# Páginas por paso de la copia (1 MB con páginas de 4 KB) y pausa entre pasos
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP_SECONDS = 0.01
+# Prioridad (nice) del hilo de la copia: integrity_check es CPU pura y, con pocos
+# núcleos, competiría con el bucle de eventos por el procesador
+BACKUP_THREAD_NICE = 19
+BACKUP_DIR_FORMAT = "%Y%m%d-%H%M%S"
+_TMP_SUFFIX = ".tmp"
+
+
+def _database_files() -> dict[str, str]:
+    """Archivos a copiar: nombre de la copia -> ruta de la base (la principal y cada shard)."""
+    from sqlalchemy import make_url
+    from database.db import engine
+
+    files = {"database.sqlite": engine.url.database}
+    if sharding_enabled():
+        files.update({f"{shard}.sqlite": make_url(shard_url(shard)).database for shard in shard_names()})
+    return files
+
+
+def backup_file(source_path: str, target_path: str, pages: int = BACKUP_PAGES_PER_STEP,
+                sleep_seconds: float = BACKUP_STEP_SLEEP_SECONDS) -> dict:
+    """
+    Copia `source_path` en `target_path` con la API de copia en línea, por pasos
+    de `pages` páginas (-1: todo en un paso), y verifica la copia con
+    `PRAGMA integrity_check`. Bloqueante: se llama desde un hilo.
+    Retorna páginas, pasos, segundos y tamaño de la copia.
+    """
+    started = time.perf_counter()
+    steps = 0
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal steps
+        steps += 1
+        if remaining and sleep_seconds:
+            time.sleep(sleep_seconds)
+
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(target_path, isolation_level=None)
+    try:
+        # Transacción de lectura fija: la copia no se reinicia con los commits de otras conexiones
+        source.execute("BEGIN")
+        source.execute("SELECT count(*) FROM sqlite_master").fetchall()
+        source.backup(target, pages=pages, progress=progress)
+        source.execute("COMMIT")
+        target.execute("PRAGMA journal_mode=DELETE")
+        total_pages = target.execute("PRAGMA page_count").fetchone()[0]
+        problems = [row[0] for row in target.execute("PRAGMA integrity_check")]
+    finally:
+        target.close()
+        source.close()
+    if problems != ["ok"]:
+        raise RuntimeError(f"La copia de {source_path} no pasó integrity_check: {problems[:5]}")
+    return {
+        "pages": total_pages,
+        "steps": steps,
+        "seconds": round(time.perf_counter() - started, 3),
+        "bytes": os.path.getsize(target_path),
+    }
+
+
+def list_backups(backup_dir: str | None = None) -> list[str]:
+    """Carpetas de copia terminadas, de la más antigua a la más reciente."""
+    backup_dir = backup_dir or settings.BACKUP_DIR
+    if not os.path.isdir(backup_dir):
+        return []
+    names = []
+    for name in os.listdir(backup_dir):
+        try:
+            datetime.strptime(name, BACKUP_DIR_FORMAT)
+        except ValueError:
+            continue
+        names.append(name)
+    return sorted(names)
+
+
+def rotate_backups(backup_dir: str | None = None, keep: int | None = None) -> list[str]:
+    """
+    Elimina las copias más antiguas (deja las `keep` más recientes) y las carpetas
+    temporales de copias interrumpidas. Retorna las carpetas eliminadas.
+    """
+    backup_dir = backup_dir or settings.BACKUP_DIR
+    keep = settings.BACKUP_KEEP if keep is None else keep
+    backups = list_backups(backup_dir)
+    removed = backups[:max(len(backups) - keep, 0)]
+    if os.path.isdir(backup_dir):
+        removed += [name for name in os.listdir(backup_dir) if name.endswith(_TMP_SUFFIX)]
+    for name in removed:
+        shutil.rmtree(os.path.join(backup_dir, name), ignore_errors=True)
+    return removed
+
+
+def _lower_thread_priority() -> None:
+    # En Linux la prioridad es por hilo; en otros sistemas afectaría a todo el proceso
+    if hasattr(os, "setpriority") and hasattr(threading, "get_native_id") and os.uname().sysname == "Linux":
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), BACKUP_THREAD_NICE)
+        except OSError:
+            pass
+
+
+def _run_backup(now: datetime, pages: int, sleep_seconds: float) -> dict:
+    _lower_thread_priority()
+    name = now.strftime(BACKUP_DIR_FORMAT)
+    final_dir = os.path.join(settings.BACKUP_DIR, name)
+    tmp_dir = final_dir + _TMP_SUFFIX
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    started = time.perf_counter()
+    try:
+        files = {
+            target: backup_file(source, os.path.join(tmp_dir, target), pages, sleep_seconds)
+            for target, source in _database_files().items()
+        }
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    os.replace(tmp_dir, final_dir)
+    return {
+        "path": final_dir,
+        "seconds": round(time.perf_counter() - started, 3),
+        "bytes": sum(stats["bytes"] for stats in files.values()),
+        "steps": sum(stats["steps"] for stats in files.values()),
+        "files": files,
+        "removed": rotate_backups(),
+    }
+
+
+async def backup_database(now: datetime | None = None, pages: int = BACKUP_PAGES_PER_STEP,
+                          sleep_seconds: float = BACKUP_STEP_SLEEP_SECONDS) -> dict:
+    """
+    Hace una copia verificada de la base (y de cada shard) en BACKUP_DIR sin
+    bloquear a los escritores y rota las copias antiguas. Retorna el resumen.
+    """
+    # Hilo propio (no el executor por defecto): su prioridad baja no debe heredarla otro trabajo
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup") as executor:
+        summary = await asyncio.get_running_loop().run_in_executor(
+            executor, _run_backup, now or datetime.now(), pages, sleep_seconds
+        )
+    logger.info(
+        f"Copia de seguridad en {summary['path']}: {summary['bytes']} bytes en {summary['steps']} pasos, "
+        f"{summary['seconds']}s. Copias eliminadas por rotación: {len(summary['removed'])}."
+    )
+    return summary
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Copia de seguridad en caliente de la base SQLite.")
+    parser.add_argument("--list", action="store_true", help="Lista las copias conservadas en lugar de copiar")
+    args = parser.parse_args(argv)
+    if args.list:
+        for name in list_backups():
+            print(os.path.join(settings.BACKUP_DIR, name))
+    else:
+        print(json.dumps(asyncio.run(backup_database())))
+
+
+if __name__ == "__main__":
+    main()
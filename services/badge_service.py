@@ -1,11 +1,104 @@
 # services/badge_service.py
+from bisect import bisect_right
+from sqlalchemy import case, exists, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from database.models.user import User
-from database.models.badge import Badge
+from database.models.badge import Badge, INITIAL_BADGES
+from database.shards import user_shard
+from database.writer import submit_write, load_for_write, refresh_from
+from utils.constants import BADGE_RULES
 from utils.logger import logger
 import json
 
+class BadgeRules:
+    """
+    Reglas de insignias compiladas (ver BADGE_RULES en utils/constants.py).
+    Por cada contador se guardan sus umbrales ordenados y las insignias en el mismo
+    orden: un cambio del contador de `before` a `after` solo revisa las reglas de
+    ese contador, y las que cruza se ubican con `bisect` en O(log reglas). Los
+    datos de cada insignia salen del catálogo en memoria (INITIAL_BADGES), sin
+    consultar la tabla badges.
+    """
+
+    def __init__(self, rules: list[dict], badges: list[dict]):
+        self._catalog = {
+            badge["id"]: {"id": badge["id"], "name": badge["name"], "description": badge["description"], "image_url": badge.get("image_url")}
+            for badge in badges
+        }
+        by_counter: dict[str, list[tuple[int, int]]] = {}
+        for rule in rules:
+            by_counter.setdefault(rule["counter"], []).append((rule["threshold"], rule["badge_id"]))
+        self._thresholds: dict[str, list[int]] = {}
+        self._badge_ids: dict[str, list[int]] = {}
+        for counter, entries in by_counter.items():
+            entries.sort()
+            self._thresholds[counter] = [threshold for threshold, _ in entries]
+            self._badge_ids[counter] = [badge_id for _, badge_id in entries]
+
+    def badge(self, badge_id: int) -> dict | None:
+        """Datos de la insignia tal como se guardan en `badges_json`."""
+        return self._catalog.get(badge_id)
+
+    def rules(self) -> list[tuple[str, int, dict]]:
+        """Todas las reglas como (contador, umbral, insignia), p. ej. para evaluarlas en bloque."""
+        return [
+            (counter, threshold, self._catalog[badge_id])
+            for counter, thresholds in self._thresholds.items()
+            for threshold, badge_id in zip(thresholds, self._badge_ids[counter])
+            if badge_id in self._catalog
+        ]
+
+    def reached(self, counter: str, before: int, after: int) -> list[int]:
+        """IDs de las insignias cuyo umbral está en (before, after]."""
+        thresholds = self._thresholds.get(counter)
+        if not thresholds or after <= before:
+            return []
+        return self._badge_ids[counter][bisect_right(thresholds, before):bisect_right(thresholds, after)]
+
+    def award(self, user: User, counter: str, before: int, after: int) -> list[dict]:
+        """
+        Añade a `user.badges_json` las insignias que el cambio del contador
+        desbloquea y que el usuario aún no tiene (sin commit). Retorna las nuevas.
+        Solo decodifica el JSON cuando se cruza algún umbral.
+        """
+        badge_ids = self.reached(counter, before, after)
+        if not badge_ids:
+            return []
+        current = json.loads(user.badges_json or "[]")
+        owned = {badge["id"] for badge in current}
+        new_badges = [self._catalog[badge_id] for badge_id in badge_ids if badge_id not in owned and badge_id in self._catalog]
+        if new_badges:
+            user.badges_json = json.dumps(current + new_badges)
+            logger.info(f"Insignias {[badge['name'] for badge in new_badges]} otorgadas a usuario {user.id} ({counter}={after}).")
+        return new_badges
+
+    def initial_badges_json(self) -> str:
+        """Insignias con las que empieza un usuario nuevo (reglas de antigüedad con umbral 0)."""
+        return json.dumps([self._catalog[badge_id] for badge_id in self.reached("tenure_days", -1, 0)])
+
+
+badge_rules = BadgeRules(BADGE_RULES, INITIAL_BADGES)
+
+
+def award_statement(badge: dict, *conditions):
+    """
+    UPDATE en bloque: añade `badge` al final de `badges_json` de los usuarios que
+    cumplen `conditions` y aún no la tienen (json_each), y devuelve sus ids. Un
+    `badges_json` corrupto se trata como vacío para la comprobación y no se toca.
+    """
+    users = User.__table__
+    current = func.coalesce(users.c.badges_json, "[]")
+    held = func.json_each(case((func.json_valid(current), current), else_="[]")).table_valued("value")
+    already_held = exists().select_from(held).where(func.json_extract(held.c.value, "$.id") == badge["id"])
+    return (
+        update(users)
+        .where(*conditions, func.json_valid(current), ~already_held)
+        .values(badges_json=func.json_insert(current, "$[#]", func.json(json.dumps(badge))))
+        .returning(users.c.id)
+    )
+
+
 class BadgeService:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -15,50 +108,55 @@ class BadgeService:
         result = await self.session.execute(select(Badge).filter_by(id=badge_id))
         return result.scalars().first()
 
+    @staticmethod
+    async def _apply_counter(db: AsyncSession, user: User, counter: str, delta: int) -> tuple[User, list[dict]]:
+        """Suma `delta` al contador sobre la fila del escritor y aplica sus reglas (sin commit)."""
+        db_user = await load_for_write(db, user)
+        before = getattr(db_user, counter) or 0
+        setattr(db_user, counter, before + delta)
+        return db_user, badge_rules.award(db_user, counter, before, before + delta)
+
+    async def increment_counter(self, user: User, counter: str, delta: int = 1) -> list[dict]:
+        """
+        Incrementa un contador de insignias del usuario y otorga las que desbloquea,
+        en una sola escritura del escritor único. Retorna las insignias nuevas.
+        """
+        db_user, new_badges = await submit_write(
+            lambda db: self._apply_counter(db, user, counter, delta), shard=user_shard(user.id)
+        )
+        refresh_from(user, db_user)
+        return new_badges
+
     async def award_badge(self, user: User, badge_id: int, badge_name: str = None) -> bool:
         """
-        Otorga una insignia a un usuario si aún no la tiene.
+        Otorga una insignia a un usuario si aún no la tiene (p. ej. manualmente).
+        Los datos de la insignia salen del catálogo en memoria.
         :param user: Objeto User al que se le otorgará la insignia.
         :param badge_id: El ID único de la insignia a otorgar.
         :param badge_name: El nombre visible de la insignia (opcional, para logging).
         :return: True si la insignia fue otorgada, False si ya la tenía.
         """
         try:
-            # Cargar insignias actuales del usuario
             current_badges = json.loads(user.badges_json if user.badges_json else "[]")
-            
-            # Verificar si ya tiene la insignia
             if any(badge['id'] == badge_id for badge in current_badges):
                 logger.debug(f"Usuario {user.id} ya tiene la insignia con ID '{badge_id}'.")
                 return False
 
-            # Obtener información completa de la insignia
-            badge = await self.get_badge_by_id(badge_id)
+            badge = badge_rules.badge(badge_id)
             if not badge:
                 logger.error(f"Insignia con ID {badge_id} no encontrada.")
                 return False
 
-            # Añadir la nueva insignia
-            new_badge = {
-                "id": badge.id,
-                "name": badge.name,
-                "description": badge.description,
-                "image_url": badge.image_url
-            }
-            current_badges.append(new_badge)
-            
-            # Actualizar el usuario
-            user.badges_json = json.dumps(current_badges)
+            user.badges_json = json.dumps(current_badges + [badge])
             await self.session.commit()
-            await self.session.refresh(user)
-            
-            logger.info(f"Insignia '{badge.name}' otorgada a usuario {user.id}.")
+
+            logger.info(f"Insignia '{badge['name']}' otorgada a usuario {user.id}.")
             return True
-            
+
         except Exception as e:
             logger.error(f"Error al otorgar insignia {badge_id} a usuario {user.id}: {e}", exc_info=True)
             return False
-    
+
     async def get_user_badges(self, user: User) -> list[dict]:
         """
         Obtiene una lista de insignias que el usuario ha desbloqueado.
@@ -75,4 +173,4 @@ class BadgeService:
         Obtiene todas las insignias disponibles en el sistema.
         """
         result = await self.session.execute(select(Badge))
-        return result.scalars().all()
\ No newline at end of file
+        return result.scalars().all()
@@ -0,0 +1,194 @@
+# services/broadcast_service.py
+"""
+Campañas de difusión a todos los usuarios.
+
+Una campaña se guarda en `campaigns` y se recorre la tabla users por cursor
+(id > last_user_id) en lotes. Tras cada lote se guarda el checkpoint y los
+contadores, así que si el proceso muere la campaña continúa al arrancar
+desde el último lote confirmado (los usuarios de un lote interrumpido pueden
+recibir el mensaje dos veces; nunca se salta a nadie). Un lease por campaña
+(scheduler/lease.py) evita que dos procesos la envíen a la vez.
+"""
+import asyncio
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import get_db
+from database.models.campaign import Campaign, CAMPAIGN_RUNNING, CAMPAIGN_COMPLETED, CAMPAIGN_CANCELLED
+from database.models.user import User
+from scheduler.lease import acquire_lease, renew_lease, release_lease
+from services.stats_service import StatsService, USERS_TOTAL
+from utils.logger import logger
+from utils.pacing import PacedSender, SEND_OK, SEND_BLOCKED
+
+BROADCAST_CHUNK_SIZE = 500
+BROADCAST_STATUS_INTERVAL_SECONDS = 5.0
+BROADCAST_LEASE_TTL = timedelta(minutes=2)
+# Si otro proceso tiene el lease (o uno caído que aún no caducó), se reintenta cada tanto
+BROADCAST_LEASE_RETRY_SECONDS = 30
+
+# Campañas que este proceso está enviando: id -> tarea
+_running: dict[int, asyncio.Task] = {}
+
+
+def _lease_id(campaign_id: int) -> str:
+    return f"campaign:{campaign_id}"
+
+
+def format_campaign_status(campaign: Campaign, rate_per_second: float | None = None) -> str:
+    processed = campaign.sent + campaign.failed + campaign.blocked
+    total = max(campaign.total_users, processed)
+    percent = processed * 100 // total if total else 100
+    status_titles = {
+        CAMPAIGN_RUNNING: "📣 **Difusión en curso**",
+        CAMPAIGN_COMPLETED: "✅ **Difusión terminada**",
+        CAMPAIGN_CANCELLED: "⛔ **Difusión cancelada**",
+    }
+    lines = [
+        f"{status_titles.get(campaign.status, campaign.status)} (campaña #{campaign.id})\n",
+        f"📊 **Progreso:** {processed}/{total} ({percent}%)",
+        f"✅ **Enviados:** {campaign.sent}",
+        f"⚠️ **Fallidos:** {campaign.failed}",
+        f"🚫 **Bloqueados:** {campaign.blocked}",
+    ]
+    if campaign.status == CAMPAIGN_RUNNING and rate_per_second:
+        remaining_seconds = int(max(total - processed, 0) / rate_per_second)
+        lines.append(f"⏱️ **ETA:** {timedelta(seconds=remaining_seconds)} ({rate_per_second:.1f} msg/s)")
+    return "\n".join(lines)
+
+
+class BroadcastService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_campaign(self, text: str, created_by: int, status_chat_id: int, status_message_id: int) -> Campaign:
+        """Crea la campaña; el total de usuarios sale del contador en memoria (O(1))."""
+        counters = await StatsService(self.session).get_counters()
+        campaign = Campaign(
+            text=text,
+            created_by=created_by,
+            status_chat_id=status_chat_id,
+            status_message_id=status_message_id,
+            total_users=counters[USERS_TOTAL],
+        )
+        self.session.add(campaign)
+        await self.session.commit()
+        await self.session.refresh(campaign)
+        logger.info(f"Campaña de difusión #{campaign.id} creada por {created_by} para {campaign.total_users} usuarios.")
+        return campaign
+
+    async def cancel_campaign(self, campaign_id: int) -> bool:
+        """Marca la campaña como cancelada; el envío se detiene al terminar el lote en curso."""
+        campaign = await self.session.get(Campaign, campaign_id)
+        if not campaign or campaign.status != CAMPAIGN_RUNNING:
+            return False
+        campaign.status = CAMPAIGN_CANCELLED
+        campaign.finished_at = datetime.now()
+        await self.session.commit()
+        return True
+
+
+def start_campaign(bot: Bot, campaign_id: int):
+    """Lanza el envío de la campaña en segundo plano (si no está ya en marcha en este proceso)."""
+    if campaign_id in _running:
+        return
+    task = asyncio.create_task(run_campaign(bot, campaign_id))
+    _running[campaign_id] = task
+    task.add_done_callback(lambda _: _running.pop(campaign_id, None))
+
+
+async def resume_campaigns(bot: Bot):
+    """Reanuda las campañas que quedaron en curso (p. ej. tras un reinicio)."""
+    async with get_db() as session:
+        result = await session.execute(select(Campaign.id).filter(Campaign.status == CAMPAIGN_RUNNING))
+        campaign_ids = result.scalars().all()
+    for campaign_id in campaign_ids:
+        logger.info(f"Reanudando campaña de difusión #{campaign_id}.")
+        start_campaign(bot, campaign_id)
+
+
+async def _edit_status(bot: Bot, campaign: Campaign, rate_per_second: float | None = None):
+    if not campaign.status_message_id:
+        return
+    with suppress(TelegramBadRequest):  # "message is not modified" o mensaje borrado
+        await bot.edit_message_text(
+            format_campaign_status(campaign, rate_per_second),
+            chat_id=campaign.status_chat_id,
+            message_id=campaign.status_message_id,
+            parse_mode="Markdown",
+        )
+
+
+async def run_campaign(bot: Bot, campaign_id: int):
+    """
+    Envía la campaña desde su checkpoint hasta el final de la tabla users, con
+    concurrencia acotada bajo el limitador global de la Bot API. Guarda el cursor
+    y los contadores tras cada lote y edita el mensaje de estado con el progreso y la ETA.
+    """
+    lease_id = _lease_id(campaign_id)
+    while not await acquire_lease(lease_id, BROADCAST_LEASE_TTL):
+        # Otro proceso la envía, o el lease de un proceso caído aún no ha caducado
+        async with get_db() as session:
+            status = await session.scalar(select(Campaign.status).filter_by(id=campaign_id))
+        if status != CAMPAIGN_RUNNING:
+            return
+        logger.info(f"Campaña #{campaign_id}: lease en manos de otro proceso; reintento en {BROADCAST_LEASE_RETRY_SECONDS}s.")
+        await asyncio.sleep(BROADCAST_LEASE_RETRY_SECONDS)
+
+    sender = PacedSender(bot)
+    started = time.monotonic()
+    processed_this_run = 0
+    last_status_edit = 0.0
+    try:
+        while True:
+            async with get_db() as session:
+                campaign = await session.get(Campaign, campaign_id)
+                if campaign is None or campaign.status != CAMPAIGN_RUNNING:
+                    if campaign is not None:
+                        await _edit_status(bot, campaign)
+                    return
+                query = select(User.id).order_by(User.id).limit(BROADCAST_CHUNK_SIZE)
+                if campaign.last_user_id is not None:
+                    query = query.filter(User.id > campaign.last_user_id)
+                # Con shards llega un lote de cada uno: se toman los ids menores
+                user_ids = sorted((await session.execute(query)).scalars().all())[:BROADCAST_CHUNK_SIZE]
+                await session.commit()  # Cierra la lectura antes de los envíos
+
+                if not user_ids:
+                    campaign.status = CAMPAIGN_COMPLETED
+                    campaign.finished_at = datetime.now()
+                    await session.commit()
+                    logger.info(
+                        f"Campaña #{campaign_id} terminada: {campaign.sent} enviados, "
+                        f"{campaign.failed} fallidos, {campaign.blocked} bloqueados."
+                    )
+                    await _edit_status(bot, campaign)
+                    return
+
+                outcomes = await asyncio.gather(*(sender.send_message(user_id, campaign.text) for user_id in user_ids))
+
+                # Checkpoint del lote: cursor y contadores en una sola transacción
+                campaign.last_user_id = user_ids[-1]
+                campaign.sent += outcomes.count(SEND_OK)
+                campaign.blocked += outcomes.count(SEND_BLOCKED)
+                campaign.failed += len(outcomes) - outcomes.count(SEND_OK) - outcomes.count(SEND_BLOCKED)
+                await session.commit()
+
+            processed_this_run += len(user_ids)
+            if not await renew_lease(lease_id, BROADCAST_LEASE_TTL):
+                logger.warning(f"Campaña #{campaign_id}: se perdió el lease; se detiene el envío en este proceso.")
+                return
+            if time.monotonic() - last_status_edit >= BROADCAST_STATUS_INTERVAL_SECONDS:
+                last_status_edit = time.monotonic()
+                rate = processed_this_run / (last_status_edit - started) if last_status_edit > started else None
+                await _edit_status(bot, campaign, rate)
+    except Exception as e:
+        logger.error(f"Error en la campaña de difusión #{campaign_id}: {e}", exc_info=True)
+    finally:
+        await release_lease(lease_id)
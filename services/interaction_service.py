@@ -3,16 +3,58 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from database.models.user import User
 from services.points_service import PointsService
 from services.user_service import UserService # Necesario para update_user_interaction_data
+from services.mission_service import MissionService, CompiledMission, get_mission_index
+from services.badge_service import BadgeService
+from database.shards import user_shard
+from database.writer import submit_write, refresh_from
+from database.models.mission import MISSION_EVENT_REACTION, MISSION_EVENT_SURVEY_VOTE, MISSION_EVENT_NARRATIVE_CHOICE
 from utils.logger import logger
 from datetime import datetime, timedelta
 import asyncio
 
+# Longitud máxima del texto de answerCallbackQuery en la Bot API
+CALLBACK_ANSWER_MAX_LENGTH = 200
+
 class InteractionService:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.points_service = PointsService(session)
         self.user_service = UserService(session) # Inicializar UserService aquí
 
+    @staticmethod
+    def _with_achievements(message: str, completed: list[CompiledMission], new_badges: list[dict]) -> str:
+        """Añade al mensaje las misiones completadas y las insignias nuevas, si caben en la respuesta del callback."""
+        lines = [f"\n🎯 ¡Misión '{mission.name}' completada! +{mission.reward_points} Pts" for mission in completed]
+        lines += [f"\n🏅 ¡Nueva insignia: '{badge['name']}'!" for badge in new_badges]
+        for line in lines:
+            if len(message) + len(line) > CALLBACK_ANSWER_MAX_LENGTH:
+                break
+            message += line
+        return message
+
+    async def _finish_interaction(self, user: User, points: int, event_type: str,
+                                  badge_counter: str | None = None) -> tuple[list[CompiledMission], list[dict]]:
+        """
+        Actualiza los datos de interacción del usuario, registra el evento en sus
+        misiones y, si se indica, suma 1 al contador de insignias `badge_counter`,
+        todo en una sola escritura del escritor único.
+        Retorna (misiones completadas, insignias nuevas).
+        """
+        missions = (await get_mission_index(self.session)).get(event_type)
+
+        async def apply(db: AsyncSession) -> tuple[User, list[CompiledMission], list[dict]]:
+            db_user = await UserService._apply_interaction_data(db, user, points)
+            completed, new_badges = [], []
+            if missions:
+                _, completed = await MissionService._apply_event(db, db_user, missions, 1)
+            if badge_counter:
+                _, new_badges = await BadgeService._apply_counter(db, db_user, badge_counter, 1)
+            return db_user, completed, new_badges
+
+        db_user, completed, new_badges = await submit_write(apply, shard=user_shard(user.id))
+        refresh_from(user, db_user)
+        return completed, new_badges
+
     async def process_reaction(self, user: User, post_id: str, points: int) -> tuple[bool, str]:
         """
         Procesa una reacción a una publicación.
@@ -52,9 +94,8 @@ class InteractionService:
             message = f"¡Puntos añadidos! Ganaste {points} puntos por tu reacción. Tus nuevos puntos son: {user.points}."
 
         # Actualizar los puntos ganados hoy y la última fecha de interacción
-        await self.user_service.update_user_interaction_data(user, points)
-
-        return True, message
+        completed, new_badges = await self._finish_interaction(user, points, MISSION_EVENT_REACTION, "reactions_count")
+        return True, self._with_achievements(message, completed, new_badges)
 
     async def process_survey_vote(self, user: User, survey_id: str, option_index: int, points: int) -> tuple[bool, str]:
         """
@@ -88,9 +129,8 @@ class InteractionService:
             await self.points_service.add_points(user, points, reason=f"Voto en encuesta {survey_id}")
             message = f"¡Puntos añadidos! Ganaste {points} puntos por tu voto. Tus nuevos puntos son: {user.points}."
         
-        await self.user_service.update_user_interaction_data(user, points)
-        
-        return True, message
+        completed, new_badges = await self._finish_interaction(user, points, MISSION_EVENT_SURVEY_VOTE)
+        return True, self._with_achievements(message, completed, new_badges)
 
     async def process_narrative_choice(self, user: User, decision_id: str, choice_value: str, points: int) -> tuple[bool, str]:
         """
@@ -122,6 +162,5 @@ class InteractionService:
             await self.points_service.add_points(user, points, reason=f"Elección narrativa {decision_id}")
             message = f"¡Puntos añadidos! Ganaste {points} puntos por tu elección. Tus nuevos puntos son: {user.points}."
         
-        await self.user_service.update_user_interaction_data(user, points)
-        
-        return True, message
\ No newline at end of file
+        completed, new_badges = await self._finish_interaction(user, points, MISSION_EVENT_NARRATIVE_CHOICE)
+        return True, self._with_achievements(message, completed, new_badges)
\ No newline at end of file
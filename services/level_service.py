@@ -1,10 +1,57 @@
 # services/level_service.py
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+import time
 
 from database.models.level import Level
+from database.models.user import User
+from database.read_pool import read_only
 from utils.logger import logger
 
+# Usuarios que se leen (y se escriben) por lote en el recálculo masivo de niveles
+LEVEL_RECOMPUTE_CHUNK_SIZE = 50_000
+
+class LevelTable:
+    """
+    Umbrales de la tabla `levels` preparados para asignar niveles en bloque con
+    `np.searchsorted` (recálculo masivo y backfill retroactivo).
+    """
+
+    def __init__(self, levels: list[Level]):
+        import numpy as np  # Solo lo necesitan los procesos masivos: no se paga al arrancar
+
+        self._np = np
+        self.thresholds = np.array([level.points_required for level in levels], dtype=np.int64)
+        self.level_ids = np.array([level.id for level in levels], dtype=np.int64)
+        self.names = {level.id: level.name for level in levels}
+        # Umbral por id de nivel, para saber si un cambio es una subida (-1: nivel desconocido)
+        self.required_by_id = np.full(int(self.level_ids.max(initial=0)) + 1, -1, dtype=np.int64)
+        self.required_by_id[self.level_ids] = self.thresholds
+
+    def changes(self, rows):
+        """
+        De las filas (id, puntos, nivel actual), las que deben cambiar de nivel:
+        arrays (ids, niveles anteriores, niveles nuevos).
+        """
+        np = self._np
+        chunk = np.array(rows, dtype=np.int64)
+        ids, points, old_levels = chunk[:, 0], chunk[:, 1], chunk[:, 2]
+        # Índice del mayor umbral <= puntos; por debajo del primero se queda en el nivel 1
+        positions = np.searchsorted(self.thresholds, points, side="right") - 1
+        new_levels = np.where(positions >= 0, self.level_ids[np.clip(positions, 0, None)], 1)
+        mask = new_levels != old_levels
+        return ids[mask], old_levels[mask], new_levels[mask]
+
+    def is_level_up(self, old_levels, new_levels):
+        """Máscara de los cambios de nivel que son subidas (un nivel desconocido cuenta como el más bajo)."""
+        np = self._np
+        known = old_levels < len(self.required_by_id)
+        old_required = np.where(known, self.required_by_id[np.where(known, old_levels, 0)], -1)
+        return self.required_by_id[new_levels] > old_required
+
+
 class LevelService:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -55,4 +102,76 @@ class LevelService:
                 points_to_next_level = level.points_required - current_points
                 break
 
-        return next_level, points_to_next_level
\ No newline at end of file
+        return next_level, points_to_next_level
+
+    @read_only
+    def get_status_levels(self, db: Session, level_id: int, points: int) -> tuple[Level, Level | None, int]:
+        """
+        Niveles que muestra /status en una sola lectura: el nivel actual (nivel 1 si
+        `level_id` no existe), el siguiente nivel y los puntos que faltan para él.
+        """
+        levels = db.execute(select(Level).order_by(Level.points_required)).scalars().all()
+        by_id = {level.id: level for level in levels}
+        current_level = by_id.get(level_id) or by_id.get(1)
+        next_level = next((level for level in levels if level.points_required > points), None)
+        return current_level, next_level, next_level.points_required - points if next_level else 0
+
+    async def recompute_all_levels(self, chunk_size: int = LEVEL_RECOMPUTE_CHUNK_SIZE, collect_level_ups: bool = False) -> dict:
+        """
+        Recalcula el nivel de todos los usuarios con la tabla `levels` actual
+        (p. ej. tras editar los umbrales). Lee (id, puntos, nivel) en lotes por id,
+        asigna niveles con `np.searchsorted` sobre los umbrales y escribe solo las
+        filas que cambian con un UPDATE en bloque (executemany), un commit por lote.
+        Retorna {"scanned", "changed", "elapsed_s", "users_per_s", "level_ups"};
+        `level_ups` es una lista de (user_id, nivel_anterior, nivel_nuevo) si
+        `collect_level_ups`, para notificar a quienes subieron.
+        """
+        table = LevelTable(await self.get_all_levels())
+
+        update_stmt = (
+            update(User.__table__)
+            .where(User.__table__.c.id == bindparam("user_id"))
+            .values(level_id=bindparam("new_level_id"))
+        )
+
+        started = time.perf_counter()
+        scanned = changed = 0
+        level_ups: list[tuple[int, int, int]] = []
+        last_id = None
+        while True:
+            query = select(User.id, func.coalesce(User.points, 0), func.coalesce(User.level_id, 0)).order_by(User.id).limit(chunk_size)
+            if last_id is not None:
+                query = query.filter(User.id > last_id)
+            # Con shards llega un lote de cada uno: se toman los `chunk_size` ids menores
+            rows = sorted((await self.session.execute(query)).all())[:chunk_size]
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+
+            changed_ids, changed_old, changed_new = table.changes(rows)
+            if len(changed_ids):
+                await self.session.execute(
+                    update_stmt,
+                    [{"user_id": int(u), "new_level_id": int(n)} for u, n in zip(changed_ids, changed_new)],
+                )
+                await self.session.commit()
+                changed += len(changed_ids)
+
+                if collect_level_ups:
+                    up = table.is_level_up(changed_old, changed_new)
+                    level_ups.extend(zip(changed_ids[up].tolist(), changed_old[up].tolist(), changed_new[up].tolist()))
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "scanned": scanned,
+            "changed": changed,
+            "elapsed_s": round(elapsed, 3),
+            "users_per_s": round(scanned / elapsed, 1) if elapsed else 0.0,
+            "level_ups": level_ups,
+        }
+        logger.info(
+            f"Recálculo de niveles: {scanned} usuarios revisados, {changed} actualizados "
+            f"en {stats['elapsed_s']}s ({stats['users_per_s']} usuarios/s)."
+        )
+        return stats
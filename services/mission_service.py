@@ -0,0 +1,234 @@
+# services/mission_service.py
+"""
+Misiones por eventos ("reacciona a 5 publicaciones esta semana", "haz 2 compras
+este mes").
+
+Las misiones activas se compilan una vez por proceso en un índice
+evento -> misiones que lo cuentan (`get_mission_index`), así que un evento solo
+toca las filas de progreso de las misiones que le interesan; un evento sin
+misiones no hace ninguna escritura. El progreso de todas esas misiones se
+actualiza con un único upsert de varias filas dentro del escritor único, que
+además agrupa en un mismo commit las escrituras de muchos usuarios.
+
+Cada fila de progreso guarda el inicio del periodo al que corresponde. El
+upsert reinicia en el momento una fila de un periodo anterior, y el job de
+reinicio borra en bloque (un DELETE por periodo) las de periodos vencidos.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, delete, select, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database.models.mission import Mission, MissionProgress, MISSION_PERIOD_WEEKLY, MISSION_PERIOD_MONTHLY
+from database.models.user import User
+from database.read_pool import read_only
+from database.shards import user_shard
+from database.writer import submit_write, load_for_write, refresh_from
+from services.points_service import PointsService
+from utils.logger import logger
+
+
+@dataclass(frozen=True)
+class CompiledMission:
+    id: int
+    name: str
+    target: int
+    period: str
+    reward_points: int
+
+
+# Filas por upsert de progreso en bloque (4 parámetros por fila, bajo el límite de SQLite)
+MISSION_BULK_ROWS = 1_000
+
+# Índice de misiones activas por evento. None hasta el primer uso (o tras invalidarlo).
+_index: dict[str, tuple[CompiledMission, ...]] | None = None
+
+
+def invalidate_mission_index():
+    """Fuerza a recompilar el índice en el siguiente evento (p. ej. tras editar misiones)."""
+    global _index
+    _index = None
+
+
+def period_start(period: str, today: date) -> date:
+    """Primer día del periodo que contiene `today` (lunes de la semana o día 1 del mes)."""
+    if period == MISSION_PERIOD_WEEKLY:
+        return today - timedelta(days=today.weekday())
+    if period == MISSION_PERIOD_MONTHLY:
+        return today.replace(day=1)
+    raise ValueError(f"Periodo de misión desconocido: {period}")
+
+
+async def get_mission_index(session: AsyncSession) -> dict[str, tuple[CompiledMission, ...]]:
+    """Índice evento -> misiones activas (se compila en la primera llamada del proceso)."""
+    global _index
+    if _index is None:
+        result = await session.execute(select(Mission).filter(Mission.active.is_(True)).order_by(Mission.id))
+        index: dict[str, list[CompiledMission]] = {}
+        for mission in result.scalars().all():
+            index.setdefault(mission.event_type, []).append(
+                CompiledMission(mission.id, mission.name, mission.target, mission.period, mission.reward_points)
+            )
+        _index = {event_type: tuple(missions) for event_type, missions in index.items()}
+        logger.info(f"Índice de misiones compilado: {sum(map(len, _index.values()))} misiones activas en {len(_index)} eventos.")
+    return _index
+
+
+class MissionService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def record_event(self, user: User, event_type: str, amount: int = 1) -> list[CompiledMission]:
+        """
+        Registra un evento del usuario en las misiones que lo cuentan y otorga los
+        puntos de las que se completan. Dentro de otra escritura del escritor (p. ej.
+        el registro de una compra) se ejecuta en línea, en la misma transacción.
+        Retorna las misiones completadas con este evento.
+        """
+        missions = (await get_mission_index(self.session)).get(event_type)
+        if not missions:
+            return []
+
+        async def apply(db: AsyncSession) -> tuple[User | None, list[CompiledMission]]:
+            return await self._apply_event(db, user, missions, amount)
+
+        db_user, completed = await submit_write(apply, shard=user_shard(user.id))
+        if db_user is not None:
+            refresh_from(user, db_user)
+        return completed
+
+    @staticmethod
+    async def _apply_event(db: AsyncSession, user: User, missions: tuple[CompiledMission, ...],
+                           amount: int) -> tuple[User | None, list[CompiledMission]]:
+        """
+        Un solo upsert de varias filas para todas las misiones del evento: suma
+        `amount` al progreso del periodo actual, o lo reinicia si la fila es de un
+        periodo anterior. Las filas que alcanzan su meta se marcan completadas con un
+        UPDATE condicional (solo cuenta la primera vez) y sus puntos se otorgan con
+        PointsService, en la misma transacción.
+        """
+        today = date.today()
+        completed = (await MissionService._upsert_progress(db, missions, [
+            {"user_id": user.id, "mission_id": mission.id,
+             "period_start": period_start(mission.period, today), "progress": amount}
+            for mission in missions
+        ])).get(user.id)
+        if not completed:
+            return None, []
+
+        db_user = await load_for_write(db, user)
+        for mission in completed:
+            db_user = await PointsService(db).add_points(db_user, mission.reward_points, reason=f"Misión '{mission.name}'")
+            logger.info(f"Usuario {user.id} completó la misión '{mission.name}' (+{mission.reward_points} puntos).")
+        return db_user, completed
+
+    @staticmethod
+    async def _upsert_progress(db: AsyncSession, missions: tuple[CompiledMission, ...],
+                               rows: list[dict]) -> dict[int, list[CompiledMission]]:
+        """
+        Upsert de varias filas de progreso (user_id, mission_id, period_start,
+        progress) y marca de las que alcanzan su meta. Retorna las misiones
+        completadas ahora, por usuario.
+        """
+        now = datetime.now()
+        by_id = {mission.id: mission for mission in missions}
+        stmt = sqlite_insert(MissionProgress).values(rows)
+        same_period = MissionProgress.period_start == stmt.excluded.period_start
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MissionProgress.user_id, MissionProgress.mission_id],
+            set_={
+                "progress": case((same_period, MissionProgress.progress + stmt.excluded.progress), else_=stmt.excluded.progress),
+                "completed_at": case((same_period, MissionProgress.completed_at), else_=None),
+                "period_start": stmt.excluded.period_start,
+            },
+        ).returning(MissionProgress.user_id, MissionProgress.mission_id, MissionProgress.progress, MissionProgress.completed_at)
+        progress_rows = (await db.execute(stmt)).all()
+
+        reached = [(user_id, mission_id) for user_id, mission_id, progress, completed_at in progress_rows
+                   if completed_at is None and progress >= by_id[mission_id].target]
+        if not reached:
+            return {}
+
+        result = await db.execute(
+            update(MissionProgress)
+            .where(tuple_(MissionProgress.user_id, MissionProgress.mission_id).in_(reached),
+                   MissionProgress.completed_at.is_(None))
+            .values(completed_at=now)
+            .returning(MissionProgress.user_id, MissionProgress.mission_id)
+        )
+        completed: dict[int, list[CompiledMission]] = {}
+        for user_id, mission_id in sorted(result.all()):
+            completed.setdefault(user_id, []).append(by_id[mission_id])
+        return completed
+
+    @staticmethod
+    async def apply_events_bulk(db: AsyncSession, event_type: str,
+                                event_days: dict[int, list[date]]) -> dict[int, list[CompiledMission]]:
+        """
+        Eventos de muchos usuarios a la vez dentro de una escritura del escritor
+        (la importación masiva de compras), con upserts de MISSION_BULK_ROWS filas:
+        cada evento cuenta en las misiones cuyo periodo actual contiene su fecha.
+        No otorga los puntos: retorna las misiones completadas por usuario para
+        que quien llama los sume con el resto de su escritura.
+        """
+        missions = (await get_mission_index(db)).get(event_type)
+        if not missions:
+            return {}
+        today = date.today()
+        rows = []
+        for mission in missions:
+            start = period_start(mission.period, today)
+            for user_id, days in event_days.items():
+                amount = sum(1 for day in days if start <= day <= today)
+                if amount:
+                    rows.append({"user_id": user_id, "mission_id": mission.id, "period_start": start, "progress": amount})
+        completed: dict[int, list[CompiledMission]] = {}
+        for offset in range(0, len(rows), MISSION_BULK_ROWS):
+            chunk_completed = await MissionService._upsert_progress(db, missions, rows[offset:offset + MISSION_BULK_ROWS])
+            for user_id, missions_done in chunk_completed.items():
+                completed.setdefault(user_id, []).extend(missions_done)
+        return completed
+
+    @read_only
+    def get_user_missions(self, db: Session, user_id: int) -> list[tuple[Mission, int, bool]]:
+        """
+        Misiones activas con el progreso del usuario en el periodo actual:
+        lista de (misión, progreso, completada).
+        """
+        today = date.today()
+        missions = db.execute(select(Mission).filter(Mission.active.is_(True)).order_by(Mission.id)).scalars().all()
+        progress = {
+            row.mission_id: row
+            for row in db.execute(select(MissionProgress).filter(MissionProgress.user_id == user_id)).scalars().all()
+        }
+        summary = []
+        for mission in missions:
+            row = progress.get(mission.id)
+            if row is None or row.period_start != period_start(mission.period, today):
+                summary.append((mission, 0, False))
+            else:
+                summary.append((mission, row.progress, row.completed_at is not None))
+        return summary
+
+    async def reset_expired_progress(self) -> int:
+        """
+        Reinicio en bloque de las misiones semanales y mensuales: un DELETE por
+        periodo de todas las filas de progreso de periodos anteriores (apoyado en
+        ix_mission_progress_mission_id_period_start). Retorna las filas eliminadas.
+        """
+        today = date.today()
+        deleted = 0
+        for period in (MISSION_PERIOD_WEEKLY, MISSION_PERIOD_MONTHLY):
+            mission_ids = select(Mission.id).filter(Mission.period == period).scalar_subquery()
+            result = await self.session.execute(
+                delete(MissionProgress).where(
+                    MissionProgress.mission_id.in_(mission_ids),
+                    MissionProgress.period_start < period_start(period, today),
+                )
+            )
+            deleted += result.rowcount
+        await self.session.commit()
+        return deleted
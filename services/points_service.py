@@ -1,13 +1,19 @@
 # services/points_service.py
+from datetime import datetime, timedelta
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models.user import User
+from database.shards import user_shard
+from database.writer import submit_write, load_for_write, refresh_from
 from services.user_service import UserService
+from services.ranking_service import RankingService
 from utils.logger import logger
 
 class PointsService:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.user_service = UserService(session)
+        self.ranking_service = RankingService(session)
 
     async def add_points(self, user: User, points_to_add: int, reason: str = "Desconocida") -> User:
         """
@@ -17,9 +23,39 @@ class PointsService:
             logger.warning(f"Intento de añadir 0 o menos puntos a usuario {user.id}. Razón: {reason}")
             return user
         
-        updated_user = await self.user_service.update_user_points(user, points_to_add)
-        logger.info(f"Añadidos {points_to_add} puntos a usuario {user.id} por '{reason}'. Nuevos puntos: {updated_user.points}")
-        return updated_user
+        async def apply(db: AsyncSession) -> User:
+            # Bucket diario para los rankings semanal/mensual (se confirma con los puntos)
+            await RankingService(db).record_points(user.id, points_to_add)
+            return await UserService._apply_points(db, user, points_to_add)
+
+        refresh_from(user, await submit_write(apply, shard=user_shard(user.id)))
+        logger.info(f"Añadidos {points_to_add} puntos a usuario {user.id} por '{reason}'. Nuevos puntos: {user.points}")
+        return user
+
+    async def claim_daily_points(self, user: User, points: int,
+                                 interval: timedelta = timedelta(hours=24)) -> Optional[timedelta]:
+        """
+        Otorga los puntos diarios si pasó `interval` desde el último reclamo. La
+        comprobación, los puntos y la fecha del reclamo se confirman en una sola
+        escritura sobre la fila actual, así que dos reclamos seguidos no cobran dos
+        veces. Retorna None si se otorgaron, o el tiempo desde el último reclamo.
+        """
+        async def apply(db: AsyncSession) -> tuple[Optional[User], Optional[timedelta]]:
+            db_user = await load_for_write(db, user)
+            now = datetime.now()
+            if db_user.last_daily_points_claim and now - db_user.last_daily_points_claim < interval:
+                return None, now - db_user.last_daily_points_claim
+            await RankingService(db).record_points(user.id, points)
+            db_user = await UserService._apply_points(db, db_user, points)
+            db_user.last_daily_points_claim = now
+            return db_user, None
+
+        db_user, since_last_claim = await submit_write(apply, shard=user_shard(user.id))
+        if db_user is None:
+            return since_last_claim
+        refresh_from(user, db_user)
+        logger.info(f"Añadidos {points} puntos a usuario {user.id} por 'Puntos diarios por permanencia'. Nuevos puntos: {user.points}")
+        return None
 
     async def deduct_points(self, user: User, points_to_deduct: int, reason: str = "Desconocida") -> User:
         """
@@ -0,0 +1,310 @@
+# services/purchase_import_service.py
+"""
+Importación masiva de compras desde un documento CSV o JSONL.
+
+El archivo se lee fila a fila (sin cargarlo entero), cada fila se valida y las
+válidas se procesan por lotes: una escritura del escritor único
+(database/writer.py) por lote con las compras (executemany), los puntos,
+contadores y niveles de los usuarios afectados.
+Los puntos y la bonificación de 5 compras siguen las reglas de
+`PurchaseService.register_purchase`, y en la misma escritura se aplican en
+bloque sus efectos: las insignias por número de compras (BADGE_RULES), los
+boletos de regalo de los sorteos abiertos y las misiones de compras (solo
+cuentan las compras con fecha dentro del periodo actual de cada misión).
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Awaitable, Callable, IO, Iterable, Iterator, Optional
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models.level import Level
+from database.models.mission import MISSION_EVENT_PURCHASE
+from database.models.purchase import Purchase
+from database.models.user import User
+from database.shards import user_shard
+from database.writer import submit_write
+from services.badge_service import award_statement, badge_rules
+from services.mission_service import MissionService
+from services.purchase_service import PurchaseService
+from services.raffle_service import RaffleService
+from services.ranking_service import RankingService
+from services.stats_service import StatsService, POINTS_TOTAL
+from utils.logger import logger
+
+IMPORT_CHUNK_SIZE = 1_000
+MAX_IMPORT_AMOUNT_MXN = 100_000
+MAX_DESCRIPTION_LENGTH = 255
+
+CSV_COLUMNS = ("user_id", "amount", "description", "purchase_date")
+
+
+@dataclass
+class ImportRow:
+    line: int
+    user_id: int
+    amount: float
+    description: Optional[str]
+    purchase_date: datetime
+    raw: str
+
+
+@dataclass
+class RejectedRow:
+    line: int
+    raw: str
+    reason: str
+
+
+@dataclass
+class ImportReport:
+    processed: int = 0
+    imported: int = 0
+    points_awarded: int = 0
+    bonuses: int = 0
+    badges_awarded: int = 0
+    missions_completed: int = 0
+    raffle_tickets: int = 0
+    rejected: list[RejectedRow] = field(default_factory=list)
+
+    def rejected_csv(self) -> bytes:
+        """Filas rechazadas como CSV (línea, motivo, contenido original)."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["line", "reason", "raw"])
+        for row in sorted(self.rejected, key=lambda rejected: rejected.line):
+            writer.writerow([row.line, row.reason, row.raw])
+        return buffer.getvalue().encode("utf-8")
+
+
+def _parse_record(line: int, record: dict, raw: str, now: datetime) -> ImportRow | RejectedRow:
+    """Valida un registro ya separado en campos."""
+    try:
+        user_id = int(str(record.get("user_id", "")).strip())
+    except ValueError:
+        return RejectedRow(line, raw, "user_id inválido")
+    if user_id <= 0:
+        return RejectedRow(line, raw, "user_id inválido")
+
+    try:
+        amount = float(str(record.get("amount", "")).strip())
+    except ValueError:
+        return RejectedRow(line, raw, "monto inválido")
+    if not 0 < amount <= MAX_IMPORT_AMOUNT_MXN:
+        return RejectedRow(line, raw, f"monto fuera de rango (0, {MAX_IMPORT_AMOUNT_MXN}]")
+
+    description = (record.get("description") or "").strip() or None
+    if description and len(description) > MAX_DESCRIPTION_LENGTH:
+        return RejectedRow(line, raw, f"descripción de más de {MAX_DESCRIPTION_LENGTH} caracteres")
+
+    purchase_date = now
+    raw_date = (record.get("purchase_date") or "").strip()
+    if raw_date:
+        try:
+            purchase_date = datetime.fromisoformat(raw_date)
+        except ValueError:
+            return RejectedRow(line, raw, "fecha inválida (usar ISO 8601)")
+        if purchase_date > now:
+            return RejectedRow(line, raw, "fecha en el futuro")
+
+    return ImportRow(line, user_id, amount, description, purchase_date, raw)
+
+
+def iter_csv_rows(stream: IO[str]) -> Iterator[ImportRow | RejectedRow]:
+    """
+    Lee un CSV con encabezado (user_id, amount, y opcionalmente description,
+    purchase_date) fila a fila.
+    """
+    now = datetime.now()
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [column.strip().lower() for column in header]
+    if "user_id" not in columns or "amount" not in columns:
+        yield RejectedRow(1, ",".join(header), f"encabezado inválido: se esperan las columnas {', '.join(CSV_COLUMNS)}")
+        return
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        raw = ",".join(values)
+        if len(values) != len(columns):
+            yield RejectedRow(reader.line_num, raw, f"se esperaban {len(columns)} columnas")
+            continue
+        yield _parse_record(reader.line_num, dict(zip(columns, values)), raw, now)
+
+
+def iter_jsonl_rows(stream: IO[str]) -> Iterator[ImportRow | RejectedRow]:
+    """Lee un JSONL (un objeto por línea con las mismas claves que el CSV) línea a línea."""
+    now = datetime.now()
+    for line_number, line in enumerate(stream, 1):
+        raw = line.strip()
+        if not raw:
+            continue
+        try:
+            record = json.loads(raw)
+        except json.JSONDecodeError:
+            yield RejectedRow(line_number, raw, "JSON inválido")
+            continue
+        if not isinstance(record, dict):
+            yield RejectedRow(line_number, raw, "se esperaba un objeto JSON")
+            continue
+        yield _parse_record(line_number, {k: "" if v is None else str(v) for k, v in record.items()}, raw, now)
+
+
+class PurchaseImportService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.purchase_service = PurchaseService(session)
+
+    async def import_rows(
+        self,
+        rows: Iterable[ImportRow | RejectedRow],
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        on_progress: Optional[Callable[[ImportReport], Awaitable[None]]] = None,
+    ) -> ImportReport:
+        """
+        Importa las filas en lotes de `chunk_size`, una transacción por lote.
+        Las filas de usuarios inexistentes se rechazan. `on_progress` se llama
+        tras confirmar cada lote.
+        """
+        report = ImportReport()
+        chunk: list[ImportRow] = []
+        for row in rows:
+            report.processed += 1
+            if isinstance(row, RejectedRow):
+                report.rejected.append(row)
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                await self._import_chunk(chunk, report)
+                chunk = []
+                if on_progress:
+                    await on_progress(report)
+        if chunk:
+            await self._import_chunk(chunk, report)
+        if on_progress:
+            await on_progress(report)
+
+        logger.info(
+            f"Importación de compras: {report.imported} importadas, {len(report.rejected)} rechazadas, "
+            f"{report.points_awarded} puntos otorgados ({report.bonuses} bonos de 5 compras), "
+            f"{report.badges_awarded} insignias, {report.missions_completed} misiones, {report.raffle_tickets} boletos."
+        )
+        return report
+
+    async def _import_chunk(self, chunk: list[ImportRow], report: ImportReport):
+        """
+        Aplica un lote en una sola escritura del escritor único (con shards, una
+        por cada shard con usuarios del lote, en su escritor): los contadores de
+        compras se leen dentro de la escritura (la bonificación de 5 compras no se
+        basa en una lectura previa) y el nivel se calcula en el mismo UPDATE que
+        suma los puntos. El informe solo cambia con cada escritura confirmada.
+        """
+        rows_by_shard: dict[Optional[str], list[ImportRow]] = defaultdict(list)
+        for row in chunk:
+            rows_by_shard[user_shard(row.user_id)].append(row)
+        for shard, rows in rows_by_shard.items():
+            applied = await submit_write(lambda db: self._apply_rows(db, rows), shard=shard)
+            report.rejected.extend(applied.rejected)
+            for name in ("imported", "points_awarded", "bonuses", "badges_awarded", "missions_completed", "raffle_tickets"):
+                setattr(report, name, getattr(report, name) + getattr(applied, name))
+
+    async def _apply_rows(self, db: AsyncSession, chunk: list[ImportRow]) -> ImportReport:
+        """Escritura de un lote (o de su parte de un shard). Retorna sus totales como un informe parcial."""
+        applied = ImportReport()
+        user_ids = {row.user_id for row in chunk}
+        result = await db.execute(select(User.id, User.purchase_count).filter(User.id.in_(user_ids)))
+        counts_before = {user_id: purchase_count or 0 for user_id, purchase_count in result.all()}
+        purchase_counts = dict(counts_before)
+
+        purchases = []
+        points_by_user: dict[int, int] = defaultdict(int)
+        purchases_by_user: dict[int, int] = defaultdict(int)
+        purchase_days: dict[int, list[date]] = defaultdict(list)
+        for row in chunk:
+            if row.user_id not in purchase_counts:
+                applied.rejected.append(RejectedRow(row.line, row.raw, "usuario no encontrado"))
+                continue
+            # La bonificación cuenta también las compras anteriores del mismo archivo
+            points = self.purchase_service.points_for(row.amount, purchase_counts[row.user_id])
+            if self.purchase_service.purchase_bonus(purchase_counts[row.user_id]):
+                applied.bonuses += 1
+            purchase_counts[row.user_id] += 1
+            points_by_user[row.user_id] += points
+            purchases_by_user[row.user_id] += 1
+            purchase_days[row.user_id].append(row.purchase_date.date())
+            purchases.append({
+                "user_id": row.user_id,
+                "amount": row.amount,
+                "points_awarded": points,
+                "description": row.description,
+                "purchase_date": row.purchase_date,
+            })
+
+        if not purchases:
+            return applied
+
+        # Sobre la tabla (executemany de Core): el INSERT masivo del ORM no admite sesiones con shards
+        await db.execute(insert(Purchase.__table__), purchases)
+
+        # Misiones de compras: sus premios se suman a los puntos en el mismo UPDATE
+        completed = await MissionService.apply_events_bulk(db, MISSION_EVENT_PURCHASE, purchase_days)
+        mission_points = {user_id: sum(mission.reward_points for mission in missions) for user_id, missions in completed.items()}
+        applied.missions_completed = sum(map(len, completed.values()))
+
+        users_table = User.__table__
+        levels_table = Level.__table__
+        # En un UPDATE las columnas valen lo de antes de la sentencia: esto son los puntos nuevos
+        new_points = func.coalesce(users_table.c.points, 0) + bindparam("points_delta")
+        new_level_id = (
+            select(levels_table.c.id)
+            .where(levels_table.c.points_required <= new_points)
+            .order_by(levels_table.c.points_required.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        await db.execute(
+            update(users_table)
+            .where(users_table.c.id == bindparam("user_pk"))
+            .values(
+                points=new_points,
+                purchase_count=func.coalesce(users_table.c.purchase_count, 0) + bindparam("purchases_delta"),
+                purchase_points_total=func.coalesce(users_table.c.purchase_points_total, 0) + bindparam("purchase_points_delta"),
+                level_id=func.coalesce(new_level_id, 1),
+            ),
+            [
+                {
+                    "user_pk": user_id,
+                    "points_delta": points + mission_points.get(user_id, 0),
+                    "purchase_points_delta": points,
+                    "purchases_delta": purchases_by_user[user_id],
+                }
+                for user_id, points in points_by_user.items()
+            ],
+        )
+        for user_id, extra in mission_points.items():
+            points_by_user[user_id] += extra
+
+        # Insignias por número de compras: un UPDATE por insignia con los usuarios que cruzan su umbral
+        crossed: dict[int, list[int]] = defaultdict(list)
+        for user_id, before in counts_before.items():
+            for badge_id in badge_rules.reached("purchase_count", before, purchase_counts[user_id]):
+                crossed[badge_id].append(user_id)
+        for badge_id, badge_users in crossed.items():
+            badge = badge_rules.badge(badge_id)
+            if badge:
+                awarded = await db.execute(award_statement(badge, users_table.c.id.in_(badge_users)))
+                applied.badges_awarded += len(awarded.all())
+
+        applied.raffle_tickets = await RaffleService.grant_purchase_tickets_bulk(db, purchases_by_user)
+        await RankingService(db).record_points_bulk(points_by_user)
+        applied.points_awarded = sum(points_by_user.values())
+        await StatsService(db).increment(POINTS_TOTAL, applied.points_awarded)
+        applied.imported = len(purchases)
+        return applied
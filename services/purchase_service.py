@@ -1,11 +1,24 @@
 # services/purchase_service.py
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from datetime import datetime
+from database.read_pool import read_only
+from database.shards import user_shard
+from database.writer import submit_write
 from database.models.user import User
 from database.models.purchase import Purchase
 from services.user_service import UserService
 from services.points_service import PointsService
+from services.raffle_service import RaffleService
+from services.mission_service import MissionService
+from services.archive_service import archived_purchase_page
+from database.models.mission import MISSION_EVENT_PURCHASE
 from utils.logger import logger
 
+# Bonificación por fidelidad: cada quinta compra del usuario suma FIVE_PURCHASES_BONUS puntos
+FIVE_PURCHASES_BONUS = 150
+
 class PurchaseService:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -15,39 +28,89 @@ class PurchaseService:
     async def register_purchase(self, user_id: int, amount_mxn: float, description: str = None) -> tuple[User | None, int]:
         """
         Registra una compra para un usuario, asigna puntos y aplica bonificaciones.
+        La compra, los puntos, el contador de compras, los boletos de regalo de los
+        sorteos abiertos y el progreso de las misiones de compras se confirman juntos,
+        en una sola escritura del escritor único.
         Retorna el objeto User actualizado y los puntos totales otorgados.
         """
-        user = await self.user_service.get_user(user_id)
-        if not user:
+        async def apply(db: AsyncSession) -> tuple[User | None, int]:
+            user = await db.get(User, user_id)
+            if not user:
+                return None, 0
+
+            points_awarded = self.points_for(amount_mxn, user.purchase_count)
+            if self.purchase_bonus(user.purchase_count):
+                logger.info(f"Bonus de 5 compras para usuario {user.id}. +{FIVE_PURCHASES_BONUS} puntos.")
+
+            # Registra la compra en la base de datos
+            db.add(Purchase(
+                user_id=user_id,
+                amount=amount_mxn,
+                points_awarded=points_awarded,
+                description=description
+            ))
+
+            # Actualiza los puntos y el contador de compras del usuario (en línea: misma transacción)
+            user = await PointsService(db).add_points(user, points_awarded, reason=f"Compra de {amount_mxn} MXN")
+            user = await UserService(db).increment_purchases_count(user, points_awarded)
+            # Boletos de regalo en los sorteos abiertos que los dan por compra
+            await RaffleService.grant_purchase_tickets(db, user_id)
+            # Misiones de compras (sus puntos se otorgan en la misma transacción)
+            await MissionService(db).record_event(user, MISSION_EVENT_PURCHASE)
+            return user, points_awarded
+
+        updated_user, points_awarded = await submit_write(apply, shard=user_shard(user_id))
+        if not updated_user:
             logger.warning(f"Intento de registrar compra para usuario {user_id} no encontrado.")
             return None, 0
 
-        points_awarded = self._calculate_points(amount_mxn)
-        initial_points = points_awarded  # Puntos base antes de bonificaciones
-
-        # Bonificaciones por fidelidad en compras
-        # Bonus por 5 compras: +150 puntos
-        if user.purchase_count % 5 == 4:  # Si esta es la 5ta compra (0-indexed)
-            points_awarded += 150
-            logger.info(f"Bonus de 5 compras para usuario {user.id}. +150 puntos.")
+        logger.info(f"Compra de {amount_mxn} MXN registrada para usuario {user_id}. Puntos otorgados: {points_awarded}.")
+        return await self.session.merge(updated_user, load=False), points_awarded
 
-        # Registra la compra en la base de datos
-        purchase = Purchase(
-            user_id=user_id,
-            amount=amount_mxn,
-            points_awarded=points_awarded,
-            description=description
+    @read_only
+    def get_purchase_page(self, db: Session, user_id: int, before: tuple[datetime, int] | None = None, limit: int = 10) -> tuple[list[Purchase], tuple[datetime, int] | None]:
+        """
+        Obtiene una página del historial de compras, de la más reciente a la más antigua.
+        Usa paginación por cursor (keyset) sobre (purchase_date, id) apoyada en el índice
+        ix_purchases_user_id_purchase_date, así que el coste no depende del historial total.
+        Las compras archivadas (services/archive_service.py) se mezclan por el mismo
+        cursor: una compra importada con fecha antigua puede quedar en la tabla
+        aunque haya meses posteriores ya archivados. Solo se abren los meses
+        archivados que caen dentro del rango de la página.
+        :param before: Cursor (purchase_date, id) de la última compra de la página anterior.
+        :return: (compras de la página, cursor para la siguiente página o None si no hay más).
+        """
+        query = select(Purchase).filter(Purchase.user_id == user_id)
+        if before is not None:
+            query = query.filter(tuple_(Purchase.purchase_date, Purchase.id) < tuple_(*before))
+        result = db.execute(
+            query.order_by(Purchase.purchase_date.desc(), Purchase.id.desc()).limit(limit + 1)
         )
-        self.session.add(purchase)
-        await self.session.commit()
-        await self.session.refresh(purchase)
+        purchases = list(result.scalars().all())
+        # Con la página llena, solo cuentan las archivadas más recientes que la última compra traída
+        after = (purchases[-1].purchase_date, purchases[-1].id) if len(purchases) > limit else None
+        archived = archived_purchase_page(db, user_id, before, limit + 1, after)
+        if archived:
+            purchases = sorted(purchases + archived, key=lambda purchase: (purchase.purchase_date, purchase.id), reverse=True)
 
-        # Actualiza los puntos y el contador de compras del usuario
-        updated_user = await self.points_service.add_points(user, points_awarded, reason=f"Compra de {amount_mxn} MXN")
-        updated_user = await self.user_service.increment_purchases_count(updated_user)
+        if len(purchases) > limit:
+            purchases = purchases[:limit]
+            last = purchases[-1]
+            return purchases, (last.purchase_date, last.id)
+        return purchases, None
 
-        logger.info(f"Compra de {amount_mxn} MXN registrada para usuario {user_id}. Puntos otorgados: {points_awarded}.")
-        return updated_user, points_awarded
+    @staticmethod
+    def purchase_bonus(purchase_count_before: int) -> int:
+        """Bonificación por fidelidad de una compra según las compras previas del usuario."""
+        # Bonus por 5 compras: si esta es la 5ta compra (0-indexed)
+        return FIVE_PURCHASES_BONUS if (purchase_count_before or 0) % 5 == 4 else 0
+
+    def points_for(self, amount_mxn: float, purchase_count_before: int) -> int:
+        """
+        Puntos de una compra: los del monto más la bonificación por fidelidad. Es la
+        regla común del registro manual (/sumarpuntos) y de la importación masiva.
+        """
+        return self._calculate_points(amount_mxn) + self.purchase_bonus(purchase_count_before)
 
     def _calculate_points(self, amount_mxn: float) -> int:
         """
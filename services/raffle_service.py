@@ -0,0 +1,328 @@
+# services/raffle_service.py
+"""
+Sorteos con boletos comprados con puntos o regalados por compras.
+
+Los boletos se guardan como un conteo por (sorteo, usuario) en raffle_entries,
+no como un renglón por boleto, así que un sorteo con millones de boletos ocupa
+un renglón por participante. El sorteo se hace en memoria con NumPy
+(`draw_winners`): suma acumulada de los boletos y `searchsorted` para ubicar
+cada número extraído. La semilla se guarda en el sorteo, de modo que cualquiera
+puede repetirlo y obtener los mismos ganadores (`audit_draw`).
+
+Al cerrar un sorteo se escribe una marca (raffle_closures) en cada archivo que
+guarda boletos: el compartido y, con shards, cada shard, por el escritor de ese
+archivo. Los boletos se insertan con una condición sobre esa marca en el mismo
+archivo, bajo su bloqueo de escritura, así que un boleto o entra antes de la
+marca (y el sorteo lo ve) o no entra. Con shards la comprobación del estado en
+el compartido podría leer una foto anterior al cierre; la marca no.
+"""
+import secrets
+from datetime import datetime
+
+from sqlalchemy import exists, select, update, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database.read_pool import read_only
+from database.models.raffle import Raffle, RaffleClosure, RaffleEntry, RaffleWinner, RAFFLE_OPEN, RAFFLE_CLOSED, RAFFLE_DRAWN
+from database.models.user import User
+from database.shards import shard_names, user_shard
+from database.writer import submit_write, load_for_write, refresh_from
+from services.user_service import UserService
+from utils.logger import logger
+from utils.pacing import PacedSender, SEND_OK
+from aiogram import Bot
+
+# Bits de la semilla: cabe en un BIGINT con signo de SQLite
+RAFFLE_SEED_BITS = 63
+
+
+def draw_winners(user_ids, tickets, winners_count: int, seed: int) -> list[int]:
+    """
+    Extrae hasta `winners_count` ganadores distintos, cada uno con probabilidad
+    proporcional a sus boletos entre los que aún no han ganado.
+    Cada extracción es un entero uniforme en [0, boletos) ubicado con
+    `searchsorted` sobre la suma acumulada; si cae en alguien que ya ganó se
+    descarta (equivale a repartir de nuevo entre los restantes). Los números se
+    extraen por lotes y la suma acumulada se rehace tras cada lote sin los
+    ganadores, así que el coste es O(participantes) por lote y no por boleto.
+    El resultado depende solo de las entradas (en el mismo orden) y de `seed`.
+    """
+    import numpy as np  # Solo lo necesita el sorteo: no se paga al arrancar
+
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    weights = np.asarray(tickets, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    remaining = min(winners_count, int(np.count_nonzero(weights > 0)))
+    taken = np.zeros(len(weights), dtype=bool)
+    winners: list[int] = []
+    while remaining > 0:
+        cumulative = np.cumsum(np.where(taken, 0, weights))
+        # Rangos [cum[i-1], cum[i]): los ya ganadores tienen ancho 0 y no se pueden extraer
+        picks = np.searchsorted(cumulative, rng.integers(0, cumulative[-1], size=2 * remaining), side="right")
+        for index in picks:
+            if taken[index]:
+                continue
+            taken[index] = True
+            winners.append(int(user_ids[index]))
+            remaining -= 1
+            if remaining == 0:
+                break
+    return winners
+
+
+async def notify_winners(bot: Bot, raffle: Raffle, winners: list[int]) -> int:
+    """Avisa a los ganadores a ritmo controlado. Retorna cuántos avisos se entregaron."""
+    sender = PacedSender(bot)
+    sent = 0
+    for position, user_id in enumerate(winners, start=1):
+        outcome = await sender.send_message(
+            user_id,
+            f"🎉 ¡Ganaste el sorteo **{raffle.title}** (ganador #{position})! "
+            "Un administrador se pondrá en contacto contigo para entregarte el premio.",
+            parse_mode="Markdown"
+        )
+        sent += outcome == SEND_OK
+    return sent
+
+
+class RaffleService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_raffle(self, title: str, winners_count: int, closes_at: datetime, created_by: int,
+                            ticket_cost: int = 0, tickets_per_purchase: int = 0) -> Raffle:
+        raffle = Raffle(
+            title=title,
+            winners_count=winners_count,
+            closes_at=closes_at,
+            created_by=created_by,
+            ticket_cost=ticket_cost,
+            tickets_per_purchase=tickets_per_purchase,
+        )
+        self.session.add(raffle)
+        await self.session.commit()
+        await self.session.refresh(raffle)
+        logger.info(f"Sorteo #{raffle.id} '{title}' creado por {created_by}; cierra {closes_at:%Y-%m-%d %H:%M}.")
+        return raffle
+
+    async def get_open_raffles(self) -> list[Raffle]:
+        result = await self.session.execute(
+            select(Raffle).filter(Raffle.status == RAFFLE_OPEN, Raffle.closes_at > datetime.now()).order_by(Raffle.closes_at)
+        )
+        return result.scalars().all()
+
+    async def get_user_tickets(self, user_id: int, raffle_ids: list[int]) -> dict[int, int]:
+        """Boletos del usuario en cada sorteo (los sorteos sin boletos no aparecen)."""
+        if not raffle_ids:
+            return {}
+        result = await self.session.execute(
+            select(RaffleEntry.raffle_id, RaffleEntry.tickets)
+            .filter(RaffleEntry.user_id == user_id, RaffleEntry.raffle_id.in_(raffle_ids))
+        )
+        return dict(result.all())
+
+    async def get_winners(self, raffle_id: int) -> list[int]:
+        result = await self.session.execute(
+            select(RaffleWinner.user_id).filter_by(raffle_id=raffle_id).order_by(RaffleWinner.position)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    def _not_closed(raffle_id):
+        """Condición: el archivo de la sesión aún no tiene la marca de cierre del sorteo."""
+        return ~exists().where(RaffleClosure.raffle_id == raffle_id)
+
+    @staticmethod
+    async def _mark_closed(db: AsyncSession, raffle_id: int) -> None:
+        await db.execute(sqlite_insert(RaffleClosure.__table__).values(raffle_id=raffle_id).on_conflict_do_nothing())
+
+    @staticmethod
+    async def _add_tickets(db: AsyncSession, raffle_id: int, user_id: int, tickets: int) -> int | None:
+        """
+        Suma boletos a la entrada del usuario (upsert) y retorna su total, o None
+        si el sorteo ya tiene su marca de cierre (no se escribe nada).
+        """
+        row = select(literal(raffle_id), literal(user_id), literal(tickets)).where(RaffleService._not_closed(raffle_id))
+        stmt = sqlite_insert(RaffleEntry).from_select(["raffle_id", "user_id", "tickets"], row)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RaffleEntry.raffle_id, RaffleEntry.user_id],
+            set_={"tickets": RaffleEntry.tickets + stmt.excluded.tickets},
+        ).returning(RaffleEntry.tickets)
+        return (await db.execute(stmt)).scalar_one_or_none()
+
+    async def buy_tickets(self, user: User, raffle_id: int, count: int) -> tuple[bool, str]:
+        """
+        Compra `count` boletos con puntos. El descuento y los boletos se confirman
+        juntos, en una sola escritura del escritor único.
+        Retorna (True/False si la compra fue exitosa, Mensaje para el usuario).
+        """
+        if count <= 0:
+            return False, "❌ La cantidad de boletos debe ser mayor que 0."
+
+        async def apply(db: AsyncSession) -> tuple[User | None, int, str]:
+            raffle = await db.get(Raffle, raffle_id)
+            if not raffle or raffle.status != RAFFLE_OPEN or raffle.closes_at <= datetime.now():
+                return None, 0, "❌ Ese sorteo no existe o ya cerró."
+            if raffle.ticket_cost <= 0:
+                return None, 0, f"❌ Los boletos de '{raffle.title}' no se venden con puntos."
+            cost = raffle.ticket_cost * count
+            db_user = await load_for_write(db, user)
+            if db_user.points < cost:
+                return None, 0, (f"❌ No tienes suficientes puntos. {count} boleto(s) cuestan {cost} puntos "
+                                 f"y tienes {db_user.points}.")
+            total = await self._add_tickets(db, raffle_id, user.id, count)
+            if total is None:
+                return None, 0, "❌ Ese sorteo no existe o ya cerró."
+            db_user = await UserService._apply_points(db, db_user, -cost)
+            return db_user, total, raffle.title
+
+        db_user, total, detail = await submit_write(apply, shard=user_shard(user.id))
+        if db_user is None:
+            return False, detail
+        refresh_from(user, db_user)
+        logger.info(f"Usuario {user.id} compró {count} boleto(s) del sorteo #{raffle_id}; ahora tiene {total}.")
+        return True, (f"🎟️ ¡Listo! Compraste {count} boleto(s) para '{detail}'.\n"
+                      f"Ahora tienes {total} boleto(s) y te quedan {user.points} puntos.")
+
+    @staticmethod
+    async def grant_purchase_tickets(db: AsyncSession, user_id: int) -> None:
+        """
+        Regala boletos al usuario en todos los sorteos abiertos que dan boletos por
+        compra: un solo INSERT ... SELECT con upsert. Se llama dentro de la escritura
+        de la compra, así que se confirma junto con ella.
+        """
+        open_raffles = select(Raffle.id, literal(user_id), Raffle.tickets_per_purchase).filter(
+            Raffle.status == RAFFLE_OPEN, Raffle.closes_at > datetime.now(), Raffle.tickets_per_purchase > 0,
+            RaffleService._not_closed(Raffle.id),
+        )
+        stmt = sqlite_insert(RaffleEntry).from_select(["raffle_id", "user_id", "tickets"], open_raffles)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[RaffleEntry.raffle_id, RaffleEntry.user_id],
+            set_={"tickets": RaffleEntry.tickets + stmt.excluded.tickets},
+        ))
+
+    @staticmethod
+    async def grant_purchase_tickets_bulk(db: AsyncSession, purchases_by_user: dict[int, int]) -> int:
+        """
+        Como `grant_purchase_tickets` para muchos usuarios y compras a la vez (la
+        importación masiva): en cada sorteo abierto, boletos por compra × compras
+        del usuario, con un solo upsert executemany. Retorna los boletos regalados.
+        """
+        if not purchases_by_user:
+            return 0
+        result = await db.execute(select(Raffle.id, Raffle.tickets_per_purchase).filter(
+            Raffle.status == RAFFLE_OPEN, Raffle.closes_at > datetime.now(), Raffle.tickets_per_purchase > 0,
+            RaffleService._not_closed(Raffle.id),
+        ))
+        entries = [
+            {"raffle_id": raffle_id, "user_id": user_id, "tickets": tickets_per_purchase * purchases}
+            for raffle_id, tickets_per_purchase in result.all()
+            for user_id, purchases in purchases_by_user.items()
+        ]
+        if not entries:
+            return 0
+        # Sobre la tabla (executemany de Core): el INSERT masivo del ORM no admite sesiones con shards
+        stmt = sqlite_insert(RaffleEntry.__table__)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[RaffleEntry.raffle_id, RaffleEntry.user_id],
+            set_={"tickets": RaffleEntry.tickets + stmt.excluded.tickets},
+        ), entries)
+        return sum(entry["tickets"] for entry in entries)
+
+    @read_only
+    def _load_entries(self, db: Session, raffle_id: int):
+        """
+        (user_ids, boletos) del sorteo como arreglos, ordenados por user_id: el
+        orden es parte de la entrada del sorteo y debe ser estable para la auditoría.
+        """
+        import numpy as np
+
+        result = db.execute(
+            select(RaffleEntry.user_id, RaffleEntry.tickets)
+            .filter(RaffleEntry.raffle_id == raffle_id, RaffleEntry.tickets > 0)
+            .order_by(RaffleEntry.user_id)
+        )
+        rows = np.array(result.all(), dtype=np.int64).reshape(-1, 2)
+        # Con shards llega una lista ordenada de cada uno: se reordena el conjunto
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        return rows[:, 0], rows[:, 1]
+
+    async def draw_raffle(self, raffle_id: int, seed: int | None = None) -> list[int] | None:
+        """
+        Cierra el sorteo y extrae a sus ganadores. Primero se marca como cerrado
+        y se escribe la marca de cierre en cada archivo con boletos (a partir de
+        ahí ya no entran boletos), luego se leen las entradas en el
+        pool de lectura y se sortea fuera del escritor, y al final se guardan ganadores, semilla y totales.
+        Retorna los IDs de los ganadores en orden, o None si el sorteo no existe o ya se sorteó.
+        """
+        async def close(db: AsyncSession) -> bool:
+            result = await db.execute(
+                update(Raffle).where(Raffle.id == raffle_id, Raffle.status.in_([RAFFLE_OPEN, RAFFLE_CLOSED]))
+                .values(status=RAFFLE_CLOSED)
+            )
+            if result.rowcount != 1:
+                return False
+            await self._mark_closed(db, raffle_id)
+            return True
+
+        if not await submit_write(close):
+            return None
+        # Cada marca pasa por el escritor de su shard: queda ordenada con los boletos de ese archivo
+        for shard in shard_names():
+            await submit_write(lambda db: self._mark_closed(db, raffle_id), shard=shard)
+
+        raffle = await self.session.get(Raffle, raffle_id, populate_existing=True)
+        user_ids, tickets = await self._load_entries(raffle_id)
+        if seed is None:
+            seed = secrets.randbits(RAFFLE_SEED_BITS)
+        winners = draw_winners(user_ids, tickets, raffle.winners_count, seed)
+        total_tickets, participants = int(tickets.sum()), len(user_ids)
+
+        async def record(db: AsyncSession) -> bool:
+            result = await db.execute(
+                update(Raffle).where(Raffle.id == raffle_id, Raffle.status == RAFFLE_CLOSED).values(
+                    status=RAFFLE_DRAWN, seed=seed, total_tickets=total_tickets,
+                    participants=participants, drawn_at=datetime.now(),
+                )
+            )
+            if result.rowcount != 1:
+                return False  # Otro proceso lo sorteó entretanto
+            if winners:
+                # Sobre la tabla (executemany de Core): el INSERT masivo del ORM no admite sesiones con shards
+                await db.execute(sqlite_insert(RaffleWinner.__table__), [
+                    {"raffle_id": raffle_id, "position": position, "user_id": user_id}
+                    for position, user_id in enumerate(winners, start=1)
+                ])
+            return True
+
+        if not await submit_write(record):
+            return None
+        logger.info(f"Sorteo #{raffle_id} realizado: {total_tickets} boletos, {participants} participantes, "
+                    f"semilla {seed}, ganadores {winners}.")
+        return winners
+
+    async def audit_draw(self, raffle_id: int) -> tuple[list[int], list[int]] | None:
+        """
+        Repite el sorteo con la semilla guardada sobre las entradas congeladas.
+        Retorna (ganadores registrados, ganadores recalculados), o None si aún no se sorteó.
+        """
+        raffle = await self.session.get(Raffle, raffle_id)
+        if not raffle or raffle.status != RAFFLE_DRAWN:
+            return None
+        user_ids, tickets = await self._load_entries(raffle_id)
+        return await self.get_winners(raffle_id), draw_winners(user_ids, tickets, raffle.winners_count, raffle.seed)
+
+    async def draw_due_raffles(self) -> list[tuple[Raffle, list[int]]]:
+        """Sortea los sorteos abiertos (o cerrados a medias) cuya fecha de cierre ya pasó."""
+        result = await self.session.execute(
+            select(Raffle.id).filter(Raffle.status.in_([RAFFLE_OPEN, RAFFLE_CLOSED]), Raffle.closes_at <= datetime.now())
+            .order_by(Raffle.closes_at)
+        )
+        drawn = []
+        for raffle_id in result.scalars().all():
+            winners = await self.draw_raffle(raffle_id)
+            if winners is not None:
+                drawn.append((await self.session.get(Raffle, raffle_id, populate_existing=True), winners))
+        return drawn
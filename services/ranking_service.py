@@ -1,39 +1,320 @@
 # services/ranking_service.py
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, delete, func, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+import heapq
+import time
 from database.models.user import User
 from database.models.level import Level
+from database.models.daily_points import DailyPoints
+from database.read_pool import read_only
+from database.shards import sharding_enabled, shard_names, merge_top_n
 from utils.logger import logger
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+
+# Entradas del top que se mantienen por ventana (>= al límite que muestra /ranking)
+TOP_CACHE_SIZE = 50
+# Cada cuánto una ventana relee de la base los buckets de hoy: incorpora los puntos
+# confirmados por otros procesos, que no pasan por los hooks de commit de este
+RANKING_REFRESH_SECONDS = 60
+
+_PENDING_KEY = "ranking_pending"
+
+
+class _RollingWindow:
+    """
+    Totales por usuario de los últimos `days` días (hoy incluido) y su top-N.
+    Los puntos se suman al vuelo; al cambiar de día se resta el día que sale de
+    la ventana. El top se actualiza de forma incremental mientras los totales
+    solo crecen y se recalcula cuando se resta un día. La lista ordenada de los
+    totales da la posición de un usuario con `bisect`.
+
+    Del día de hoy se guarda el bucket de cada usuario (`today`) y las
+    actualizaciones llevan el valor confirmado del bucket, no solo la suma: se
+    aplican con máximo, así que aplicar dos veces la misma (por el hook de commit
+    y por una lectura de la base) no la cuenta dos veces.
+    """
+
+    def __init__(self, days: int, last_day: date, totals: Dict[int, int], today: Dict[int, int]):
+        self.days = days
+        self.last_day = last_day
+        self.totals = totals
+        self.today = today  # user_id -> bucket de `last_day`
+        self.refreshed_at = time.monotonic()
+        self._sorted = sorted(totals.values())
+        self._top: Optional[List[Tuple[int, int]]] = None  # [(user_id, puntos)] ordenado
+
+    @property
+    def first_day(self) -> date:
+        return self.last_day - timedelta(days=self.days - 1)
+
+    @staticmethod
+    def _sort_key(entry: Tuple[int, int]):
+        return (-entry[1], entry[0])
+
+    def _add_total(self, user_id: int, points: int):
+        old = self.totals.get(user_id, 0)
+        total = old + points
+        self.totals[user_id] = total
+        if old:
+            del self._sorted[bisect_left(self._sorted, old)]
+        insort(self._sorted, total)
+        if self._top is None:
+            return
+        entries = [entry for entry in self._top if entry[0] != user_id]
+        if len(entries) < TOP_CACHE_SIZE or self._sort_key((user_id, total)) < self._sort_key(entries[-1]):
+            entries.append((user_id, total))
+            entries.sort(key=self._sort_key)
+            del entries[TOP_CACHE_SIZE:]
+        self._top = entries
+
+    def apply(self, user_id: int, day: date, points: int, bucket: int):
+        """
+        Aplica puntos confirmados: `points` sumados al bucket (`user_id`, `day`),
+        que quedó en `bucket`. Los de días posteriores a la ventana se ignoran:
+        al avanzar de día se leen de la base.
+        """
+        if day == self.last_day:
+            known = self.today.get(user_id, 0)
+            if bucket > known:
+                self.today[user_id] = bucket
+                self._add_total(user_id, bucket - known)
+        elif self.first_day <= day < self.last_day:
+            self._add_total(user_id, points)
+
+    def merge_today(self, buckets: List[Tuple[int, int]]):
+        """Buckets de hoy leídos de la base (confirmados aquí o en otros procesos)."""
+        for user_id, bucket in buckets:
+            self.apply(user_id, self.last_day, 0, bucket)
+
+    def advance(self, expired: List[Tuple[int, int]]):
+        """Pasa al día siguiente restando los buckets del día que sale de la ventana."""
+        self.last_day += timedelta(days=1)
+        self.today = {}
+        self.refreshed_at = 0.0  # Los buckets del nuevo día se leen enseguida
+        for user_id, points in expired:
+            remaining = self.totals.get(user_id, 0) - points
+            if remaining > 0:
+                self.totals[user_id] = remaining
+            else:
+                self.totals.pop(user_id, None)
+        self._sorted = sorted(self.totals.values())
+        self._top = None
+
+    def top(self, limit: int) -> List[Tuple[int, int]]:
+        if self._top is None:
+            self._top = sorted(
+                heapq.nlargest(TOP_CACHE_SIZE, self.totals.items(), key=lambda item: (item[1], -item[0])),
+                key=self._sort_key,
+            )
+        return self._top[:limit]
+
+    def rank(self, user_id: int) -> Optional[int]:
+        points = self.totals.get(user_id)
+        if not points:
+            return None
+        return 1 + len(self._sorted) - bisect_right(self._sorted, points)
+
+
+# Ventanas en memoria por número de días. Se construyen bajo demanda.
+_windows: Dict[int, _RollingWindow] = {}
+# Actualizaciones confirmadas mientras se construye una ventana (una lista por construcción)
+_build_buffers: List[list] = []
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_after_commit(session: Session):
+    """Aplica a las ventanas en memoria los puntos diarios que acaban de confirmarse."""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        for window in _windows.values():
+            for entry in pending:
+                window.apply(*entry)
+        for buffer in _build_buffers:
+            buffer.extend(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
 
 class RankingService:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_top_users(self, limit: int = 10) -> List[Tuple[User, Level]]:
-        """
-        Obtiene los usuarios con más puntos, junto con su nivel.
-        """
-        result = await self.session.execute(
+    @staticmethod
+    def _top_users(db: Session, limit: int) -> List[Tuple[User, Level]]:
+        query = (
             select(User, Level)
             .join(Level, User.level_id == Level.id)
             .order_by(desc(User.points))
             .limit(limit)
         )
-        return result.all()
+        if not sharding_enabled():
+            return db.execute(query).all()
+        # Con shards: el top-N de cada shard y una mezcla k-way de las listas ordenadas
+        per_shard = [db.execute(query, bind_arguments={"shard_id": shard}).all() for shard in shard_names()]
+        return merge_top_n(per_shard, limit, key=lambda row: -row[0].points)
 
-    async def get_user_rank(self, user_id: int) -> Optional[int]:
+    @staticmethod
+    def _user_rank(db: Session, user_id: int) -> Optional[int]:
+        points = db.execute(select(User.points).filter(User.id == user_id)).scalar()
+        if points is None:
+            return None  # Usuario no encontrado
+        # 1 + usuarios con más puntos (un conteo, sin traer todos los ids); los empates comparten posición.
+        # Con shards la consulta cuenta en cada uno y se suman los conteos.
+        return 1 + sum(db.execute(select(func.count()).select_from(User).filter(User.points > points)).scalars().all())
+
+    @read_only
+    def get_top_users(self, db: Session, limit: int = 10) -> List[Tuple[User, Level]]:
+        """
+        Obtiene los usuarios con más puntos, junto con su nivel.
+        """
+        return self._top_users(db, limit)
+
+    @read_only
+    def get_user_rank(self, db: Session, user_id: int) -> Optional[int]:
         """
         Obtiene la posición de un usuario específico en el ranking.
         """
-        # Obtener todos los usuarios ordenados por puntos
-        all_users_result = await self.session.execute(
-            select(User.id)
-            .order_by(desc(User.points))
+        return self._user_rank(db, user_id)
+
+    @read_only
+    def get_ranking_snapshot(self, db: Session, user_id: int, limit: int = 10) -> Tuple[List[Tuple[User, Level]], Optional[int]]:
+        """Top de usuarios y posición de `user_id` en una sola lectura (lo que muestra /ranking)."""
+        return self._top_users(db, limit), self._user_rank(db, user_id)
+
+    async def record_points(self, user_id: int, points: int, day: Optional[date] = None) -> None:
+        """
+        Suma puntos ganados al bucket diario del usuario (daily_points) dentro de la
+        transacción actual. No hace commit: las ventanas en memoria se actualizan
+        cuando la transacción se confirma.
+        """
+        day = day or date.today()
+        stmt = sqlite_insert(DailyPoints).values(user_id=user_id, day=day, points=points)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyPoints.user_id, DailyPoints.day],
+            set_={"points": DailyPoints.points + stmt.excluded.points},
+        ).returning(DailyPoints.points)
+        bucket = (await self.session.execute(stmt)).scalar_one()
+        self.session.info.setdefault(_PENDING_KEY, []).append((user_id, day, points, bucket))
+
+    async def record_points_bulk(self, points_by_user: Dict[int, int], day: Optional[date] = None) -> None:
+        """Como `record_points` para muchos usuarios a la vez (un solo executemany)."""
+        if not points_by_user:
+            return
+        day = day or date.today()
+        # Sobre la tabla (executemany de Core): el INSERT masivo del ORM no admite sesiones con shards
+        stmt = sqlite_insert(DailyPoints.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyPoints.user_id, DailyPoints.day],
+            set_={"points": DailyPoints.points + stmt.excluded.points},
+        ).returning(DailyPoints.user_id, DailyPoints.points)
+        result = await self.session.execute(
+            stmt, [{"user_id": user_id, "day": day, "points": points} for user_id, points in points_by_user.items()]
         )
-        ranked_user_ids = [user_id for (user_id,) in all_users_result.all()]
+        self.session.info.setdefault(_PENDING_KEY, []).extend(
+            (user_id, day, points_by_user[user_id], bucket) for user_id, bucket in result.all()
+        )
+
+    async def _today_buckets(self, day: date) -> List[Tuple[int, int]]:
+        result = await self.session.execute(
+            select(DailyPoints.user_id, DailyPoints.points).filter(DailyPoints.day == day)
+        )
+        return result.all()
 
+    async def _build_window(self, days: int, today: date) -> _RollingWindow:
+        """
+        Suma los buckets de la ventana por el índice de día. Los puntos que se
+        confirman durante la lectura se guardan aparte y se aplican al terminar:
+        los que la lectura ya vio no se cuentan dos veces (ver `_RollingWindow`).
+        """
+        buffer: list = []
+        _build_buffers.append(buffer)
         try:
-            return ranked_user_ids.index(user_id) + 1
-        except ValueError:
-            return None  # Usuario no encontrado
\ No newline at end of file
+            first_day = today - timedelta(days=days - 1)
+            result = await self.session.execute(
+                select(DailyPoints.user_id, func.sum(DailyPoints.points))
+                .filter(DailyPoints.day >= first_day, DailyPoints.day < today)
+                .group_by(DailyPoints.user_id)
+            )
+            totals = dict(result.all())
+            today_buckets = dict(await self._today_buckets(today))
+        finally:
+            _build_buffers.remove(buffer)
+        for user_id, bucket in today_buckets.items():
+            totals[user_id] = totals.get(user_id, 0) + bucket
+        window = _RollingWindow(days, today, totals, today_buckets)
+        for entry in buffer:
+            window.apply(*entry)
+        _windows[days] = window
+        return window
+
+    async def _get_window(self, days: int) -> _RollingWindow:
+        """
+        Devuelve la ventana móvil de `days` días al día de hoy. La primera vez (o tras
+        una pausa más larga que la ventana) suma los buckets de la ventana; después,
+        al cambiar de día solo lee el bucket del día que sale de la ventana, y cada
+        RANKING_REFRESH_SECONDS relee los buckets de hoy.
+        """
+        today = date.today()
+        window = _windows.get(days)
+        if window is None or (today - window.last_day).days >= days:
+            window = await self._build_window(days, today)
+
+        while window.last_day < today:
+            closing_day, expired_day = window.last_day, window.first_day
+            closing = await self._today_buckets(closing_day)
+            result = await self.session.execute(
+                select(DailyPoints.user_id, DailyPoints.points).filter(DailyPoints.day == expired_day)
+            )
+            if window.last_day != closing_day:
+                continue  # Otra consulta avanzó la ventana mientras tanto
+            window.merge_today(closing)
+            window.advance(result.all())
+
+        if time.monotonic() - window.refreshed_at >= RANKING_REFRESH_SECONDS:
+            refreshed_at = time.monotonic()
+            buckets = await self._today_buckets(today)
+            if window.last_day == today:
+                window.merge_today(buckets)
+                window.refreshed_at = refreshed_at
+        return window
+
+    async def get_top_users_window(self, days: int, limit: int = 10) -> List[Tuple[User, Level, int]]:
+        """
+        Top de usuarios por puntos ganados en los últimos `days` días, con su nivel
+        y los puntos del periodo. Se sirve desde la ventana en memoria.
+        """
+        window = await self._get_window(days)
+        top = window.top(limit)
+        if not top:
+            return []
+        result = await self.session.execute(
+            select(User, Level)
+            .join(Level, User.level_id == Level.id)
+            .filter(User.id.in_([user_id for user_id, _ in top]))
+        )
+        rows = {ranked_user.id: (ranked_user, level) for ranked_user, level in result.all()}
+        return [(*rows[user_id], points) for user_id, points in top if user_id in rows]
+
+    async def get_user_window_rank(self, user_id: int, days: int) -> Tuple[Optional[int], int]:
+        """Posición del usuario y sus puntos en la ventana de `days` días."""
+        window = await self._get_window(days)
+        return window.rank(user_id), window.totals.get(user_id, 0)
+
+    async def prune_daily_points(self, retention_days: int) -> int:
+        """
+        Elimina los buckets diarios más antiguos que `retention_days` y descarta las
+        ventanas en memoria para que se reconstruyan desde la base.
+        """
+        cutoff = date.today() - timedelta(days=retention_days)
+        result = await self.session.execute(delete(DailyPoints).where(DailyPoints.day < cutoff))
+        await self.session.commit()
+        _windows.clear()
+        logger.info(f"Purgados {result.rowcount} buckets de puntos diarios anteriores a {cutoff}.")
+        return result.rowcount
@@ -1,14 +1,21 @@
 # services/reward_service.py
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update
 from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from database.read_pool import read_only
 from database.models.user import User
 from database.models.reward import Reward
+from database.shards import sharding_enabled, user_shard
+from database.writer import submit_write, load_for_write, refresh_from
 from services.points_service import PointsService
+from services.user_service import UserService
 from services.badge_service import BadgeService
+from services.stats_service import StatsService, REWARDS_ACTIVE
 from utils.logger import logger
 from typing import List, Optional
 from aiogram import Bot
-import json
 
 class RewardService:
     def __init__(self, session: AsyncSession, bot: Bot):
@@ -17,11 +24,12 @@ class RewardService:
         self.points_service = PointsService(session)
         self.badge_service = BadgeService(session)
 
-    async def get_active_rewards(self) -> List[Reward]:
+    @read_only
+    def get_active_rewards(self, db: Session) -> List[Reward]:
         """
         Obtiene todas las recompensas activas disponibles en el catálogo.
         """
-        result = await self.session.execute(
+        result = db.execute(
             select(Reward).filter(Reward.stock != 0)  # Excluir las agotadas
         )
         return result.scalars().all()
@@ -35,42 +43,114 @@ class RewardService:
         )
         return result.scalars().first()
 
+    @staticmethod
+    async def _reserve_stock(db: AsyncSession, reward_id: int) -> tuple[Optional[Reward], str]:
+        """
+        Descuenta una unidad del stock si queda alguna (UPDATE condicionado, sin
+        leer y reescribir el valor). Retorna (recompensa, "") o (None, mensaje).
+        """
+        reward = await db.get(Reward, reward_id)
+        if not reward:
+            return None, "❌ La recompensa que intentas canjear no existe."
+        if reward.stock == -1:
+            return reward, ""
+        result = await db.execute(
+            update(Reward)
+            .where(Reward.id == reward_id, Reward.stock > 0)
+            .values(stock=Reward.stock - 1)
+            .returning(Reward.stock)
+            .execution_options(synchronize_session=False)
+        )
+        remaining = result.scalar()
+        if remaining is None:
+            return None, f"❌ Lo siento, la recompensa '{reward.name}' está agotada."
+        set_committed_value(reward, "stock", remaining)
+        if remaining == 0:
+            # La recompensa se agotó: deja de contar como activa
+            await StatsService(db).increment(REWARDS_ACTIVE, -1)
+        return reward, ""
+
+    @staticmethod
+    async def _release_stock(db: AsyncSession, reward: Reward) -> None:
+        """Devuelve la unidad reservada por `_reserve_stock` cuando el canje no se completa."""
+        if reward.stock == -1:
+            return
+        result = await db.execute(
+            update(Reward)
+            .where(Reward.id == reward.id, Reward.stock != -1)
+            .values(stock=Reward.stock + 1)
+            .returning(Reward.stock)
+            .execution_options(synchronize_session=False)
+        )
+        if result.scalar() == 1:
+            await StatsService(db).increment(REWARDS_ACTIVE, 1)
+
+    @staticmethod
+    async def _charge_user(db: AsyncSession, user: User, reward: Reward) -> tuple[Optional[User], list[dict], str]:
+        """
+        Comprueba el saldo sobre la fila del escritor, descuenta el costo y suma el
+        canje al contador de insignias. Retorna (usuario, insignias nuevas, "") o
+        (None, [], mensaje) sin tocar nada si no le alcanzan los puntos.
+        """
+        db_user = await load_for_write(db, user)
+        if db_user.points < reward.points_cost:
+            return None, [], (f"❌ No tienes suficientes puntos para canjear '{reward.name}'. "
+                              f"Necesitas {reward.points_cost} puntos y solo tienes {db_user.points}.")
+        db_user = await UserService._apply_points(db, db_user, -reward.points_cost)
+        db_user, new_badges = await BadgeService._apply_counter(db, db_user, "redemptions_count", 1)
+        return db_user, new_badges, ""
+
+    async def _redeem(self, user: User, reward_id: int) -> tuple[Optional[User], Optional[Reward], list[dict], str]:
+        """
+        Reserva el stock y cobra al usuario. Sin shards, todo en una sola escritura
+        del escritor único. Con shards, el stock (archivo compartido) y los puntos
+        (shard del usuario) los confirman escritores distintos: primero se reserva
+        la unidad y, si el cobro no procede, se devuelve.
+        """
+        if not sharding_enabled():
+            async def apply(db: AsyncSession):
+                reward, detail = await self._reserve_stock(db, reward_id)
+                if reward is None:
+                    return None, None, [], detail
+                db_user, new_badges, detail = await self._charge_user(db, user, reward)
+                if db_user is None:
+                    await self._release_stock(db, reward)
+                return db_user, reward, new_badges, detail
+
+            return await submit_write(apply)
+
+        reward, detail = await submit_write(lambda db: self._reserve_stock(db, reward_id))
+        if reward is None:
+            return None, None, [], detail
+        try:
+            db_user, new_badges, detail = await submit_write(
+                lambda db: self._charge_user(db, user, reward), shard=user_shard(user.id)
+            )
+        except Exception:
+            await submit_write(lambda db: self._release_stock(db, reward))
+            raise
+        if db_user is None:
+            await submit_write(lambda db: self._release_stock(db, reward))
+        return db_user, reward, new_badges, detail
+
     async def redeem_reward(self, user: User, reward_id: int) -> tuple[bool, str]:
         """
-        Procesa el canje de una recompensa por parte de un usuario.
+        Procesa el canje de una recompensa por parte de un usuario. El saldo y el
+        stock se comprueban dentro de la escritura que los descuenta, así que dos
+        canjes simultáneos no pueden gastar los mismos puntos ni la última unidad.
         Retorna (True/False si el canje fue exitoso, Mensaje para el usuario).
         """
         try:
-            reward = await self.get_reward_by_id(reward_id)
-
-            if not reward:
-                return False, "❌ La recompensa que intentas canjear no existe."
-
-            if reward.stock != -1 and reward.stock <= 0:
-                return False, f"❌ Lo siento, la recompensa '{reward.name}' está agotada."
-
-            if user.points < reward.points_cost:
-                return False, (f"❌ No tienes suficientes puntos para canjear '{reward.name}'. "
-                               f"Necesitas {reward.points_cost} puntos y solo tienes {user.points}.")
-
-            # Procesar el canje
-            # Restar puntos
-            await self.points_service.deduct_points(user, reward.points_cost, f"Canje de recompensa: {reward.name}")
-            
-            # Disminuir stock si no es ilimitado
-            if reward.stock != -1:
-                reward.stock -= 1
-                self.session.add(reward)
-
-            # Otorgar insignia de primer canje si aplica
-            user_badges = json.loads(user.badges_json if user.badges_json else "[]")
-            if not any(badge['id'] == 2 for badge in user_badges):  # ID 2 = "Primer Canje"
-                await self.badge_service.award_badge(user, 2, "Primer Canje")
-                await self._send_notification_to_user(user.id, "🎉 ¡Felicidades! Has realizado tu primer canje y desbloqueado la insignia 'Primer Canje'.")
-
-            await self.session.commit()
-            await self.session.refresh(user)
-            
+            db_user, reward, new_badges, detail = await self._redeem(user, reward_id)
+            if db_user is None:
+                return False, detail
+            refresh_from(user, db_user)
+            logger.info(f"Deducidos {reward.points_cost} puntos de usuario {user.id} por 'Canje de recompensa: {reward.name}'. "
+                        f"Nuevos puntos: {user.points}")
+
+            for badge in new_badges:
+                await self._send_notification_to_user(user.id, f"🎉 ¡Felicidades! Has desbloqueado la insignia '{badge['name']}'.")
+
             # Notificar al administrador
             await self._notify_admin_about_redemption(user, reward)
 
@@ -84,7 +164,6 @@ class RewardService:
             return True, message_to_user
 
         except Exception as e:
-            await self.session.rollback()
             logger.error(f"Error al procesar canje de recompensa {reward_id} para usuario {user.id}: {e}", exc_info=True)
             return False, "❌ Ocurrió un error al intentar canjear la recompensa. Por favor, intenta de nuevo más tarde."
 
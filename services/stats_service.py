@@ -0,0 +1,133 @@
+# services/stats_service.py
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from collections import Counter
+import time
+from database.models.stats_counter import StatsCounter
+from database.models.user import User
+from database.models.reward import Reward
+from utils.logger import logger
+
+# Nombres de los contadores del sistema
+USERS_TOTAL = "users_total"         # Usuarios registrados
+REWARDS_ACTIVE = "rewards_active"   # Recompensas con stock disponible (stock != 0)
+POINTS_TOTAL = "points_total"       # Puntos en circulación (suma de users.points)
+COUNTER_NAMES = (USERS_TOTAL, REWARDS_ACTIVE, POINTS_TOTAL)
+
+_PENDING_KEY = "stats_pending"
+
+# Espejo en memoria de stats_counters. None hasta la primera lectura.
+# Es por proceso: solo refleja al instante los incrementos confirmados por este
+# proceso. Los de otros procesos (y la corrección del job de reconciliación, que
+# corre en el proceso que tiene el lease) están en la tabla, así que el espejo se
+# vuelve a leer de ella cuando tiene más de STATS_MIRROR_TTL_SECONDS.
+STATS_MIRROR_TTL_SECONDS = 60
+_mirror: dict[str, int] | None = None
+_mirror_loaded_at = 0.0
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_after_commit(session: Session):
+    """Aplica al espejo los incrementos que acaban de confirmarse en la base."""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending and _mirror is not None:
+        for name, delta in pending.items():
+            _mirror[name] = _mirror.get(name, 0) + delta
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_after_rollback(session: Session):
+    """Los incrementos de una transacción revertida no llegan al espejo."""
+    session.info.pop(_PENDING_KEY, None)
+
+
+class StatsService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def increment(self, name: str, delta: int) -> None:
+        """
+        Suma `delta` a un contador dentro de la transacción actual de la sesión.
+        No hace commit: el contador se confirma (y se refleja en el espejo) junto
+        con el cambio que lo provoca, o se descarta si este se revierte.
+        """
+        if not delta:
+            return
+        stmt = sqlite_insert(StatsCounter).values(name=name, value=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StatsCounter.name],
+            set_={"value": StatsCounter.value + stmt.excluded.value},
+        )
+        await self.session.execute(stmt)
+        pending = self.session.info.setdefault(_PENDING_KEY, Counter())
+        pending[name] += delta
+
+    async def _stored_counters(self) -> dict[str, int]:
+        """
+        Valores guardados de los contadores. Con shards cada archivo tiene su copia
+        de stats_counters (cada escritor suma a la suya) y el valor es la suma.
+        """
+        stored = Counter()
+        for name, value in (await self.session.execute(select(StatsCounter.name, StatsCounter.value))).all():
+            stored[name] += value
+        return dict(stored)
+
+    async def get_counters(self) -> dict[str, int]:
+        """
+        Devuelve los contadores del sistema en O(1) desde el espejo en memoria.
+        La primera llamada del proceso, y la primera tras STATS_MIRROR_TTL_SECONDS,
+        los carga de stats_counters (una fila por contador); si la tabla aún no
+        tiene todos los contadores, los calcula con `reconcile()`.
+        """
+        global _mirror, _mirror_loaded_at
+        if _mirror is None or time.monotonic() - _mirror_loaded_at > STATS_MIRROR_TTL_SECONDS:
+            stored = await self._stored_counters()
+            if all(name in stored for name in COUNTER_NAMES):
+                _mirror = stored
+                _mirror_loaded_at = time.monotonic()
+            else:
+                await self.reconcile()
+        return dict(_mirror)
+
+    async def _compute_actual(self) -> dict[str, int]:
+        """Recalcula los contadores desde las tablas (escaneo completo; con shards, uno por shard)."""
+        async def total(query) -> int:
+            return sum((await self.session.execute(query)).scalars().all())
+
+        users_total = await total(select(func.count()).select_from(User))
+        rewards_active = await total(select(func.count()).select_from(Reward).filter(Reward.stock != 0))
+        points_total = await total(select(func.coalesce(func.sum(User.points), 0)))
+        return {USERS_TOTAL: users_total, REWARDS_ACTIVE: rewards_active, POINTS_TOTAL: points_total}
+
+    async def reconcile(self) -> dict[str, int]:
+        """
+        Corrige la deriva de los contadores recalculándolos desde las tablas.
+        Solo se aplica la diferencia respecto al valor guardado (no se sobrescribe),
+        así que los incrementos confirmados después de leerlo se conservan; una
+        deriva residual por escrituras simultáneas se corrige en la siguiente pasada.
+        Retorna la deriva corregida por contador.
+        """
+        global _mirror, _mirror_loaded_at
+        actual = await self._compute_actual()
+        stored = await self._stored_counters()
+
+        drift = {name: actual[name] - stored.get(name, 0) for name in COUNTER_NAMES}
+        for name in COUNTER_NAMES:
+            if name not in stored:
+                await self.session.execute(
+                    sqlite_insert(StatsCounter).values(name=name, value=0).on_conflict_do_nothing()
+                )
+            await self.increment(name, drift[name])
+        await self.session.commit()
+
+        _mirror = await self._stored_counters()
+        _mirror_loaded_at = time.monotonic()
+        await self.session.commit()
+
+        if any(drift.values()):
+            logger.warning(f"Reconciliación de estadísticas: deriva corregida {drift}.")
+        else:
+            logger.info("Reconciliación de estadísticas: sin deriva.")
+        return drift
@@ -1,9 +1,15 @@
 # services/user_service.py
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.sql import func
 from datetime import datetime
 
 from database.models.user import User
+from database.upsert import upsert_returning
+from database.shards import user_shard
+from database.writer import submit_write, load_for_write, refresh_from
+from services.stats_service import StatsService, USERS_TOTAL, POINTS_TOTAL
+from services.badge_service import badge_rules
 from utils.logger import logger
 
 class UserService:
@@ -15,53 +21,130 @@ class UserService:
         result = await self.session.execute(select(User).filter_by(id=user_id))
         return result.scalars().first()
 
+    async def register_user(
+        self,
+        user_id: int,
+        username: str = None,
+        first_name: str = None,
+        last_name: str = None,
+        is_admin: bool = False,
+        count_interaction: bool = False,
+    ) -> tuple[User, bool]:
+        """
+        Registra al usuario o refresca su perfil (username, nombre) con una única
+        sentencia INSERT ... ON CONFLICT(id) DO UPDATE ... RETURNING, sin carreras
+        entre primeros contactos simultáneos del mismo usuario.
+        Con `count_interaction` también cuenta la interacción actual.
+        Se escribe por el escritor único; el usuario se devuelve en la sesión del servicio.
+        Retorna (usuario, creado).
+        """
+        now = datetime.now()
+        update_values = {"badges_json": func.coalesce(User.badges_json, "[]")}
+        if count_interaction:
+            update_values["last_interaction_at"] = now
+            update_values["interactions_count"] = func.coalesce(User.interactions_count, 0) + 1
+
+        async def apply(db: AsyncSession) -> tuple[User, bool]:
+            user = await upsert_returning(
+                db,
+                User,
+                values={
+                    "id": user_id,
+                    "username": username,
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "is_admin": is_admin,
+                    "join_date": now,
+                    "last_interaction_at": now,
+                    "last_daily_reset": now,
+                    "interactions_count": 1 if count_interaction else 0,
+                    "badges_json": badge_rules.initial_badges_json(),
+                },
+                conflict_columns=["id"],
+                refresh_columns=["username", "first_name", "last_name"],
+                update_values=update_values,
+            )
+            # join_date no se actualiza en conflicto: solo coincide con `now` si la fila es nueva
+            created = user.join_date == now
+            if created:
+                await StatsService(db).increment(USERS_TOTAL, 1)
+            return user, created
+
+        user, created = await submit_write(apply, shard=user_shard(user_id))
+        if created:
+            logger.info(f"Nuevo usuario registrado: {user.username or user.first_name} (ID: {user.id})")
+        # Se adopta la fila confirmada en la sesión del servicio, sin consultar de nuevo
+        return await self.session.merge(user, load=False), created
+
     async def create_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None) -> User:
-        """Crea un nuevo usuario en la base de datos."""
-        user = User(
-            id=user_id,
-            username=username,
-            first_name=first_name,
-            last_name=last_name,
-            join_date=datetime.now()
-        )
-        self.session.add(user)
-        await self.session.commit()
-        await self.session.refresh(user)
-        logger.info(f"Usuario creado: {user_id} ({username})")
+        """Crea un nuevo usuario en la base de datos (o refresca su perfil si ya existe)."""
+        user, _ = await self.register_user(user_id, username, first_name, last_name)
         return user
 
-    async def update_user_points(self, user: User, points_to_add: int) -> User:
-        """Actualiza los puntos de un usuario y recalcula su nivel."""
-        user.points += points_to_add
-        if user.points < 0:  # Asegurarse de que los puntos no sean negativos
-            user.points = 0
-        
+    @staticmethod
+    async def _apply_points(db: AsyncSession, user: User, points_to_add: int) -> User:
+        """Suma los puntos y recalcula el nivel sobre la fila del escritor (sin commit)."""
+        db_user = await load_for_write(db, user)
+        points_before = db_user.points
+        db_user.points += points_to_add
+        if db_user.points < 0:  # Asegurarse de que los puntos no sean negativos
+            db_user.points = 0
+
         # Recalcular nivel basado en puntos
         from services.level_service import LevelService
-        level_service = LevelService(self.session)
-        user.level_id = await level_service.get_user_level(user.points)
-        
-        await self.session.commit()
-        await self.session.refresh(user)
+        db_user.level_id = await LevelService(db).get_user_level(db_user.points)
+
+        # Puntos en circulación: se usa el cambio real (tras el recorte a 0)
+        await StatsService(db).increment(POINTS_TOTAL, db_user.points - points_before)
+        return db_user
+
+    @staticmethod
+    async def _apply_purchase_count(db: AsyncSession, user: User, points_awarded: int) -> User:
+        db_user = await load_for_write(db, user)
+        db_user.purchase_count += 1
+        db_user.purchase_points_total = (db_user.purchase_points_total or 0) + points_awarded
+        badge_rules.award(db_user, "purchase_count", db_user.purchase_count - 1, db_user.purchase_count)
+        return db_user
+
+    async def update_user_points(self, user: User, points_to_add: int) -> User:
+        """
+        Actualiza los puntos de un usuario y recalcula su nivel. La suma se hace
+        sobre la fila actual (no sobre la copia en memoria) y se confirma por el
+        escritor único junto con los cambios pendientes de `user`.
+        """
+        db_user = await submit_write(lambda db: self._apply_points(db, user, points_to_add), shard=user_shard(user.id))
+        refresh_from(user, db_user)
         logger.info(f"Puntos de usuario {user.id} actualizados: {user.points} (Nivel ID: {user.level_id})")
         return user
 
+    @staticmethod
+    async def _apply_interaction_data(db: AsyncSession, user: User, points_gained_today: int) -> User:
+        db_user = await load_for_write(db, user)
+        now = datetime.now()
+        if db_user.last_daily_reset is None or db_user.last_daily_reset.date() < now.date():
+            # Nuevo día: reiniciar el contador de puntos diarios
+            db_user.daily_points_earned = 0
+            db_user.last_daily_reset = now
+        db_user.daily_points_earned = (db_user.daily_points_earned or 0) + points_gained_today
+        db_user.last_interaction_at = now
+        db_user.interactions_count += 1
+        return db_user
+
     async def update_user_interaction_data(self, user: User, points_gained_today: int) -> User:
         """
         Actualiza los datos de interacción del usuario.
         """
-        now = datetime.now()
-        user.last_interaction_at = now
-        user.interactions_count += 1
-        
-        await self.session.commit()
-        await self.session.refresh(user)
+        refresh_from(user, await submit_write(
+            lambda db: self._apply_interaction_data(db, user, points_gained_today), shard=user_shard(user.id)
+        ))
         return user
 
-    async def increment_purchases_count(self, user: User) -> User:
-        """Incrementa el contador de compras del usuario."""
-        user.purchase_count += 1
-        await self.session.commit()
-        await self.session.refresh(user)
+    async def increment_purchases_count(self, user: User, points_awarded: int = 0) -> User:
+        """
+        Incrementa el contador de compras del usuario y el total de puntos por compras.
+        Mantiene el resumen que muestra /myrewards sin recorrer el historial.
+        """
+        db_user = await submit_write(lambda db: self._apply_purchase_count(db, user, points_awarded), shard=user_shard(user.id))
+        refresh_from(user, db_user)
         logger.info(f"Contador de compras de usuario {user.id} incrementado a {user.purchase_count}.")
         return user
\ No newline at end of file
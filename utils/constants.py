@@ -12,6 +12,28 @@ POINTS_PER_MONTH = 50
 # Hitos de permanencia
 MILESTONE_6_MONTHS_POINTS = 100
 MILESTONE_1_YEAR_POINTS = 200
+MILESTONE_6_MONTHS_DAYS = 180
+MILESTONE_1_YEAR_DAYS = 365
+
+# Usuarios que el job de permanencia procesa por lote (y por commit de fechas)
+PERMANENCE_BATCH_SIZE = 500
+
+# Rankings por periodo: argumento de /ranking -> días de la ventana móvil
+RANKING_WINDOWS = {"semana": 7, "mes": 30}
+# Título de cada periodo en el mensaje de /ranking ("Ranking de la Semana", "Ranking del Mes")
+RANKING_WINDOW_TITLES = {"semana": "de la Semana", "mes": "del Mes"}
+# Días de puntos diarios que se conservan (debe cubrir la ventana más larga)
+DAILY_POINTS_RETENTION_DAYS = 35
+
+# Límite de updates por usuario (token bucket), por clase de comando:
+# clase -> (updates por segundo sostenidos, ráfaga máxima)
+THROTTLE_LIMITS = {
+    "interaccion": (1.0, 5),  # Botones de reacción, encuesta y narrativa
+    "consulta": (0.5, 4),     # /ranking, /status, /catalogo, /myrewards, /sorteos, /misiones
+    "general": (2.0, 10),     # Todo lo demás
+}
+# Cada cuánto se eliminan los buckets de usuarios inactivos
+THROTTLE_SWEEP_INTERVAL_SECONDS = 60
 
 # IDs de insignias (para referencia en el código)
 BADGE_NUEVO_SUSCRIPTOR = 1
@@ -21,5 +43,17 @@ BADGE_MAESTRO_ANTIGUO = 4
 BADGE_COMPRADOR_FRECUENTE = 5
 BADGE_REACCIONADOR_ACTIVO = 6
 
+# Reglas de insignias: la insignia se otorga cuando el contador alcanza el umbral.
+# Contadores: columnas de User (purchase_count, reactions_count, redemptions_count)
+# y "tenure_days" (días desde join_date, evaluado al registrarse y en los hitos).
+BADGE_RULES = [
+    {"badge_id": BADGE_NUEVO_SUSCRIPTOR, "counter": "tenure_days", "threshold": 0},
+    {"badge_id": BADGE_PRIMER_CANJE, "counter": "redemptions_count", "threshold": 1},
+    {"badge_id": BADGE_VETERAN_INTIMO, "counter": "tenure_days", "threshold": MILESTONE_6_MONTHS_DAYS},
+    {"badge_id": BADGE_MAESTRO_ANTIGUO, "counter": "tenure_days", "threshold": MILESTONE_1_YEAR_DAYS},
+    {"badge_id": BADGE_COMPRADOR_FRECUENTE, "counter": "purchase_count", "threshold": 5},
+    {"badge_id": BADGE_REACCIONADOR_ACTIVO, "counter": "reactions_count", "threshold": 50},
+]
+
 # Configuración de puntos diarios
 DAILY_PERMANENCE_POINTS = 10  # Puntos por reclamar diariamente
\ No newline at end of file
@@ -3,6 +3,7 @@ from database.models.level import Level
 from database.models.user import User
 from database.models.badge import Badge
 from database.models.reward import Reward
+from database.models.purchase import Purchase
 from typing import Optional, List
 
 def format_progress_bar(current_points: int, next_level_min_points: int, segment_length: int = 10) -> str:
@@ -64,10 +65,11 @@ def format_user_status(user: User, current_level: Level, next_level: Optional[Le
     
     return status_message
 
-def format_ranking_entry_anonymous(rank: int, user: User, level: Level, current_user_id: int) -> str:
+def format_ranking_entry_anonymous(rank: int, user: User, level: Level, current_user_id: int, points: Optional[int] = None) -> str:
     """
     Formatea una entrada del ranking de forma anónima, mostrando el nombre completo
-    solo para el usuario que consulta.
+    solo para el usuario que consulta. `points` sustituye a los puntos totales
+    en los rankings por periodo.
     """
     if user.id == current_user_id:
         display_name = f"@{user.username}" if user.username else user.first_name or "Tú"
@@ -92,7 +94,8 @@ def format_ranking_entry_anonymous(rank: int, user: User, level: Level, current_
     else:
         rank_emoji = f"{rank}."
 
-    return f"{rank_emoji} **{display_name}** - `{user.points}` Pts ({level.name})"
+    shown_points = user.points if points is None else points
+    return f"{rank_emoji} **{display_name}** - `{shown_points}` Pts ({level.name})"
 
 def format_reward_details(reward: Reward) -> str:
     """
@@ -104,4 +107,30 @@ def format_reward_details(reward: Reward) -> str:
         f"💰 **Costo:** `{reward.points_cost}` Puntos\n"
         f"📝 **Descripción:** {reward.description}\n"
         f"{stock_info}"
-    )
\ No newline at end of file
+    )
+
+def format_purchase_history_page(purchases: List[Purchase], first_index: int, total_count: int, total_points: int) -> str:
+    """
+    Formatea una página del historial de /myrewards.
+    first_index: Número (1-based) de la primera compra de la página dentro del historial.
+    total_count / total_points: Totales del resumen por usuario (no se recalculan aquí).
+    """
+    rewards_message = "🎁 **Mis Recompensas Canjeadas**\n\n"
+
+    for i, purchase in enumerate(purchases, first_index):
+        date_str = purchase.purchase_date.strftime('%Y-%m-%d')
+        rewards_message += (
+            f"**{i}.** {purchase.description or 'Recompensa'}\n"
+            f"   💰 Costo: {purchase.points_awarded} puntos\n"
+            f"   📅 Fecha: {date_str}\n\n"
+        )
+
+    remaining = total_count - (first_index - 1) - len(purchases)
+    if remaining > 0:
+        rewards_message += f"... y {remaining} recompensas más.\n\n"
+
+    rewards_message += (
+        f"💎 **Total de puntos gastados:** {total_points}\n"
+        f"🛒 **Total de canjes:** {total_count}"
+    )
+    return rewards_message
@@ -0,0 +1,25 @@
+# utils/misc.py
+from calendar import monthrange
+from datetime import datetime, timedelta
+
+
+def add_months(date: datetime, months: int) -> datetime:
+    """
+    Suma meses de calendario a una fecha, ajustando el día al último del mes
+    si no existe (ej. 31 de enero + 1 mes = 28/29 de febrero).
+    """
+    month_index = date.month - 1 + months
+    year = date.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(date.day, monthrange(year, month)[1])
+    return date.replace(year=year, month=month, day=day)
+
+
+def days_from_now(days: int):
+    """Devuelve una función que calcula `ahora + days`; útil como default de columnas."""
+    return lambda: datetime.now() + timedelta(days=days)
+
+
+def months_from_now(months: int):
+    """Devuelve una función que calcula `ahora + months` meses; útil como default de columnas."""
+    return lambda: add_months(datetime.now(), months)
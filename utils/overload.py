@@ -0,0 +1,156 @@
+# utils/overload.py
+"""
+Detección de sobrecarga y degradación por prioridades.
+
+Un monitor mide el retraso del event loop (cuánto tarda en despertar una tarea
+que duerme un intervalo fijo) y activa el modo sobrecarga cuando la media
+móvil supera el umbral de entrada; lo desactiva cuando se mantiene por debajo
+del umbral de salida durante un tiempo (histéresis, para no oscilar).
+
+Cada update tiene una clase de prioridad (admin > canjes y compras > comandos >
+reacciones y votos). En modo sobrecarga las clases bajas se degradan (ver
+middlewares/overload_middleware.py): las reacciones y votos se difieren y
+/status y /ranking se responden con la última respuesta guardada del usuario.
+"""
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from aiogram.types import Message, CallbackQuery
+
+from config.settings import settings
+from utils.logger import logger
+
+# Clases de prioridad (menor = más prioritario)
+PRIORITY_ADMIN = 0
+PRIORITY_REDEMPTION = 1   # Canjes, compras y boletos de sorteo
+PRIORITY_COMMAND = 2
+PRIORITY_INTERACTION = 3  # Reacciones, votos y elecciones narrativas
+
+_REDEMPTION_CALLBACK_PREFIXES = ("redeem_confirm:", "show_reward:", "redeem_cancel")
+_INTERACTION_CALLBACK_PREFIXES = ("react_post:", "survey_vote:", "narrative_choice:")
+_REDEMPTION_COMMANDS = {"/canjear", "/boletos", "/sumarpuntos", "/importarcompras"}
+
+# Comandos que en sobrecarga se responden con su última respuesta guardada
+SNAPSHOT_COMMANDS = {"/status", "/ranking"}
+
+LAG_SAMPLE_INTERVAL_SECONDS = 0.1
+LAG_EWMA_ALPHA = 0.3
+SNAPSHOT_MAX_ENTRIES = 20_000
+
+# Contadores de degradación desde el arranque (se muestran en /admin)
+overload_counters: Counter = Counter()
+
+
+def _command_of(event: Message) -> Optional[str]:
+    text = event.text or event.caption
+    if not text or not text.startswith("/"):
+        return None
+    return text.split(maxsplit=1)[0].split("@", 1)[0].lower()
+
+
+def classify_priority(event: Message | CallbackQuery) -> int:
+    if event.from_user and event.from_user.id in settings.ADMIN_IDS:
+        return PRIORITY_ADMIN
+    if isinstance(event, CallbackQuery):
+        data = event.data or ""
+        if data.startswith(_REDEMPTION_CALLBACK_PREFIXES):
+            return PRIORITY_REDEMPTION
+        if data.startswith(_INTERACTION_CALLBACK_PREFIXES):
+            return PRIORITY_INTERACTION
+        return PRIORITY_COMMAND
+    if _command_of(event) in _REDEMPTION_COMMANDS:
+        return PRIORITY_REDEMPTION
+    return PRIORITY_COMMAND
+
+
+def snapshot_key(message: Message, user_id: int) -> Optional[tuple[str, int]]:
+    """Clave de la respuesta guardada de /status o /ranking (con su argumento), o None."""
+    command = _command_of(message)
+    if command not in SNAPSHOT_COMMANDS:
+        return None
+    parts = message.text.split(maxsplit=1)
+    argument = parts[1].strip().lower() if len(parts) > 1 else ""
+    return f"{command} {argument}".strip(), user_id
+
+
+class SnapshotCache:
+    """Últimas respuestas renderizadas por (comando, usuario), con tope de entradas (LRU)."""
+
+    def __init__(self, max_entries: int = SNAPSHOT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    def put(self, key: Optional[tuple[str, int]], text: str):
+        if key is None:
+            return
+        self._entries[key] = (text, time.monotonic())
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: Optional[tuple[str, int]]) -> Optional[tuple[str, float]]:
+        """(texto, antigüedad en segundos) o None."""
+        entry = self._entries.get(key) if key is not None else None
+        if entry is None:
+            return None
+        text, stored_at = entry
+        return text, time.monotonic() - stored_at
+
+
+stale_snapshots = SnapshotCache()
+
+
+class LoopLagMonitor:
+    """Mide el retraso del event loop y mantiene el modo sobrecarga con histéresis."""
+
+    def __init__(self, enter_lag_ms: int, exit_lag_ms: int, exit_hold_seconds: float,
+                 sample_interval: float = LAG_SAMPLE_INTERVAL_SECONDS):
+        self.enter_lag = enter_lag_ms / 1000
+        self.exit_lag = exit_lag_ms / 1000
+        self.exit_hold_seconds = exit_hold_seconds
+        self.sample_interval = sample_interval
+        self.lag = 0.0  # Media móvil exponencial, en segundos
+        self.overloaded = False
+        self._below_exit_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def record(self, lag: float, now: float):
+        """Incorpora una muestra de retraso y cambia de modo si corresponde."""
+        self.lag = LAG_EWMA_ALPHA * lag + (1 - LAG_EWMA_ALPHA) * self.lag
+        if not self.overloaded:
+            if self.lag >= self.enter_lag:
+                self.overloaded = True
+                self._below_exit_since = None
+                overload_counters["activaciones"] += 1
+                logger.warning(f"Modo sobrecarga ACTIVADO: retraso del event loop {self.lag * 1000:.0f} ms.")
+            return
+        if self.lag > self.exit_lag:
+            self._below_exit_since = None
+        elif self._below_exit_since is None:
+            self._below_exit_since = now
+        elif now - self._below_exit_since >= self.exit_hold_seconds:
+            self.overloaded = False
+            self._below_exit_since = None
+            logger.warning(
+                f"Modo sobrecarga DESACTIVADO: retraso del event loop {self.lag * 1000:.0f} ms "
+                f"(por debajo de {self.exit_lag * 1000:.0f} ms durante {self.exit_hold_seconds:.0f}s)."
+            )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.sample_interval
+            await asyncio.sleep(self.sample_interval)
+            now = loop.time()
+            self.record(max(0.0, now - expected), now)
+
+
+lag_monitor = LoopLagMonitor(
+    settings.OVERLOAD_ENTER_LAG_MS, settings.OVERLOAD_EXIT_LAG_MS, settings.OVERLOAD_EXIT_HOLD_SECONDS,
+)
@@ -0,0 +1,78 @@
+# utils/pacing.py
+"""
+Envío de mensajes a ritmo controlado: un limitador global de la Bot API
+compartido por todo el proceso y un emisor con concurrencia acotada que
+respeta RetryAfter (flood control) y clasifica el resultado de cada envío.
+"""
+import asyncio
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+
+from utils.logger import logger
+
+# Límite global de Telegram para mensajes de un bot: ~30/s. Se deja margen.
+GLOBAL_SEND_RATE_PER_SECOND = 25
+DEFAULT_SEND_CONCURRENCY = 10
+MAX_SEND_ATTEMPTS = 3
+
+# Resultado de un envío
+SEND_OK = "sent"
+SEND_BLOCKED = "blocked"  # El usuario bloqueó el bot o desactivó su cuenta
+SEND_FAILED = "failed"
+
+
+class RateLimiter:
+    """
+    Reparte las operaciones a un ritmo máximo de `rate` por segundo entre todas
+    las tareas que lo comparten (espaciado uniforme, sin ráfagas).
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float):
+        """Detiene a todos los emisores `seconds` segundos (p. ej. tras un RetryAfter)."""
+        resume_at = asyncio.get_running_loop().time() + seconds
+        self._next_slot = max(self._next_slot, resume_at)
+
+
+# Limitador compartido por todos los envíos masivos del proceso
+bot_api_limiter = RateLimiter(GLOBAL_SEND_RATE_PER_SECOND)
+
+
+class PacedSender:
+    def __init__(self, bot: Bot, limiter: RateLimiter = bot_api_limiter, concurrency: int = DEFAULT_SEND_CONCURRENCY):
+        self.bot = bot
+        self.limiter = limiter
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> str:
+        """
+        Envía un mensaje respetando el limitador global y la concurrencia máxima.
+        Retorna SEND_OK, SEND_BLOCKED o SEND_FAILED; no lanza excepciones de la API.
+        """
+        async with self._semaphore:
+            for _ in range(MAX_SEND_ATTEMPTS):
+                await self.limiter.acquire()
+                try:
+                    await self.bot.send_message(chat_id, text, **kwargs)
+                    return SEND_OK
+                except TelegramRetryAfter as e:
+                    logger.warning(f"Flood control de Telegram: pausa de {e.retry_after}s en los envíos.")
+                    self.limiter.pause(e.retry_after)
+                except TelegramForbiddenError:
+                    return SEND_BLOCKED
+                except TelegramAPIError as e:
+                    logger.debug(f"No se pudo enviar mensaje a {chat_id}: {e}")
+                    return SEND_FAILED
+            return SEND_FAILED